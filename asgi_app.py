@@ -0,0 +1,250 @@
+"""
+Async (ASGI) serving mode for the dashboard.
+
+Every Flask route is served unchanged through asgiref's WsgiToAsgi, except
+/events/stream, which is handled natively on the event loop. Its streams
+are fed by one LoopBroadcaster. The broadcaster is a single EventHub
+subscriber that hops each published event onto the loop once and appends
+the already-encoded bytes to every async client on that topic. One timer
+task sends the 15 s heartbeat to all of them. An idle stream is two
+suspended coroutines with no thread and no per-second wakeup, so a small box
+holds thousands of dashboards.
+
+    python asgi_app.py [--host 0.0.0.0] [--port 5000]   (or ASYNC_SERVER = True in main.py)
+
+bench_sse_load.py measures idle streams, memory and fan-out latency.
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import defaultdict
+from urllib.parse import parse_qs
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+    ASGIREF_AVAILABLE = True
+except Exception:
+    ASGIREF_AVAILABLE = False
+try:
+    import uvicorn
+    UVICORN_AVAILABLE = True
+except Exception:
+    UVICORN_AVAILABLE = False
+
+import flask_app
+from event_hub import Subscriber, check_topics, encode, EVENT_TOPICS, SUB_QUEUE
+
+HEARTBEAT_SECONDS = 15.0
+HEARTBEAT = b": heartbeat\n\n"
+
+
+class AsyncClient(Subscriber):
+    """A Subscriber that lives on the event loop and is woken through an asyncio.Event."""
+    def __init__(self, maxlen, topics):
+        super().__init__(maxlen, topics)
+        self.wake = asyncio.Event()
+        self.replayed_to = 0
+
+    def _notify(self):
+        self.wake.set()
+
+    async def next_chunks(self):
+        await self.wake.wait()
+        self.wake.clear()
+        with self._cv:
+            return self._drain()
+
+
+class LoopBroadcaster:
+    """One hub subscriber standing in for all async clients; fans out on the loop thread."""
+    def __init__(self, hub, loop, maxlen=SUB_QUEUE):
+        self.hub = hub
+        self.loop = loop
+        self.maxlen = maxlen
+        self.topics = frozenset()
+        self._by_topic = defaultdict(set)
+        self.clients = set()
+        self.slow_events = 0
+        self._closed = {"delivered": 0, "coalesced": 0}
+        hub.attach(self)
+
+    # ---- hub side (publisher threads) ----
+    def offer(self, event, chunk, coalesce=False, eid=None):
+        self.loop.call_soon_threadsafe(self._fanout, EVENT_TOPICS.get(event, event), event, chunk, coalesce, eid)
+        return True
+
+    # ---- loop side ----
+    def _fanout(self, topic, event, chunk, coalesce, eid):
+        for c in self._by_topic.get(topic, ()):
+            if eid is not None and eid <= c.replayed_to:
+                continue    # already sent to this client as part of its Last-Event-ID replay
+            if not c.offer(event, chunk, coalesce, eid):
+                self.slow_events += 1
+
+    def _sync_topics(self, last_id=None, replay_topics=None):
+        topics = frozenset(t for t, cs in self._by_topic.items() if cs)
+        if topics != self.topics or last_id is not None:
+            return self.hub.update_topics(self, topics, last_id, replay_topics)
+
+    def add(self, topics, last_id=None):
+        client = AsyncClient(self.maxlen, topics)
+        self.clients.add(client)
+        for t in topics:
+            self._by_topic[t].add(client)
+        # topic registration and replay are one step under the hub lock; events up to
+        # replayed_to may still be in flight to the loop, and _fanout skips them
+        replay = self._sync_topics(last_id, topics)
+        if replay is not None:
+            client.replay, client.replayed_to = replay
+        return client
+
+    def remove(self, client):
+        self.clients.discard(client)
+        for t in client.topics:
+            self._by_topic[t].discard(client)
+        self._closed["delivered"] += client.delivered
+        self._closed["coalesced"] += client.coalesced
+        self._sync_topics()
+
+    @property
+    def n_clients(self):
+        return len(self.clients)
+
+    @property
+    def delivered(self):
+        return self._closed["delivered"] + sum(c.delivered for c in self.clients)
+
+    @property
+    def coalesced(self):
+        return self._closed["coalesced"] + sum(c.coalesced for c in self.clients)
+
+    async def heartbeat(self):
+        """Shared heartbeat timer for every async stream."""
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            with_uptime = HEARTBEAT + encode('uptime', int(time.time() - flask_app.START_TIME))
+            for c in list(self.clients):
+                if 'uptime' in c.topics:
+                    c.offer('uptime', with_uptime, coalesce=True)
+                else:
+                    c.offer('_heartbeat', HEARTBEAT, coalesce=True)
+
+    def stats(self):
+        return {"clients": len(self.clients), "slow_events": self.slow_events,
+                "slow_clients": sum(1 for c in self.clients if c.overflows)}
+
+
+class DashboardASGI:
+    def __init__(self, app=None):
+        if not ASGIREF_AVAILABLE:
+            raise RuntimeError("asgiref is not installed (pip install asgiref)")
+        self.wsgi = WsgiToAsgi(app or flask_app.app)
+        self.broadcaster = None
+
+    def _ensure_broadcaster(self):
+        if self.broadcaster is None:
+            loop = asyncio.get_running_loop()
+            self.broadcaster = LoopBroadcaster(flask_app.HUB, loop)
+            loop.create_task(self.broadcaster.heartbeat())
+            flask_app.register_metrics_provider("sse_async", self.broadcaster.stats)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                msg = await receive()
+                if msg["type"] == "lifespan.startup":
+                    self._ensure_broadcaster()
+                    await send({"type": "lifespan.startup.complete"})
+                elif msg["type"] == "lifespan.shutdown":
+                    if self.broadcaster:
+                        flask_app.HUB.detach(self.broadcaster)
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] == "http" and scope["path"] == "/events/stream":
+            await self._stream(scope, receive, send)
+        else:
+            await self.wsgi(scope, receive, send)
+
+    async def _stream(self, scope, receive, send):
+        self._ensure_broadcaster()
+        qs = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        raw = qs.get("topics", [""])[0]
+        try:
+            topics = check_topics([t.strip() for t in raw.split(",") if t.strip()] if raw else None)
+        except ValueError as e:
+            body = json.dumps({"ok": False, "error": str(e)}).encode()
+            await send({"type": "http.response.start", "status": 400,
+                        "headers": [(b"content-type", b"application/json")]})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        headers = dict(scope.get("headers") or [])
+        last_id = flask_app.parse_last_event_id(
+            headers.get(b"last-event-id", b"").decode("latin-1") or qs.get("last_event_id", [""])[0])
+        client = self.broadcaster.add(topics, last_id)
+        wants_state = 'state' in topics
+        comp = flask_app.HUB.compressor(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        wire = comp.compress if comp else (lambda chunk: chunk)
+        response_headers = [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache"),
+                            (b"vary", b"accept-encoding")]
+        if comp:
+            response_headers.append((b"content-encoding", comp.encoding.encode()))
+        try:
+            await send({"type": "http.response.start", "status": 200, "headers": response_headers})
+            if client.replay is not None:
+                first = b"".join(client.replay) or b": resumed\n\n"
+            else:
+                first = flask_app.snapshot_chunk(wants_state)
+            await send({"type": "http.response.body", "body": wire(flask_app.SSE_RETRY + first), "more_body": True})
+
+            async def pump():
+                while True:
+                    chunks = await client.next_chunks()
+                    if client.take_resync():
+                        chunks.insert(0, flask_app.snapshot_chunk(wants_state))
+                    if chunks:
+                        await send({"type": "http.response.body", "body": wire(b"".join(chunks)), "more_body": True})
+
+            async def disconnected():
+                while (await receive())["type"] != "http.disconnect":
+                    pass
+
+            tasks = [asyncio.ensure_future(pump()), asyncio.ensure_future(disconnected())]
+            try:
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for t in tasks:
+                    t.cancel()
+        except OSError:
+            pass
+        finally:
+            self.broadcaster.remove(client)
+
+
+def raise_fd_limit():
+    """Each stream is a socket; lift the soft open-files limit to the hard limit."""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except Exception:
+        pass
+
+
+def run(host="0.0.0.0", port=5000, app=None):
+    if not UVICORN_AVAILABLE:
+        raise RuntimeError("uvicorn is not installed (pip install uvicorn asgiref)")
+    raise_fd_limit()
+    print(f"[asgi_app] Starting async dashboard at http://{host}:{port}")
+    uvicorn.run(DashboardASGI(app), host=host, port=port, log_level="warning",
+                backlog=4096, timeout_keep_alive=30)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=5000)
+    args = ap.parse_args()
+    run(args.host, args.port)
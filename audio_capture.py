@@ -0,0 +1,119 @@
+import threading
+import numpy as np
+
+try:
+    import sounddevice as sd
+    SD_AVAILABLE = True
+except Exception:
+    SD_AVAILABLE = False
+
+RING_SECONDS = 4.0
+
+
+class FrameRing:
+    """
+    Single-producer / single-consumer ring of fixed-size int16 frames.
+
+    Storage is preallocated once. The producer (the PortAudio callback) only
+    advances `_write`, the consumer only advances `_read`. Both are plain ints
+    that one thread writes and the other reads, so the data path takes no
+    lock. The Event only wakes a waiting consumer. When the ring is full the
+    incoming samples are dropped and counted in `overruns`; the producer
+    never blocks.
+    """
+    def __init__(self, frame_samples, slots):
+        self.frame_samples = int(frame_samples)
+        self.slots = int(slots)
+        self._buf = np.zeros((self.slots, self.frame_samples), dtype=np.int16)
+        self._write = 0       # frames published (producer-owned)
+        self._read = 0        # frames released (consumer-owned)
+        self._fill = 0        # samples already in the slot being filled
+        self._ready = threading.Event()
+        self.overruns = 0     # producer blocks dropped because the ring was full
+        self.dropped_samples = 0
+
+    def __len__(self):
+        return self._write - self._read
+
+    def push(self, samples):
+        """Producer side: append int16 samples (any length)."""
+        samples = samples.reshape(-1)
+        n = samples.shape[0]
+        pos = 0
+        while pos < n:
+            if self._write - self._read >= self.slots:
+                self.overruns += 1
+                self.dropped_samples += n - pos
+                self._fill = 0
+                break
+            slot = self._buf[self._write % self.slots]
+            take = min(self.frame_samples - self._fill, n - pos)
+            slot[self._fill:self._fill + take] = samples[pos:pos + take]
+            self._fill += take
+            pos += take
+            if self._fill == self.frame_samples:
+                self._fill = 0
+                self._write += 1
+                self._ready.set()
+
+    def peek(self, timeout=None):
+        """Consumer side: view of the oldest frame, or None on timeout. Call release() when done."""
+        if self._write == self._read:
+            self._ready.clear()
+            if self._write == self._read and not self._ready.wait(timeout):
+                return None
+        if self._write == self._read:
+            return None
+        return self._buf[self._read % self.slots]
+
+    def release(self):
+        self._read += 1
+
+
+class MicCapture:
+    """Callback-driven microphone capture into a FrameRing."""
+    def __init__(self, samplerate, frame_samples, seconds=RING_SECONDS, device=None):
+        self.samplerate = samplerate
+        self.frame_samples = frame_samples
+        self.device = device
+        slots = max(4, int(seconds * samplerate / frame_samples))
+        self.ring = FrameRing(frame_samples, slots)
+        self.status_overflows = 0
+        self._stream = None
+
+    def _callback(self, indata, frames, time_info, status):
+        if status and status.input_overflow:
+            self.status_overflows += 1
+        self.ring.push(indata[:, 0] if indata.ndim > 1 else indata)
+
+    def start(self):
+        if not SD_AVAILABLE:
+            raise RuntimeError("sounddevice is not available")
+        self._stream = sd.InputStream(samplerate=self.samplerate, blocksize=self.frame_samples,
+                                      dtype='int16', channels=1, device=self.device,
+                                      callback=self._callback)
+        self._stream.start()
+
+    def stop(self):
+        if self._stream is not None:
+            try:
+                self._stream.stop()
+                self._stream.close()
+            except Exception:
+                pass
+            self._stream = None
+
+    def read(self, timeout=None):
+        """Peek the next frame (int16 view) or None; pair with release()."""
+        return self.ring.peek(timeout)
+
+    def release(self):
+        self.ring.release()
+
+    def stats(self):
+        return {
+            "overruns": self.ring.overruns,
+            "dropped_samples": self.ring.dropped_samples,
+            "input_overflows": self.status_overflows,
+            "backlog_frames": len(self.ring),
+        }
@@ -0,0 +1,75 @@
+"""
+Decode time and intent accuracy: open-vocabulary vs command-grammar recognition.
+
+Takes a CSV manifest of labelled recordings (16 kHz mono 16-bit WAV):
+
+    path,intent
+    recordings/light_on_1.wav,LED_ON
+    recordings/fan_50.wav,FAN_PWM:128
+    recordings/chatter.wav,
+
+An empty intent means "no command expected" and WAKE a wake word alone. Each
+file is decoded once per mode with a reused recognizer, and the text goes
+through VoiceHandler._resolve, the pipeline's own wake detection, wake-strip
+and intent mapping.
+
+    python bench_grammar.py manifest.csv [--model models/vosk-model-small-en-us-0.15]
+"""
+import argparse
+import csv
+import json
+import time
+
+import voice_handler as vhmod
+from voice_handler import VoiceHandler
+from bench_recognition import read_frames, MODEL_PATH
+
+
+def decode(rec, frames):
+    parts = []
+    for f in frames:
+        if rec.AcceptWaveform(f):
+            parts.append(json.loads(rec.Result()).get('text', ''))
+    parts.append(json.loads(rec.FinalResult()).get('text', ''))
+    try:
+        rec.Reset()
+    except AttributeError:
+        pass
+    return " ".join(w for w in " ".join(parts).split() if w != "[unk]")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("manifest")
+    ap.add_argument("--model", default=MODEL_PATH)
+    args = ap.parse_args()
+
+    vhmod.DEBUG_EVENTS = False
+    vhmod.DEBUG_PARTIAL = False
+
+    with open(args.manifest, newline='') as f:
+        rows = [(r['path'], (r.get('intent') or '').strip() or None) for r in csv.DictReader(f)]
+
+    vh = VoiceHandler(args.model, lambda *a, **k: None, tts_enabled=False, use_grammar=False)
+
+    for mode in ("free", "command"):
+        rec = vh._recognizer_for(mode)
+        cpu = 0.0; audio_s = 0.0; correct = 0
+        for path, expected in rows:
+            frames = read_frames(path)
+            audio_s += len(frames) * vhmod.FRAME_MS / 1000.0
+            t0 = time.process_time()
+            text = decode(rec, frames)
+            cpu += time.process_time() - t0
+
+            got, _ = vh._resolve(text)
+            correct += (got == expected)
+            print(f"[{mode}] {path}: '{text}' -> {got} (expected {expected})")
+
+        n = len(rows) or 1
+        print(f"{mode:>8}: {cpu / n * 1000:.1f} ms CPU/file, RTF {cpu / max(audio_s, 1e-9):.3f}, "
+              f"intent accuracy {correct}/{len(rows)} ({correct / n * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
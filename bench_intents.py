@@ -0,0 +1,126 @@
+"""
+Intent resolution benchmark over a labelled text corpus.
+
+Checks that IntentMatcher agrees with the old linear _map_intent on the corpus
+and the expected labels, then times both as the phrase table grows (the real
+INTENT_MAP padded with synthetic scene phrases).
+
+    python bench_intents.py [--sizes 21 200 800] [--repeat 20]
+"""
+import argparse
+import re
+import time
+
+from rapidfuzz import fuzz
+
+from voice_handler import INTENT_MAP, MISHEAR_MAP, INTENT_FUZZ, ON_OFF_FUZZ
+from intent_index import IntentMatcher
+
+# (utterance as recognised, expected intent)
+CORPUS = [
+    ("turn light on", "LED_ON"), ("turn the light on", "LED_ON"), ("light on please", "LED_ON"),
+    ("turn light off", "LED_OFF"), ("switch the light off", "LED_OFF"), ("lite off", "LED_OFF"),
+    ("turn right on", "LED_ON"), ("fan on", "FAN_ON"), ("turn fan on", "FAN_ON"),
+    ("turn the fan on", "FAN_ON"), ("than on", "FAN_ON"), ("pan off", "FAN_OFF"),
+    ("turn fan off", "FAN_OFF"), ("fan of", "FAN_OFF"), ("set fan auto", "FAN_AUTO"),
+    ("fan auto", "FAN_AUTO"), ("auto fan", "FAN_AUTO"), ("set led auto", "LED_AUTO"),
+    ("led auto", "LED_AUTO"), ("go auto", "VOICE_SLEEP"), ("auto mode", "VOICE_SLEEP"),
+    ("stop vista", "VOICE_SLEEP"), ("bye vesta", "VOICE_SLEEP"), ("status", "STATUS"),
+    ("what is the weather", None), ("tell me a joke", None), ("good morning", None),
+    ("hmm", None), ("i am going to bed now", None),
+]
+
+
+def legacy_map_intent(text, intent_map):
+    """The pre-index VoiceHandler._map_intent (linear scans on every call)."""
+    t = text.lower().strip()
+    if not t:
+        return None
+    if t in intent_map:
+        return intent_map[t]
+    best = (None, 0)
+    for k, v in intent_map.items():
+        s = fuzz.ratio(k, t)
+        if s > best[1]:
+            best = (v, s)
+    if best[1] >= INTENT_FUZZ:
+        return best[0]
+    words = re.findall(r"[a-zA-Z]+", t)
+    if not words:
+        return None
+    device = None; action = None
+    if "light" in words: device = "light"
+    elif "fan" in words: device = "fan"
+    else:
+        for w in words:
+            if w in MISHEAR_MAP:
+                device = MISHEAR_MAP[w]; break
+    for w in words:
+        if fuzz.partial_ratio("on", w) >= ON_OFF_FUZZ:
+            action = "on"; break
+        if fuzz.partial_ratio("off", w) >= ON_OFF_FUZZ:
+            action = "off"; break
+    if action is None:
+        if re.search(r'\bon\b', t): action = "on"
+        if re.search(r'\boff\b', t): action = "off"
+    if device and action:
+        if device == "fan":
+            return "FAN_ON" if action == "on" else "FAN_OFF"
+        return "LED_ON" if action == "on" else "LED_OFF"
+    if len(t.split()) <= 2:
+        for k, v in intent_map.items():
+            if fuzz.partial_ratio(k, t) >= (INTENT_FUZZ - 8):
+                return v
+    return None
+
+
+def padded_map(size):
+    m = dict(INTENT_MAP)
+    i = 0
+    while len(m) < size:
+        m[f"activate scene number {i} now"] = f"SCENE_{i}"
+        i += 1
+    return m
+
+
+def time_per_call(fn, texts, repeat):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for t in texts:
+            fn(t)
+    return (time.perf_counter() - t0) / (repeat * len(texts))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[len(INTENT_MAP), 200, 800])
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    matcher = IntentMatcher(INTENT_MAP, MISHEAR_MAP, intent_fuzz=INTENT_FUZZ, on_off_fuzz=ON_OFF_FUZZ)
+    correct = agree = 0
+    for text, expected in CORPUS:
+        got = matcher(text)
+        old = legacy_map_intent(text, INTENT_MAP)
+        correct += (got == expected)
+        agree += (got == old)
+        if got != expected or got != old:
+            print(f"  '{text}': index={got} legacy={old} expected={expected}")
+    print(f"accuracy {correct}/{len(CORPUS)}, agreement with legacy {agree}/{len(CORPUS)}")
+
+    texts = [t for t, _ in CORPUS]
+    for size in args.sizes:
+        m = padded_map(size)
+        legacy = time_per_call(lambda t: legacy_map_intent(t, m), texts, args.repeat)
+        cold = IntentMatcher(m, MISHEAR_MAP, intent_fuzz=INTENT_FUZZ, on_off_fuzz=ON_OFF_FUZZ, cache_size=0)
+        uncached = time_per_call(cold, texts, args.repeat)
+        warm = IntentMatcher(m, MISHEAR_MAP, intent_fuzz=INTENT_FUZZ, on_off_fuzz=ON_OFF_FUZZ)
+        for t in texts:
+            warm(t)
+        cached = time_per_call(warm, texts, args.repeat)
+        print(f"{len(m):5d} phrases: legacy {legacy * 1e6:8.1f} us  index {uncached * 1e6:7.1f} us  "
+              f"index+cache {cached * 1e6:6.2f} us  per utterance")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Recognition CPU benchmark over recorded WAV files (16 kHz, mono, 16-bit).
+
+Compares the old double-decode pipeline (feed speech frames, then re-feed the
+whole utterance buffer, then build a new KaldiRecognizer) with the current
+single-pass VoiceHandler pipeline (every frame decoded once, recognizer reset
+and reused). Reports CPU seconds per utterance for each.
+
+Only the decode structure differs: the single-pass side runs with the open
+vocabulary model, a fixed threshold, no speech gate and no early intents,
+like the legacy loop. Grammar decoding is measured by bench_grammar.py.
+
+    python bench_recognition.py recordings/*.wav
+    python bench_recognition.py --model models/vosk-model-small-en-us-0.15 a.wav b.wav
+"""
+import argparse
+import json
+import time
+import wave
+
+import numpy as np
+from vosk import KaldiRecognizer
+
+import voice_handler as vhmod
+from voice_handler import VoiceHandler, SAMPLE_RATE, FRAME_SAMPLES, FRAME_MS, CALIBRATE_SECONDS, SILENCE_FRAMES
+
+MODEL_PATH = "models/vosk-model-small-en-us-0.15"
+
+
+def read_frames(path):
+    with wave.open(path, 'rb') as w:
+        if w.getnchannels() != 1 or w.getsampwidth() != 2 or w.getframerate() != SAMPLE_RATE:
+            raise ValueError(f"{path}: need {SAMPLE_RATE} Hz mono 16-bit PCM")
+        pcm = w.readframes(w.getnframes())
+    step = FRAME_SAMPLES * 2
+    return [pcm[i:i + step] for i in range(0, len(pcm) - step + 1, step)]
+
+
+def calibrate(vh, frames):
+    n = int((CALIBRATE_SECONDS * 1000) / FRAME_MS)
+    levels = [vh._rms(f) for f in frames[:n]]
+    return VoiceHandler._threshold_from_levels(levels), frames[n:]
+
+
+def run_legacy(vh, frames, threshold):
+    """The pre-refactor loop: per-frame decode + full-buffer re-decode + new recognizer."""
+    model = vh.model
+    rec = KaldiRecognizer(model, SAMPLE_RATE)
+    buf = bytearray(); started = False; silence = 0
+    texts = []
+    for data in frames:
+        level = vh._rms(data)
+        if level > threshold:
+            buf.extend(data); started = True; silence = 0
+            rec.AcceptWaveform(data)
+        elif started:
+            buf.extend(data); silence += 1
+            if silence > SILENCE_FRAMES:
+                if rec.AcceptWaveform(bytes(buf)):
+                    res = json.loads(rec.Result())
+                else:
+                    res = json.loads(rec.FinalResult())
+                texts.append(res.get('text', ''))
+                buf = bytearray(); started = False; silence = 0
+                rec = KaldiRecognizer(model, SAMPLE_RATE)
+    return texts
+
+
+def run_single_pass(vh, frames, threshold):
+    texts = []
+    vh.threshold = threshold
+    vh._handle_text = texts.append
+    vh._reconcile_early = lambda text, early: texts.append(text)
+    vh._reset_utterance()
+    for data in frames:
+        vh._process_frame(data)
+    return texts
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("wavs", nargs="+")
+    ap.add_argument("--model", default=MODEL_PATH)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    vhmod.DEBUG_EVENTS = False
+    vhmod.DEBUG_PARTIAL = False
+    # isolate the single-pass change: same fixed threshold and open vocabulary as the legacy loop
+    vhmod.ADAPTIVE_THRESHOLD = False
+    vhmod.EARLY_INTENT = False
+
+    vh = VoiceHandler(args.model, lambda *a, **k: None, tts_enabled=False, use_grammar=False)
+    vh.gate.is_speech = lambda data: True     # legacy onset is the RMS threshold alone
+
+    totals = {"legacy": [0.0, 0], "single": [0.0, 0]}
+    for path in args.wavs:
+        threshold, frames = calibrate(vh, read_frames(path))
+        for _ in range(args.repeat):
+            for name, fn in (("legacy", lambda: run_legacy(vh, frames, threshold)),
+                             ("single", lambda: run_single_pass(vh, frames, threshold))):
+                t0 = time.process_time()
+                texts = fn()
+                totals[name][0] += time.process_time() - t0
+                totals[name][1] += len(texts)
+        print(f"{path}: {texts}")
+
+    per = {}
+    for name, (cpu, utts) in totals.items():
+        per[name] = cpu / utts if utts else float('nan')
+        print(f"{name:>7}: {cpu:.3f}s CPU over {utts} utterances -> {per[name] * 1000:.1f} ms/utterance")
+    if np.isfinite(per["legacy"]) and np.isfinite(per["single"]) and per["legacy"]:
+        print(f"saved: {(per['legacy'] - per['single']) * 1000:.1f} ms CPU per utterance "
+              f"({(1 - per['single'] / per['legacy']) * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
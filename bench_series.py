@@ -0,0 +1,63 @@
+"""
+Benchmark for series_store: fill a year of 1 Hz sensor frames, then time
+/api/series-style queries over 1 hour .. 1 year, and the per-frame cost of
+keeping the rollups current.
+
+    python bench_series.py [--days 365] [--points 500]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from series_store import SeriesStore, METRICS
+
+
+def synth_day(t0, rng):
+    ts = t0 + np.arange(86400, dtype=np.float64)
+    day = np.sin((ts % 86400) / 86400 * 2 * np.pi)
+    vals = np.empty((ts.size, len(METRICS)))
+    vals[:, 0] = 24 + 4 * day + rng.normal(0, 0.3, ts.size)          # temp
+    vals[:, 1] = 45 - 10 * day + rng.normal(0, 1.0, ts.size)         # hum
+    vals[:, 2] = rng.random(ts.size) < 0.05                           # pir
+    vals[:, 3] = 0
+    vals[:, 4] = vals[:, 2]
+    vals[:, 5] = np.where(vals[:, 0] > 26, 200, 0)
+    return ts, vals
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--days", type=int, default=365)
+    ap.add_argument("--points", type=int, default=500)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    store = SeriesStore()
+    now = time.time()
+    start = now - args.days * 86400
+    t0 = time.perf_counter()
+    for d in range(args.days):
+        store.ingest(*synth_day(start + d * 86400, rng))
+    print(f"ingested {args.days} days of 1 Hz frames in {time.perf_counter() - t0:.1f}s")
+
+    n = 2000
+    t0 = time.perf_counter()
+    for i in range(n):
+        store.observe({"temp": 24.0, "hum": 40, "pir": 0, "smoke": 0, "led": False, "fan": 0}, ts=now + i)
+    print(f"live update: {(time.perf_counter() - t0) / n * 1e6:.0f} us per frame")
+
+    for label, span in (("1 hour", 3600), ("24 hours", 86400), ("7 days", 7 * 86400),
+                        ("30 days", 30 * 86400), ("1 year", 365 * 86400)):
+        for mode in ("minmax", "lttb"):
+            reps = 20
+            t0 = time.perf_counter()
+            for _ in range(reps):
+                r = store.query("temp", now - span, now, points=args.points, mode=mode)
+            ms = (time.perf_counter() - t0) / reps * 1000
+            print(f"{label:>8} {mode:>6}: {ms:6.2f} ms  tier {r['tier']:>3}  "
+                  f"{r['buckets']} buckets -> {len(r['t'])} points")
+
+
+if __name__ == "__main__":
+    main()
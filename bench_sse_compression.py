@@ -0,0 +1,119 @@
+"""
+Bytes-on-wire for the dashboard's SSE stream, plain vs per-connection
+compression (event_hub.StreamCompressor, one zlib stream sync-flushed per
+event).
+
+The input is a recorded event stream: either captured from a running
+dashboard, or synthesised in-process by driving flask_app with
+simulator-like sensor frames, voice events and mic levels.
+
+    python bench_sse_compression.py --record http://127.0.0.1:5000/events/stream --seconds 120
+    python bench_sse_compression.py --replay sse_recording.txt
+    python bench_sse_compression.py                       # synthetic 30 minutes at 1 Hz
+"""
+import argparse
+import gzip
+import random
+import time
+import urllib.request
+import zlib
+
+import event_hub
+from event_hub import StreamCompressor
+
+
+def record(url, seconds, out):
+    req = urllib.request.Request(url, headers={"Accept": "text/event-stream", "Accept-Encoding": "identity"})
+    data = b""
+    end = time.time() + seconds
+    with urllib.request.urlopen(req, timeout=seconds + 20) as r:
+        while time.time() < end:
+            chunk = r.read1(65536)
+            if not chunk:
+                break
+            data += chunk
+    with open(out, "wb") as f:
+        f.write(data)
+    print(f"recorded {len(data)} bytes from {url} in {seconds}s -> {out}")
+    return data
+
+
+def synthesize(seconds, seed=0):
+    """SSE bytes a dashboard would receive over `seconds` of simulated 1 Hz telemetry."""
+    import flask_app
+    rnd = random.Random(seed)
+    sub = flask_app.HUB.subscribe()
+    out = [flask_app.SSE_RETRY + flask_app.snapshot_chunk(True)]
+    temp, hum, fan, led = 24.0, 45.0, 0, False
+    for step in range(seconds):
+        temp = round(temp + rnd.uniform(-0.2, 0.2), 1)
+        hum = round(hum + rnd.choice((-1, 0, 0, 1)), 0)
+        if step % 20 == 0:
+            led = not led
+            fan = 150 if led else 0
+        flask_app.update_state({"temp": temp, "hum": hum, "pir": int(step % 20 == 0), "smoke": 0,
+                                "led": led, "fan": fan})
+        flask_app.publish_rms(rnd.choice((0, 0, 0, rnd.randint(0, 1000))))
+        if step % 90 == 45:
+            flask_app.emit_voice("You: turn on the light", "LED_ON")
+            flask_app.emit_voice("Vista: Okay, turning the light on", None)
+        if step % 15 == 14:
+            out.append(b": heartbeat\n\n" + event_hub.encode("uptime", step))
+        out.extend(sub.take(timeout=0))
+    flask_app.HUB.unsubscribe(sub)
+    return b"".join(out)
+
+
+def split_events(data):
+    parts = data.split(b"\n\n")
+    events = [p + b"\n\n" for p in parts[:-1] if p]
+    if parts[-1]:
+        events.append(parts[-1])
+    return events
+
+
+def measure(events):
+    raw = sum(len(e) for e in events)
+    print(f"{len(events)} events, {raw} bytes plain ({raw / len(events):.0f} B/event)")
+    rows = [("identity", raw, 0.0)]
+
+    for enc, wbits in (("gzip", 16 + zlib.MAX_WBITS), ("deflate", zlib.MAX_WBITS)):
+        comp = StreamCompressor(enc)
+        dec = zlib.decompressobj(wbits)
+        t0 = time.perf_counter()
+        wire = [comp.compress(e) for e in events]
+        cpu = time.perf_counter() - t0
+        # every flushed piece must decode to its whole event on arrival (no buffering delay)
+        for e, w in zip(events, wire):
+            assert dec.decompress(w) == e
+        rows.append((f"{enc} stream", comp.wire_bytes, cpu))
+
+    t0 = time.perf_counter()
+    independent = sum(len(gzip.compress(e, mtime=0)) for e in events)
+    rows.append(("gzip per event", independent, time.perf_counter() - t0))
+
+    for name, n, cpu in rows:
+        print(f"  {name:<15} {n:>10} bytes  {100 * n / raw:6.1f} %  "
+              f"{n / len(events):7.1f} B/event  {cpu / len(events) * 1e6:6.1f} us/event")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--record", metavar="URL", help="capture a live /events/stream first")
+    ap.add_argument("--seconds", type=int, default=1800)
+    ap.add_argument("--out", default="sse_recording.txt")
+    ap.add_argument("--replay", metavar="FILE", help="use a previously recorded stream")
+    args = ap.parse_args()
+
+    if args.record:
+        data = record(args.record, args.seconds, args.out)
+    elif args.replay:
+        with open(args.replay, "rb") as f:
+            data = f.read()
+    else:
+        data = synthesize(args.seconds)
+    measure(split_events(data))
+
+
+if __name__ == "__main__":
+    main()
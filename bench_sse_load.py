@@ -0,0 +1,182 @@
+"""
+Load test for the dashboard's SSE serving modes: N idle streams on one box.
+
+Starts the server in a child process (this script with --serve), opens N
+/events/stream?topics=state connections from a single asyncio client, then
+reports the server's memory and CPU while the streams sit idle, and how long
+one state change takes to reach all of them.
+
+    python bench_sse_load.py --clients 5000                 # async server (asgi_app)
+    python bench_sse_load.py --clients 300 --server wsgi    # Flask threaded server, for comparison
+"""
+import argparse
+import asyncio
+import os
+import re
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+# the tick is a state change setting temp to the server's time.time() (in a delta or a snapshot)
+TICK_RE = re.compile(rb'"temp": ([0-9]{9,}\.[0-9]+)')
+
+
+# ---------------- Server side ----------------
+def serve(kind, port):
+    import flask_app
+
+    @flask_app.app.route('/_bench/tick', methods=['POST'])
+    def bench_tick():
+        flask_app.update_state({'temp': time.time()})
+        return ('', 204)
+
+    if kind == "asgi":
+        import asgi_app
+        asgi_app.run("127.0.0.1", port)
+    else:
+        flask_app.app.run(host="127.0.0.1", port=port, threaded=True)
+
+
+def proc_rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024.0
+    return 0.0
+
+
+def proc_cpu_s(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+# ---------------- Client side ----------------
+class Stream:
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+        self.ready = asyncio.Event()
+        self.got_tick = None
+
+
+async def open_stream(port, st, sem):
+    async with sem:
+        st.reader, st.writer = await asyncio.open_connection("127.0.0.1", port)
+        st.writer.write(b"GET /events/stream?topics=state HTTP/1.1\r\nHost: bench\r\n"
+                        b"Accept: text/event-stream\r\n\r\n")
+        await st.writer.drain()
+        buf = b""
+        while b"event: state" not in buf:
+            data = await st.reader.read(65536)
+            if not data:
+                raise ConnectionError("stream closed before the first snapshot")
+            buf += data
+    st.ready.set()
+
+
+async def watch(st, tick):
+    buf = b""
+    while st.got_tick is None:
+        data = await st.reader.read(65536)
+        if not data:
+            return
+        buf = (buf + data)[-4096:]
+        m = TICK_RE.search(buf)
+        if m and float(m.group(1)) == tick:
+            st.got_tick = time.time()
+
+
+async def run_clients(args, pid):
+    sem = asyncio.Semaphore(200)
+    streams = [Stream() for _ in range(args.clients)]
+    rss0 = proc_rss_mb(pid)
+    t0 = time.time()
+    results = await asyncio.gather(*(open_stream(args.port, st, sem) for st in streams),
+                                   return_exceptions=True)
+    errors = [r for r in results if isinstance(r, Exception)]
+    streams = [st for st in streams if st.ready.is_set()]
+    print(f"{len(streams)} streams open in {time.time() - t0:.1f}s ({len(errors)} failed"
+          + (f", first error: {errors[0]!r}" if errors else "") + ")")
+
+    rss1 = proc_rss_mb(pid)
+    cpu0 = proc_cpu_s(pid)
+    await asyncio.sleep(args.idle)
+    cpu1 = proc_cpu_s(pid)
+    print(f"server RSS {rss0:.0f} MB -> {rss1:.0f} MB "
+          f"({(rss1 - rss0) * 1024 / max(len(streams), 1):.1f} KB per stream)")
+    print(f"server CPU while idle: {100 * (cpu1 - cpu0) / args.idle:.2f} % over {args.idle:.0f}s")
+
+    # fan-out: one state change, time until every stream has it
+    for _ in range(3):
+        reader, writer = await asyncio.open_connection("127.0.0.1", args.port)
+        before = time.time()
+        writer.write(b"POST /_bench/tick HTTP/1.1\r\nHost: bench\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+        await writer.drain()
+        await reader.read()
+        writer.close()
+        # the tick value is the server's time.time() at publish; match on whatever arrives first
+        try:
+            tick = await asyncio.wait_for(first_tick(streams[0]), 10) if streams else None
+        except asyncio.TimeoutError:
+            tick = None
+        if tick is None:
+            print("no tick received")
+            break
+        watchers = [asyncio.ensure_future(watch(st, tick)) for st in streams[1:]]
+        await asyncio.wait(watchers, timeout=10)
+        for w in watchers:
+            w.cancel()
+        lat = np.array([st.got_tick - tick for st in streams if st.got_tick is not None])
+        print(f"fan-out to {lat.size}/{len(streams)} streams: p50 {np.percentile(lat, 50) * 1000:.0f} ms, "
+              f"p95 {np.percentile(lat, 95) * 1000:.0f} ms, max {lat.max() * 1000:.0f} ms "
+              f"(request sent {1000 * (tick - before):.0f} ms before publish)")
+        for st in streams:
+            st.got_tick = None
+
+    for st in streams:
+        st.writer.close()
+
+
+async def first_tick(st):
+    buf = b""
+    while True:
+        data = await st.reader.read(65536)
+        if not data:
+            return None
+        buf = (buf + data)[-4096:]
+        m = TICK_RE.search(buf)
+        if m:
+            st.got_tick = time.time()
+            return float(m.group(1))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clients", type=int, default=5000)
+    ap.add_argument("--server", choices=("asgi", "wsgi"), default="asgi")
+    ap.add_argument("--port", type=int, default=5077)
+    ap.add_argument("--idle", type=float, default=20.0, help="seconds to measure idle CPU")
+    ap.add_argument("--serve", choices=("asgi", "wsgi"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+
+    from asgi_app import raise_fd_limit
+    raise_fd_limit()
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", args.server,
+                               "--port", str(args.port)], stdout=subprocess.DEVNULL)
+    try:
+        time.sleep(3.0)
+        asyncio.run(run_clients(args, server.pid))
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
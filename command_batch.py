@@ -0,0 +1,109 @@
+"""
+Server-side debouncing for high-rate dashboard controls.
+
+Dragging the fan slider produces a stream of FAN_PWM:<n> commands. Only the
+last one matters, and each one applied would be a serial write. Debouncer
+holds such commands per key (the command prefix). The first command opens a
+DEBOUNCE_SECONDS window. When the window closes, the newest value seen is
+applied once and the ones it replaced are dropped. A continuous drag
+therefore reaches the Arduino at most once per window, and the final position
+always gets there.
+
+    deb = Debouncer(apply_fn)          # apply_fn(cmd) -> None, raises on failure
+    if deb.key(cmd): deb.submit(cmd)   # else deb.apply_now(cmd), which flushes first to keep order
+"""
+import threading
+
+DEBOUNCE_PREFIXES = ("FAN_PWM:",)
+DEBOUNCE_SECONDS = 0.15
+BATCH_MAX = 64            # commands accepted in one POST /commands
+
+
+class Debouncer:
+    """
+    One apply lock orders every command: a window closing, flush() and
+    apply_now() each pop and apply while holding it, so a debounced
+    FAN_PWM can never land after a FAN_OFF sent later. A debounced command
+    is acked when it is queued; if applying it fails later, on_error(cmd, exc)
+    is called to report it.
+    """
+    def __init__(self, apply, window=DEBOUNCE_SECONDS, prefixes=DEBOUNCE_PREFIXES, on_error=None):
+        self.apply = apply
+        self.on_error = on_error
+        self.window = window
+        self.prefixes = tuple(prefixes)
+        self._pending = {}      # key -> newest command
+        self._timers = {}       # key -> open window
+        self._lock = threading.Lock()           # pending/timers/counters
+        self._apply_lock = threading.RLock()    # held across pop + apply
+        self.received = 0
+        self.applied = 0
+        self.superseded = 0
+        self.failed = 0
+
+    def key(self, cmd):
+        """Debounce key for `cmd`, or None if it should be applied immediately."""
+        for p in self.prefixes:
+            if cmd.startswith(p):
+                return p
+        return None
+
+    def submit(self, cmd):
+        key = self.key(cmd)
+        with self._lock:
+            self.received += 1
+            if key in self._pending:
+                self.superseded += 1
+            self._pending[key] = cmd
+            if key not in self._timers:
+                t = threading.Timer(self.window, self._fire, (key,))
+                t.daemon = True
+                self._timers[key] = t
+                t.start()
+
+    def flush(self):
+        """Apply every pending command now (keeps order with a command applied right after)."""
+        with self._apply_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                timers, self._timers = self._timers, {}
+            for t in timers.values():
+                t.cancel()
+            for cmd in pending.values():
+                self._apply(cmd)
+
+    def apply_now(self, cmd):
+        """Flush pending commands, then apply `cmd` (raises on failure) in the same ordered step."""
+        with self._apply_lock:
+            self.flush()
+            self.apply(cmd)
+
+    def _fire(self, key):
+        with self._apply_lock:
+            with self._lock:
+                self._timers.pop(key, None)
+                cmd = self._pending.pop(key, None)
+            if cmd is not None:
+                self._apply(cmd)
+
+    def _apply(self, cmd):
+        try:
+            self.apply(cmd)
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            print(f"[command_batch] debounced {cmd} failed: {e}")
+            if self.on_error:
+                try:
+                    self.on_error(cmd, e)
+                except Exception as e2:
+                    print(f"[command_batch] on_error failed: {e2}")
+            return
+        with self._lock:
+            self.applied += 1
+
+    def stats(self):
+        with self._lock:
+            return {"received": self.received, "applied": self.applied,
+                    "superseded": self.superseded, "failed": self.failed,
+                    "pending": len(self._pending)}
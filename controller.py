@@ -2,7 +2,9 @@ import threading
 import time
 import json
 from queue import Queue, Empty
-from rapidfuzz import fuzz 
+import phrase_detect
+import latency_trace
+import series_store
 import csv
 import os
 import time
@@ -29,13 +31,18 @@ VOICE_FIELDNAMES = ['timestamp', 'text', 'intent']
 ACTION_FIELDNAMES = ['timestamp', 'source', 'intent', 'temp', 'hum', 'pir', 'smoke', 'led_state', 'fan_speed']
 DEFAULT_OVERRIDE_PRIORITY = {'dashboard': 2, 'voice': 2, 'auto': 1}
 
-# phrases
-WAKE_PHRASES = ("hey vista","hey vesta","hi vista","hii vista","hello vista","hello vesta", "hello", "heavy stuff")
-SLEEP_PHRASES = ("stop vista","bye vista","sleep","go auto","auto mode","goodbye vista")
+# phrases (shared with voice_handler's grammars)
+WAKE_PHRASES = phrase_detect.WAKE_PHRASES
+SLEEP_PHRASES = phrase_detect.SLEEP_PHRASES
 
 WAKEFUZZ_FALLBACK = 75
 SLEEPFUZZ_FALLBACK = 75
 
+# shared detectors, reconfigurable at runtime via phrase_detect.configure("wake"/"sleep", ...).
+# Both score through the "voice" pool with VoiceHandler's "voice_wake", so an utterance is scanned once.
+WAKE_DETECTOR = phrase_detect.register("wake", WAKE_PHRASES, WAKEFUZZ_FALLBACK, pool="voice")
+SLEEP_DETECTOR = phrase_detect.register("sleep", SLEEP_PHRASES, SLEEPFUZZ_FALLBACK, pool="voice")
+
 # ---------------- Controller ----------------
 class Controller:
     def __init__(self, serial_port=SERIAL_PORT, baud=BAUD, override_priority=None, ml_brain=None):
@@ -58,6 +65,8 @@ class Controller:
         self._sim_thread = None
         self.command_queue = Queue()
         self.voice_active = False
+        # called with the new voice_active flag (e.g. VoiceHandler grammar switching)
+        self.voice_state_listener = None
         self._state_lock = threading.RLock()
         
         # --- NEW: CSV Header setup ---
@@ -99,6 +108,28 @@ class Controller:
                 print(f"[controller] Failed to write to {filename}: {e}")
 
 
+    def _observe_telemetry(self, frame):
+        """Feed a sensor frame to the chart rollups and the ML feature stage (rolling windows), if the brain has one."""
+        try:
+            series_store.SERIES.observe(frame)
+        except Exception as e:
+            print(f"[controller] series rollup update failed: {e}")
+        observe = getattr(self.ml_brain, 'observe', None)
+        if observe:
+            try:
+                observe(frame)
+            except Exception as e:
+                print(f"[controller] ML feature update failed: {e}")
+
+    def _set_voice_active(self, active):
+        changed = (self.voice_active != active)
+        self.voice_active = active
+        if changed and self.voice_state_listener:
+            try:
+                self.voice_state_listener(active)
+            except Exception as e:
+                print(f"[controller] voice state listener failed: {e}")
+
     # ---------------- Serial open/close ----------------
     def _open_serial(self):
         if not SERIAL_AVAILABLE or not self.serial_port:
@@ -139,7 +170,8 @@ class Controller:
     # ---------------- Queue send ----------------
     def send_command(self, cmd: str, source='auto', force=False):
         """ Enqueue a command. """
-        self.command_queue.put(cmd)
+        # the writer thread marks serial_written on the caller's latency trace
+        self.command_queue.put((cmd, latency_trace.mark("command_enqueued")))
 
     # ---------------- Local apply fo immediate UI feedback ----------------
     def _apply_local_command(self, cmd: str):
@@ -192,6 +224,7 @@ class Controller:
             
             if obj:
                 self._log_to_csv(obj, SENSOR_LOG_FILE)
+                self._observe_telemetry(obj)
 
             changed = {}
             with self._state_lock:
@@ -218,7 +251,18 @@ class Controller:
         """
         Handle an intent originating from voice/dashboard/auto.
         This is now the main logging and ML training hub.
+        Voice intents continue the VoiceHandler's latency trace; other sources start their own.
         """
+        trace = latency_trace.current()
+        if trace is None:
+            trace = latency_trace.TRACES.start(source, text=text, intent=intent, first_stage="intent_mapped")
+        with latency_trace.active(trace):
+            try:
+                return self._apply_intent(intent, text, source)
+            finally:
+                trace.mark("callback_returned")
+
+    def _apply_intent(self, intent: str, text: str=None, source='voice'):
         txt = (text or "").lower().strip()
         
         with self._state_lock:
@@ -231,20 +275,16 @@ class Controller:
 
         # --- FUZZY CHECK FUNCTIONS ---
         def text_has_wake_word(text_to_check):
-            if not text_to_check: return False
-            for w in WAKE_PHRASES:
-                if fuzz.partial_ratio(w, text_to_check) >= WAKEFUZZ_FALLBACK:
-                    print(f"[controller] Fallback WAKE detected: '{text_to_check}' matches '{w}'")
-                    return True
-            return False
+            m = WAKE_DETECTOR.detect(text_to_check)
+            if m:
+                print(f"[controller] Fallback WAKE detected: '{text_to_check}' matches '{m.phrase}'")
+            return m is not None
 
         def text_has_sleep_word(text_to_check):
-            if not text_to_check: return False
-            for s in SLEEP_PHRASES:
-                if fuzz.partial_ratio(s, text_to_check) >= SLEEPFUZZ_FALLBACK:
-                    print(f"[controller] Fallback SLEEP detected: '{text_to_check}' matches '{s}'")
-                    return True
-            return False
+            m = SLEEP_DETECTOR.detect(text_to_check)
+            if m:
+                print(f"[controller] Fallback SLEEP detected: '{text_to_check}' matches '{m.phrase}'")
+            return m is not None
 
 
         #Handle WAKE
@@ -254,7 +294,7 @@ class Controller:
         )
         
         if is_wake_command:
-            self.voice_active = True
+            self._set_voice_active(True)
             emit_voice("Vista: Voice active.", intent="WAKE")
             print("[controller] voice activated")
             # --- NEW: Log voice wake ---
@@ -278,7 +318,7 @@ class Controller:
                 self.state['fan_mode'] = 'auto'
                 update_state(self.state.copy())
 
-            self.voice_active = False
+            self._set_voice_active(False)
 
             emit_voice("Vista: Voice deactivated. Returning to auto.", intent="SLEEP")
             print("[controller] voice deactivated (sleep phrase)")
@@ -457,11 +497,13 @@ class Controller:
     def _writer_loop(self):
         while self._running:
             try:
-                cmd = self.command_queue.get(timeout=0.2)
+                cmd, trace = self.command_queue.get(timeout=0.2)
             except Empty:
                 continue
             try:
                 self.send_raw(cmd)
+                if trace is not None:
+                    trace.mark("serial_written")
             except Exception as e:
                 print("[controller] failed to send command:", e)
 
@@ -517,6 +559,7 @@ class Controller:
                     "fan": self.state.get('fan', 0)
                 }
                 self._log_to_csv(sim_data, SENSOR_LOG_FILE)
+            self._observe_telemetry(sim_data)
             
             update_state(self.state.copy())
             step += 1
@@ -0,0 +1,315 @@
+"""
+Server-sent-event broadcaster for the dashboard.
+
+publish() encodes an event to its SSE wire form exactly once and hands the
+same bytes to every subscriber, so CPU no longer scales with
+clients x events. Each subscriber keeps a small pending queue. Events whose
+latest value supersedes older ones (state, mic level, uptime) are coalesced:
+while one is still pending, a newer one replaces its payload in place instead
+of queueing behind it. A client that still falls SUB_QUEUE events behind is
+counted as slow. Its backlog is dropped and it is resynchronised with fresh
+snapshots, instead of silently losing an arbitrary subset of events.
+
+Clients subscribe to topics (EVENT_TOPICS maps event names onto them). The
+hub keeps one subscriber set per topic, and an event whose topic has no
+subscribers is neither encoded nor queued.
+
+Events that matter after a reconnect (REPLAY_EVENTS) get a monotonically
+increasing SSE id and are kept in a bounded replay ring (stored unencoded
+when nobody was listening). A client reconnecting with Last-Event-ID gets
+exactly the events it missed. If the gap no longer fits in the ring, it
+gets a fresh snapshot instead.
+
+A stream can also be compressed (StreamCompressor). A client that sends
+Accept-Encoding: gzip or deflate gets one zlib stream per connection,
+sync-flushed after every write. Each event therefore reaches the browser at
+once, but shares its dictionary with everything sent before it, so repeated
+state JSON shrinks to a few bytes.
+"""
+import json
+import threading
+import time
+import zlib
+from collections import deque
+
+SUB_QUEUE = 256
+# events where only the newest value matters
+COALESCE_EVENTS = ("state", "voice_rms", "uptime")
+# event name -> topic a client subscribes to (/events/stream?topics=state,voice)
+EVENT_TOPICS = {
+    "state": "state", "delta": "state",
+    "voice_event": "voice",
+    "voice_rms": "rms",
+    "action_ack": "actions",
+    "uptime": "uptime",
+}
+TOPICS = frozenset(EVENT_TOPICS.values())
+# events replayed to reconnecting clients; mic level and uptime are ephemeral
+REPLAY_EVENTS = ("state", "delta", "voice_event", "action_ack")
+REPLAY_RING = 512
+# per-connection stream compression: small window/memLevel keep each stream's zlib state near 32 KB
+SSE_COMPRESS = True
+SSE_COMPRESS_LEVEL = 6
+SSE_ZLIB_WBITS = 12
+SSE_ZLIB_MEMLEVEL = 5
+
+
+def encode(event, data, eid=None):
+    """SSE wire bytes for one event (with an `id:` line when eid is given)."""
+    head = f"id: {eid}\n" if eid is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+def check_topics(topics):
+    topics = TOPICS if topics is None else frozenset(topics)
+    unknown = topics - TOPICS
+    if unknown:
+        raise ValueError("unknown topics: " + ", ".join(sorted(unknown)))
+    return topics
+
+
+def negotiate_encoding(accept_encoding):
+    """'gzip', 'deflate' or None for an Accept-Encoding header value (q=0 excludes)."""
+    if not SSE_COMPRESS or not accept_encoding:
+        return None
+    offered = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip().lower()] = q
+    for enc in ("gzip", "deflate"):
+        if offered.get(enc, offered.get("*", 0.0)) > 0:
+            return enc
+    return None
+
+
+class StreamCompressor:
+    """One compressed stream per connection; every compress() call is flushed to a byte boundary."""
+    def __init__(self, encoding, totals=None):
+        self.encoding = encoding
+        self.totals = totals        # shared {"raw": n, "wire": n} across streams (approximate)
+        # gzip container (16 + wbits) or zlib-wrapped deflate, which is what HTTP calls "deflate"
+        wbits = 16 + SSE_ZLIB_WBITS if encoding == "gzip" else SSE_ZLIB_WBITS
+        self._z = zlib.compressobj(SSE_COMPRESS_LEVEL, zlib.DEFLATED, wbits, SSE_ZLIB_MEMLEVEL)
+        self.raw_bytes = 0
+        self.wire_bytes = 0
+
+    def compress(self, chunk):
+        out = self._z.compress(chunk) + self._z.flush(zlib.Z_SYNC_FLUSH)
+        self.raw_bytes += len(chunk)
+        self.wire_bytes += len(out)
+        if self.totals is not None:
+            self.totals["raw"] += len(chunk)
+            self.totals["wire"] += len(out)
+        return out
+
+
+class Subscriber:
+    def __init__(self, maxlen=SUB_QUEUE, topics=TOPICS):
+        self.maxlen = maxlen
+        self.topics = frozenset(topics)
+        self._pending = deque()     # wire bytes, or an event name standing in for its coalesced slot
+        self._latest = {}           # coalesced event name -> newest wire bytes
+        self._cv = threading.Condition()
+        self.resync = False         # backlog was dropped; send snapshots before anything else
+        self.delivered = 0
+        self.coalesced = 0
+        self.overflows = 0
+        self.replay = None          # missed chunks for a resuming client (see EventHub.subscribe)
+
+    def offer(self, event, chunk, coalesce=False, eid=None):
+        """Queue one encoded event. Returns False if it overflowed the client."""
+        with self._cv:
+            if coalesce:
+                if event in self._latest:
+                    self.coalesced += 1
+                else:
+                    self._pending.append(event)
+                self._latest[event] = chunk
+            else:
+                if len(self._pending) >= self.maxlen:
+                    self._pending.clear()
+                    self._latest.clear()
+                    self.overflows += 1
+                    self.resync = True
+                    self._notify()
+                    return False
+                self._pending.append(chunk)
+            self._notify()
+            return True
+
+    def _notify(self):
+        """Wake the consumer (called with the condition held)."""
+        self._cv.notify()
+
+    def take(self, timeout=None):
+        """All pending wire chunks (possibly empty on timeout), in publish order."""
+        with self._cv:
+            if not self._pending and not self.resync:
+                self._cv.wait(timeout)
+            return self._drain()
+
+    def _drain(self):
+        """Pending chunks in order (called with the condition held)."""
+        out = []
+        while self._pending:
+            item = self._pending.popleft()
+            if isinstance(item, str):
+                item = self._latest.pop(item)
+            out.append(item)
+        self.delivered += len(out)
+        return out
+
+    def take_resync(self):
+        with self._cv:
+            r, self.resync = self.resync, False
+            return r
+
+
+class EventHub:
+    def __init__(self, coalesce_events=COALESCE_EVENTS, maxlen=SUB_QUEUE, replay=REPLAY_RING):
+        self.coalesce_events = set(coalesce_events)
+        self.maxlen = maxlen
+        # [eid, topic, event, data, chunk-or-None]; ids start at boot time in ms so
+        # they keep increasing across restarts and a pre-restart id is always a gap
+        self._ring = deque(maxlen=replay)
+        self.last_id = int(time.time() * 1000)
+        self._subs = set()
+        self._by_topic = {t: set() for t in TOPICS}
+        self._lock = threading.Lock()
+        self.published = 0
+        self.skipped = 0              # events no client subscribed to (never encoded)
+        self.encoded_bytes = 0
+        self.slow_events = 0          # overflow incidents across all clients
+        self._slow_clients = set()    # ids of connected clients that overflowed at least once
+        self._closed = {"delivered": 0, "coalesced": 0}
+        self.compressed = {"raw": 0, "wire": 0}   # bytes through StreamCompressors
+
+    def compressor(self, accept_encoding):
+        """StreamCompressor for a stream with this Accept-Encoding header, or None to send it plain."""
+        enc = negotiate_encoding(accept_encoding)
+        return StreamCompressor(enc, self.compressed) if enc else None
+
+    def subscribe(self, topics=None, last_id=None):
+        """
+        New subscriber for `topics` (default: all). Unknown topic names raise
+        ValueError. With `last_id` (the client's Last-Event-ID), sub.replay is
+        the list of missed wire chunks, or None if they are no longer all in
+        the ring. Replay and registration are atomic, so nothing is lost or
+        sent twice in between.
+        """
+        sub = Subscriber(self.maxlen, check_topics(topics))
+        with self._lock:
+            sub.replay = None if last_id is None else self._replay(last_id, sub.topics)
+            self._attach(sub)
+        return sub
+
+    def _replay(self, last_id, topics):
+        if last_id > self.last_id:
+            return None
+        if last_id < self.last_id and (not self._ring or last_id < self._ring[0][0] - 1):
+            return None
+        out = []
+        for item in self._ring:
+            if item[0] > last_id and item[1] in topics:
+                if item[4] is None:
+                    item[4] = encode(item[2], item[3], item[0])
+                out.append(item[4])
+        return out
+
+    def attach(self, sub):
+        """
+        Register anything with `topics` and offer(event, chunk, coalesce) as a
+        subscriber (e.g. the ASGI server's event-loop broadcaster).
+        """
+        with self._lock:
+            self._attach(sub)
+
+    def _attach(self, sub):
+        self._subs.add(sub)
+        for t in sub.topics:
+            self._by_topic[t].add(sub)
+
+    def update_topics(self, sub, topics, last_id=None, replay_topics=None):
+        """
+        Move an attached subscriber to a new topic set. With `last_id`, also
+        returns (missed chunks or None, id they run up to) for `replay_topics`,
+        computed under the same lock as the move, like subscribe(): every
+        later event reaches `sub`, every earlier one is in the replay.
+        """
+        topics = frozenset(topics)
+        with self._lock:
+            for t in sub.topics - topics:
+                self._by_topic[t].discard(sub)
+            for t in topics - sub.topics:
+                self._by_topic[t].add(sub)
+            sub.topics = topics
+            if last_id is not None:
+                return self._replay(last_id, replay_topics), self.last_id
+
+    def unsubscribe(self, sub):
+        self.detach(sub)
+
+    def detach(self, sub):
+        with self._lock:
+            self._subs.discard(sub)
+            for t in sub.topics:
+                self._by_topic[t].discard(sub)
+            self._slow_clients.discard(id(sub))
+            self._closed["delivered"] += sub.delivered
+            self._closed["coalesced"] += sub.coalesced
+
+    def wanted(self, event):
+        """True if any connected client subscribes to this event's topic."""
+        return bool(self._by_topic.get(EVENT_TOPICS.get(event, event)))
+
+    def publish(self, event, data):
+        """Encode and fan out `event`; returns the wire bytes, or None if nobody subscribes to it."""
+        topic = EVENT_TOPICS.get(event, event)
+        coalesce = event in self.coalesce_events
+        with self._lock:
+            eid = None
+            if event in REPLAY_EVENTS:
+                self.last_id += 1
+                eid = self.last_id
+            subs = self._by_topic.get(topic)
+            chunk = encode(event, data, eid) if subs else None
+            if eid is not None:
+                self._ring.append([eid, topic, event, data, chunk])
+            if not subs:
+                self.skipped += 1
+                return None
+            self.published += 1
+            self.encoded_bytes += len(chunk)
+            for sub in subs:
+                if not sub.offer(event, chunk, coalesce, eid):
+                    self.slow_events += 1
+                    if id(sub) not in self._slow_clients:
+                        self._slow_clients.add(id(sub))
+                        print(f"[event_hub] slow dashboard client: backlog over {self.maxlen} events, resyncing")
+        return chunk
+
+    def stats(self):
+        with self._lock:
+            subs = list(self._subs)
+            return {
+                # an attached broadcaster stands for n_clients streams
+                "clients": sum(getattr(s, "n_clients", 1) for s in subs),
+                "slow_clients": len(self._slow_clients),
+                "slow_events": self.slow_events,
+                "published": self.published,
+                "skipped": self.skipped,
+                "last_id": self.last_id,
+                "replay_ring": len(self._ring),
+                "topics": {t: len(s) for t, s in self._by_topic.items()},
+                "encoded_bytes": self.encoded_bytes,
+                "delivered": self._closed["delivered"] + sum(s.delivered for s in subs),
+                "coalesced": self._closed["coalesced"] + sum(s.coalesced for s in subs),
+                "compressed_raw_bytes": self.compressed["raw"],
+                "compressed_wire_bytes": self.compressed["wire"],
+            }
@@ -0,0 +1,149 @@
+import math
+import time
+from threading import Lock
+
+WINDOW_FRAMES = 300          # ~5 minutes of 1 Hz telemetry
+RESYNC_EVERY = WINDOW_FRAMES # recompute running sums from the buffer this often (float drift)
+
+FEATURE_NAMES = (
+    "temp", "hum", "led", "pir",
+    "temp_mean", "temp_slope", "hum_mean", "hum_slope", "occupancy",
+    "tod_sin", "tod_cos",
+)
+N_FEATURES = len(FEATURE_NAMES)
+
+
+class RollingWindow:
+    """
+    Fixed-size ring buffer over one signal with O(1) rolling mean and
+    least-squares slope (units per frame).
+
+    Keeps running sums of y and i*y, where i is the position of a sample
+    inside the window (0 = oldest). When the window is full and a sample
+    falls off, every remaining index shifts down by one, which is
+    sum(i*y) -= sum(y) - y_oldest.
+    """
+    def __init__(self, size=WINDOW_FRAMES):
+        self.size = int(size)
+        self._buf = [0.0] * self.size
+        self._head = 0      # next write position
+        self._count = 0
+        self._sum = 0.0
+        self._isum = 0.0
+        self._pushes = 0
+
+    def push(self, y):
+        y = float(y)
+        n = self.size
+        if self._count < n:
+            self._isum += self._count * y
+            self._sum += y
+            self._count += 1
+        else:
+            old = self._buf[self._head]
+            self._isum -= (self._sum - old)
+            self._sum += y - old
+            self._isum += (n - 1) * y
+        self._buf[self._head] = y
+        self._head = (self._head + 1) % n
+
+        self._pushes += 1
+        if self._pushes % RESYNC_EVERY == 0:
+            self._resync()
+
+    def _resync(self):
+        c = self._count
+        start = (self._head - c) % self.size
+        s = 0.0; si = 0.0
+        for i in range(c):
+            v = self._buf[(start + i) % self.size]
+            s += v; si += i * v
+        self._sum, self._isum = s, si
+
+    def __len__(self):
+        return self._count
+
+    def mean(self, default=0.0):
+        return self._sum / self._count if self._count else default
+
+    def slope(self):
+        c = self._count
+        if c < 2:
+            return 0.0
+        si = c * (c - 1) / 2.0
+        sii = (c - 1) * c * (2 * c - 1) / 6.0
+        den = c * sii - si * si
+        return (c * self._isum - si * self._sum) / den if den else 0.0
+
+    def last(self, default=None):
+        if not self._count:
+            return default
+        return self._buf[(self._head - 1) % self.size]
+
+
+def time_of_day(ts=None):
+    """Encode wall-clock time of day on the unit circle -> (sin, cos)."""
+    lt = time.localtime(ts if ts is not None else time.time())
+    frac = (lt.tm_hour * 3600 + lt.tm_min * 60 + lt.tm_sec) / 86400.0
+    ang = 2.0 * math.pi * frac
+    return math.sin(ang), math.cos(ang)
+
+
+class FeaturePipeline:
+    """
+    Streaming feature stage for the comfort model.
+
+    `push(frame)` is fed every telemetry frame (dicts like the Arduino JSON:
+    {"temp":..,"hum":..,"pir":..}) and is O(1). `vector(...)` builds the
+    feature row for the current reading from the window state, so training
+    and inference use exactly the same features without rescanning history.
+    """
+    def __init__(self, window=WINDOW_FRAMES):
+        self.temp = RollingWindow(window)
+        self.hum = RollingWindow(window)
+        self.pir = RollingWindow(window)
+        self._lock = Lock()
+
+    def push(self, frame):
+        if not frame:
+            return
+        with self._lock:
+            for key, win in (("temp", self.temp), ("hum", self.hum), ("pir", self.pir)):
+                v = frame.get(key)
+                if v is None:
+                    continue
+                try:
+                    win.push(float(v))
+                except (TypeError, ValueError):
+                    pass
+
+    def vector(self, temp, hum, led_state, pir, ts=None):
+        temp = float(temp); hum = float(hum)
+        led = 1.0 if led_state else 0.0
+        pir = 1.0 if pir else 0.0
+        tod_sin, tod_cos = time_of_day(ts)
+        with self._lock:
+            return [
+                temp, hum, led, pir,
+                self.temp.mean(temp), self.temp.slope(),
+                self.hum.mean(hum), self.hum.slope(),
+                self.pir.mean(pir),
+                tod_sin, tod_cos,
+            ]
+
+    @staticmethod
+    def static_vector(temp, hum, led_state, pir, ts=None):
+        """Feature row with no history (rolling stats = current reading, slopes 0)."""
+        temp = float(temp); hum = float(hum)
+        led = 1.0 if led_state else 0.0
+        pir = 1.0 if pir else 0.0
+        tod_sin, tod_cos = time_of_day(ts) if ts is not None else (0.0, 1.0)
+        return [temp, hum, led, pir, temp, 0.0, hum, 0.0, pir, tod_sin, tod_cos]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "temp_mean": self.temp.mean(None), "temp_slope": self.temp.slope(),
+                "hum_mean": self.hum.mean(None), "hum_slope": self.hum.slope(),
+                "occupancy": self.pir.mean(None), "frames": len(self.temp),
+            }
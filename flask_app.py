@@ -1,5 +1,12 @@
-from flask import Flask, render_template_string, request, Response, stream_with_context
-import time, socket, json, queue, threading
+from flask import Flask, request, Response, stream_with_context
+import time, socket, json, threading
+from collections import deque
+import latency_trace
+import history_log
+import static_assets
+import command_batch
+from series_store import SERIES
+from event_hub import EventHub, encode, TOPICS
 
 app = Flask(__name__)
 state = {
@@ -13,16 +20,29 @@ state = {
     "fan_mode": "auto"
 }
 
-ACTION_LOG = []
-VOICE_BUFFER = []
-VOICE_BUFFER_MAX = 4
+# versioned state: clients apply `delta` events on top of the last `state` snapshot
+state_version = 0
+_state_lock = threading.Lock()
+_last_snapshot = 0.0
+STATE_SNAPSHOT_EVERY = 60.0
+RMS_MIN_CHANGE = 25      # mic meter range is 0..1000
+SSE_RETRY = b"retry: 3000\n\n"   # EventSource reconnect delay; reconnects resume via Last-Event-ID
+RMS_ROOM = None          # room whose mic drives the meter (None: the first room that reports)
+_last_rms = None         # level last published
+_rms_lock = threading.Lock()
+
+# recent entries only (newest first); older history is paged from the controller's CSV logs
+ACTION_LOG_MAX = 100
+VOICE_BUFFER_MAX = 50
+ACTION_LOG = deque(maxlen=ACTION_LOG_MAX)
+VOICE_BUFFER = deque(maxlen=VOICE_BUFFER_MAX)
 START_TIME = time.time()
 
-# SSE subscribers
-_subscribers = []
-_sub_lock = threading.Lock()
+# SSE broadcaster: each event is encoded once and fanned out to all streams
+HUB = EventHub()
 
 _controller_callback = None
+_metrics_providers = {"sse": HUB.stats, "series": SERIES.stats}
 
 def set_controller_callback(callback_fn):
     """Allow main.py to inject the controller's apply_intent method."""
@@ -31,25 +51,14 @@ def set_controller_callback(callback_fn):
     print("[flask_app] controller callback set")
 
 
-def add_subscriber(q):
-    with _sub_lock:
-        _subscribers.append(q)
+def register_metrics_provider(name, fn):
+    """Expose fn() -> dict under /api/metrics as `name` (e.g. ML model quality)."""
+    _metrics_providers[name] = fn
+    print(f"[flask_app] metrics provider registered: {name}")
 
-def remove_subscriber(q):
-    with _sub_lock:
-        try:
-            _subscribers.remove(q)
-        except ValueError:
-            pass
 
 def publish(event_name, data):
-    payload = {"event": event_name, "data": data}
-    with _sub_lock:
-        for q in list(_subscribers):
-            try:
-                q.put(payload, block=False)
-            except queue.Full:
-                pass
+    HUB.publish(event_name, data)
 
 
 INDEX_HTML = """<!doctype html>
@@ -235,10 +244,10 @@ INDEX_HTML = """<!doctype html>
       <div class="card">
         <div class="muted">Voice Activity</div>
         
-        <div class="muted" style="margin-top:8px; font-size: 11px;">Mic Activity</div>
+        <div class="muted" style="margin-top:8px; font-size: 11px;">Mic Activity <span id="micRoom"></span></div>
         <progress id="micProgress" max="1000" value="0"></progress>
         
-        <div class="muted" style="margin-top:12px;">Recent inputs (live)</div>
+        <div class="muted" style="margin-top:12px;">Recent inputs (live) <a class="small-pill" href="#" onclick="loadOlder('voiceList');return false;">older</a></div>
         <div style="margin-top:8px" class="voice-list" id="voiceList">
         </div>
       </div>
@@ -261,8 +270,38 @@ INDEX_HTML = """<!doctype html>
         </div>
       </div>
 
+      <div class="card">
+        <div class="muted">Model Quality</div>
+        <div style="margin-top:8px">
+          <div>Fan MAE: <span id="mlFanMae">-</span> <span class="muted">(RMSE <span id="mlFanRmse">-</span>)</span></div>
+          <div>Intent accuracy: <span id="mlIntentAcc">-</span></div>
+          <div style="margin-top:8px"><span id="mlDrift" class="small-pill">No drift</span></div>
+        </div>
+      </div>
+
+      <div class="card">
+        <div class="muted">Voice Latency (p50 / p95 ms)</div>
+        <div id="latStages" style="margin-top:8px">-</div>
+        <div style="margin-top:8px"><a class="btn" href="/api/traces/chrome">Export trace</a></div>
+      </div>
+
+      <div class="card wide">
+        <div class="muted">History
+          <select id="seriesMetric" onchange="refreshSeries()">
+            <option value="temp">Temperature</option><option value="hum">Humidity</option>
+            <option value="fan">Fan PWM</option><option value="pir">Motion</option>
+          </select>
+          <select id="seriesRange" onchange="refreshSeries()">
+            <option value="3600">1 hour</option><option value="86400" selected>24 hours</option>
+            <option value="604800">7 days</option><option value="31536000">1 year</option>
+          </select>
+          <span id="seriesInfo"></span>
+        </div>
+        <canvas id="seriesChart" height="140" style="width:100%;margin-top:8px"></canvas>
+      </div>
+
       <div class="card wide">
-        <div class="muted">Activity Log (Recent 5)</div>
+        <div class="muted">Activity Log (Recent 5) <a class="small-pill" href="#" onclick="loadOlder('activity');return false;">older</a></div>
         <div class="log" id="activity"></div>
       </div>
     </div>
@@ -287,6 +326,60 @@ INDEX_HTML = """<!doctype html>
       document.getElementById('smokeState').style.color = s.smoke? 'var(--danger)':'var(--muted)';
     }
 
+    let stateV = -1, S = {}, resyncing = false, sliderDragging = false;
+
+    function renderState(d){
+      stateEl('temp').innerText = (d.temp===null? '--' : d.temp.toFixed(1)+' °C');
+      stateEl('hum').innerText = (d.hum===null? '--' : d.hum.toFixed(0)+' %');
+      stateEl('fanVal').innerText = d.fan || 0;
+      if(!sliderDragging){
+        // echoes of debounced values would pull the thumb back mid-drag
+        stateEl('fanSliderVal').innerText = d.fan || 0;
+        document.getElementById('fanSlider').value = d.fan || 0;
+      }
+      stateEl('ledState').innerText = (d.led? 'ON' : 'OFF');
+      stateEl('smokeState').innerText = (d.smoke? 'SMOKE' : 'SAFE');
+
+      updateButtons(d);
+      
+      const sensorPIR = stateEl('sensorPIR');
+      const sensorSmoke = stateEl('sensorSmoke');
+      const sensorLED = stateEl('sensorLED');
+      const sensorFan = stateEl('sensorFan');
+
+      if (sensorPIR) {
+        sensorPIR.innerText = d.pir ? 'MOTION' : 'Clear';
+        sensorPIR.style.color = d.pir ? 'var(--accent)' : 'var(--muted)';
+      }
+      if (sensorSmoke) {
+        sensorSmoke.innerText = d.smoke ? 'DETECTED' : 'Clear';
+        sensorSmoke.style.color = d.smoke ? 'var(--danger)' : 'var(--muted)';
+      }
+      if (sensorLED) {
+        sensorLED.innerText = d.led ? 'ON' : 'OFF';
+        sensorLED.style.color = d.led ? 'var(--ok)' : 'var(--muted)';
+      }
+      if (sensorFan) {
+        sensorFan.innerText = d.fan || 0;
+        sensorFan.style.color = d.fan > 0 ? 'var(--accent-2)' : 'var(--muted)';
+      }
+      
+      var act = document.getElementById('activity');
+      var li = document.createElement('div'); li.className='log-item';
+      li.innerText = new Date().toLocaleTimeString() + ' • state updated (T:'+d.temp+', H:'+d.hum+', P:'+d.pir+')';
+      act.prepend(li);
+      
+      if(!browsing('activity')) while(act.children.length > 5) act.removeChild(act.lastChild);
+    }
+
+    function resyncState(){
+      // missed a delta: fetch a fresh snapshot instead of guessing
+      if(resyncing) return; resyncing = true;
+      fetch('/api/state').then(r=>r.json()).then(m=>{
+        if(m.v >= stateV){ stateV = m.v; S = m.state; renderState(S); }
+      }).catch(()=>{}).finally(()=>{ resyncing = false; });
+    }
+
     let es = null;
     function connectSSE(){
       es = new EventSource('/events/stream');
@@ -302,46 +395,18 @@ INDEX_HTML = """<!doctype html>
       });
 
       es.addEventListener('state', function(e){
-        const d = JSON.parse(e.data);
-        
-        stateEl('temp').innerText = (d.temp===null? '--' : d.temp.toFixed(1)+' °C');
-        stateEl('hum').innerText = (d.hum===null? '--' : d.hum.toFixed(0)+' %');
-        stateEl('fanVal').innerText = d.fan || 0;
-        stateEl('fanSliderVal').innerText = d.fan || 0;
-        document.getElementById('fanSlider').value = d.fan || 0;
-        stateEl('ledState').innerText = (d.led? 'ON' : 'OFF');
-        stateEl('smokeState').innerText = (d.smoke? 'SMOKE' : 'SAFE');
+        const m = JSON.parse(e.data);   // full snapshot {v, state}
+        if(m.v < stateV) return;
+        stateV = m.v; S = m.state;
+        renderState(S);
+      });
 
-        updateButtons(d);
-        
-        const sensorPIR = stateEl('sensorPIR');
-        const sensorSmoke = stateEl('sensorSmoke');
-        const sensorLED = stateEl('sensorLED');
-        const sensorFan = stateEl('sensorFan');
-
-        if (sensorPIR) {
-          sensorPIR.innerText = d.pir ? 'MOTION' : 'Clear';
-          sensorPIR.style.color = d.pir ? 'var(--accent)' : 'var(--muted)';
-        }
-        if (sensorSmoke) {
-          sensorSmoke.innerText = d.smoke ? 'DETECTED' : 'Clear';
-          sensorSmoke.style.color = d.smoke ? 'var(--danger)' : 'var(--muted)';
-        }
-        if (sensorLED) {
-          sensorLED.innerText = d.led ? 'ON' : 'OFF';
-          sensorLED.style.color = d.led ? 'var(--ok)' : 'var(--muted)';
-        }
-        if (sensorFan) {
-          sensorFan.innerText = d.fan || 0;
-          sensorFan.style.color = d.fan > 0 ? 'var(--accent-2)' : 'var(--muted)';
-        }
-        
-        var act = document.getElementById('activity');
-        var li = document.createElement('div'); li.className='log-item';
-        li.innerText = new Date().toLocaleTimeString() + ' • state updated (T:'+d.temp+', H:'+d.hum+', P:'+d.pir+')';
-        act.prepend(li);
-        
-        while(act.children.length > 5) act.removeChild(act.lastChild);
+      es.addEventListener('delta', function(e){
+        const m = JSON.parse(e.data);   // {v, set: {changed keys}}
+        if(m.v <= stateV) return;       // already covered by a newer snapshot
+        if(m.v !== stateV + 1){ resyncState(); return; }
+        Object.assign(S, m.set); stateV = m.v;
+        renderState(S);
       });
 
       es.addEventListener('voice_event', function(e){
@@ -366,7 +431,7 @@ INDEX_HTML = """<!doctype html>
         item.appendChild(it);
         voiceList.prepend(item);
         
-        while(voiceList.children.length > 4) voiceList.removeChild(voiceList.lastChild);
+        if(!browsing('voiceList')) while(voiceList.children.length > 4) voiceList.removeChild(voiceList.lastChild);
       });
 
       es.addEventListener('action_ack', function(e){
@@ -376,7 +441,7 @@ INDEX_HTML = """<!doctype html>
         li.innerText = now + ' • ' + e.data;
         act.prepend(li);
         
-        while(act.children.length > 5) act.removeChild(act.lastChild);
+        if(!browsing('activity')) while(act.children.length > 5) act.removeChild(act.lastChild);
       });
 
       es.addEventListener('uptime', function(e){
@@ -384,36 +449,95 @@ INDEX_HTML = """<!doctype html>
       });
 
       es.addEventListener('voice_rms', function(e){
-        const level = JSON.parse(e.data);
+        const rms = JSON.parse(e.data);
         const progBar = stateEl('micProgress');
         if (progBar) {
-            progBar.value = Math.min(level, 1000); 
+            progBar.value = Math.min(rms.level, 1000); 
         }
+        const roomEl = stateEl('micRoom');
+        if (roomEl) roomEl.innerText = rms.room ? '(' + rms.room + ')' : '';
       });
     }
 
     connectSSE();
 
+    // commands are queued and posted together to /commands; acks come back in the response.
+    // Slider values wait CMD_SLIDER_MS so a drag becomes a few requests (the server debounces further).
+    const CMD_SLIDER_MS = 100;
+    let cmdQueue = [], cmdSeq = 0, cmdTimer = null;
     function send(cmd){
-      fetch('/command', {
+      const slider = cmd.startsWith('FAN_PWM:');
+      if(slider) cmdQueue = cmdQueue.filter(c => !c.cmd.startsWith('FAN_PWM:'));
+      cmdQueue.push({id: ++cmdSeq, cmd});
+      if(!slider){ clearTimeout(cmdTimer); cmdTimer = setTimeout(flushCmds, 0); }
+      else if(!cmdTimer) cmdTimer = setTimeout(flushCmds, CMD_SLIDER_MS);
+    }
+    function flushCmds(){
+      cmdTimer = null;
+      const batch = cmdQueue; cmdQueue = [];
+      if(!batch.length) return;
+      fetch('/commands', {
         method: 'POST',
         headers: {'Content-Type': 'application/json'},
-        body: JSON.stringify({cmd})
+        body: JSON.stringify({cmds: batch})
+      }).then(r=>r.json()).then(res=>{
+        (res.acks || []).filter(a=>!a.ok).forEach(a=>{
+          var act = document.getElementById('activity');
+          var li = document.createElement('div'); li.className='log-item';
+          var c = batch.find(b=>b.id === a.id);
+          li.innerText = new Date().toLocaleTimeString() + ' • command failed: ' + (c ? c.cmd : a.id) + ' (' + a.error + ')';
+          act.prepend(li);
+        });
       }).catch(()=>{});
     }
 
-    function onFanSlide(v){ document.getElementById('fanSliderVal').innerText = v; }
+    function onFanSlide(v){ document.getElementById('fanSliderVal').innerText = v; send('FAN_PWM:'+v); }
+    (function(){
+      const slider = document.getElementById('fanSlider');
+      slider.addEventListener('pointerdown', ()=>{ sliderDragging = true; });
+      ['pointerup', 'pointercancel'].forEach(ev => window.addEventListener(ev, ()=>{ sliderDragging = false; }));
+    })();
     function sendPWM(){
-      var v = document.getElementById('fanSlider').value;
-      fetch('/command', {method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({cmd:'FAN_PWM:'+v})});
+      send('FAN_PWM:' + document.getElementById('fanSlider').value);
     }
 
     function onQuick(mode){
-      if(!mode) return; fetch('/command',{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({cmd:'QUICK:'+mode})});
+      if(!mode) return; send('QUICK:'+mode);
       document.getElementById('quickMode').value='';
     }
 
-    function clearLog(){ document.getElementById('activity').innerHTML=''; }
+    function clearLog(){ document.getElementById('activity').innerHTML=''; older.activity.next = undefined; }
+
+    // older entries are paged from the server's logs (/api/actions, /api/voice) on demand
+    const older = {
+      activity: {url:'/api/actions', next:undefined, busy:false,
+                 fmt: r => typeof r === 'string' ? r : r.timestamp + ' • ' + r.source + ': ' + r.intent},
+      voiceList: {url:'/api/voice', next:undefined, busy:false,
+                  fmt: r => (r.timestamp || r.time) + ' • ' + r.text + (r.intent ? ' (' + r.intent + ')' : '')}
+    };
+    function browsing(id){ return older[id].next !== undefined; }
+    function loadOlder(id){
+      const h = older[id], el = stateEl(id);
+      if(h.busy || h.next === null) return;
+      h.busy = true;
+      fetch(h.url + '?limit=30' + (h.next ? '&before=' + h.next : '')).then(r=>r.json()).then(p=>{
+        if(h.next === undefined){
+          var sep = document.createElement('div'); sep.className='muted'; sep.innerText='— history —';
+          el.appendChild(sep);
+        }
+        (p.items || []).forEach(r=>{
+          var li = document.createElement('div'); li.className='log-item'; li.innerText = h.fmt(r);
+          el.appendChild(li);
+        });
+        h.next = p.next;
+      }).catch(()=>{}).finally(()=>{ h.busy = false; });
+    }
+    Object.keys(older).forEach(id=>{
+      const el = stateEl(id);
+      el.addEventListener('scroll', ()=>{
+        if(browsing(id) && el.scrollTop + el.clientHeight >= el.scrollHeight - 8) loadOlder(id);
+      });
+    });
 
     fetch('/_local_ip').then(r=>r.text()).then(ip=>{
       document.getElementById('ipAddr').innerText = ip;
@@ -422,14 +546,76 @@ INDEX_HTML = """<!doctype html>
     }).catch(()=>{});
 
     setInterval(()=>fetch('/_ping'), 30000);
+
+    function refreshMetrics(){
+      fetch('/api/metrics').then(r=>r.json()).then(m=>{
+        const q = m.ml; if(!q) return;
+        stateEl('mlFanMae').innerText = q.fan.mae===null ? '-' : q.fan.mae.toFixed(1);
+        stateEl('mlFanRmse').innerText = q.fan.rmse===null ? '-' : q.fan.rmse.toFixed(1);
+        stateEl('mlIntentAcc').innerText = q.intent.accuracy===null ? '-' : (q.intent.accuracy*100).toFixed(0)+' %';
+        const drift = q.fan.drift || q.intent.drift;
+        stateEl('mlDrift').innerText = drift ? 'DRIFT' : 'No drift';
+        stateEl('mlDrift').style.color = drift ? 'var(--danger)' : 'var(--muted)';
+      }).catch(()=>{});
+    }
+    refreshMetrics();
+    setInterval(refreshMetrics, 10000);
+
+    function refreshTraces(){
+      fetch('/api/traces?n=0').then(r=>r.json()).then(t=>{
+        const rows = [];
+        for(const [stage, st] of Object.entries(t.summary.stages)){
+          if(st) rows.push(`${stage}: ${st.p50} / ${st.p95}`);
+        }
+        if(t.summary.total) rows.push(`<b>total: ${t.summary.total.p50} / ${t.summary.total.p95}</b>`);
+        stateEl('latStages').innerHTML = rows.length ? rows.join('<br>') : '-';
+      }).catch(()=>{});
+    }
+    refreshTraces();
+    setInterval(refreshTraces, 10000);
+
+    function refreshSeries(){
+      const cv = stateEl('seriesChart');
+      const w = cv.width = cv.clientWidth || 600, h = cv.height;
+      const span = +stateEl('seriesRange').value, to = Date.now() / 1000;
+      const q = `/api/series?metric=${stateEl('seriesMetric').value}&from=${to - span}&to=${to}&points=${Math.min(w, 1000)}`;
+      fetch(q).then(r=>r.json()).then(d=>{
+        const ctx = cv.getContext('2d');
+        ctx.clearRect(0, 0, w, h);
+        stateEl('seriesInfo').innerText = d.t && d.t.length ? `${d.t.length} pts (${d.tier})` : 'no data';
+        if(!d.t || !d.t.length) return;
+        const lo = Math.min(...d.min), hi = Math.max(...d.max), pad = (hi - lo) * 0.1 || 1;
+        const X = t => (t - d.from) / Math.max(d.to - d.from, 1) * w;
+        const Y = v => h - (v - lo + pad) / (hi - lo + 2 * pad) * h;
+        ctx.fillStyle = 'rgba(123,97,255,0.25)';   // min..max band
+        d.t.forEach((t, i)=>{ ctx.fillRect(X(t), Y(d.max[i]), 2, Math.max(1, Y(d.min[i]) - Y(d.max[i]))); });
+        ctx.strokeStyle = '#46ffb3'; ctx.beginPath();
+        d.t.forEach((t, i)=>{ i ? ctx.lineTo(X(t), Y(d.avg[i])) : ctx.moveTo(X(t), Y(d.avg[i])); });
+        ctx.stroke();
+        ctx.fillStyle = '#9aa4b2'; ctx.font = '11px sans-serif';
+        ctx.fillText(hi.toFixed(1), 2, 12); ctx.fillText(lo.toFixed(1), 2, h - 2);
+      }).catch(()=>{});
+    }
+    refreshSeries();
+    setInterval(refreshSeries, 60000);
   </script>
 </body>
 </html>
 """
 
+# built once: page + hashed CSS/JS, each precompressed (see static_assets)
+PAGE, ASSETS = static_assets.build(INDEX_HTML)
+
 @app.route('/')
 def index():
-    return render_template_string(INDEX_HTML)
+    return static_assets.serve(PAGE)
+
+@app.route(static_assets.ASSET_PREFIX + '<name>')
+def asset(name):
+    a = ASSETS.get(name)
+    if a is None:
+        return {'ok': False, 'error': 'not found'}, 404
+    return static_assets.serve(a)
 
 @app.route('/_local_ip')
 def get_local_ip():
@@ -446,6 +632,71 @@ def get_local_ip():
 def ping():
     return ('', 204)
 
+@app.route('/api/state')
+def api_state():
+    """Full versioned snapshot; the dashboard refetches it when it detects a delta gap."""
+    return state_snapshot()
+
+@app.route('/api/metrics')
+def metrics():
+    out = {}
+    for name, fn in list(_metrics_providers.items()):
+        try:
+            out[name] = fn()
+        except Exception as e:
+            out[name] = {'error': str(e)}
+    return out
+
+@app.route('/api/series')
+def api_series():
+    """Downsampled history: ?metric=temp&from=<epoch s>&to=<epoch s>&points=500&mode=minmax|lttb"""
+    now = time.time()
+    t_to = request.args.get('to', now, type=float)
+    t_from = request.args.get('from', t_to - 86400, type=float)
+    try:
+        return SERIES.query(request.args.get('metric', 'temp'), t_from, t_to,
+                            points=request.args.get('points', 500, type=int),
+                            mode=request.args.get('mode', 'minmax'))
+    except ValueError as e:
+        return {'ok': False, 'error': str(e)}, 400
+
+@app.route('/api/traces')
+def traces():
+    """Recent per-utterance latency traces (?n=50) and per-stage p50/p95."""
+    n = request.args.get('n', default=50, type=int)
+    return {'summary': latency_trace.TRACES.summary(), 'recent': latency_trace.TRACES.recent(n)}
+
+@app.route('/api/traces/chrome')
+def traces_chrome():
+    """Chrome trace-event JSON; open in chrome://tracing or ui.perfetto.dev."""
+    n = request.args.get('n', default=None, type=int)
+    return Response(json.dumps(latency_trace.TRACES.chrome(n)), mimetype='application/json',
+                    headers={'Content-Disposition': 'attachment; filename=vesta_trace.json'})
+
+def apply_dashboard_command(cmd):
+    """Run one dashboard command through the controller; raises on failure."""
+    print("dashboard cmd received:", cmd)
+    ACTION_LOG.appendleft(f"{time.strftime('%H:%M:%S')} - {cmd}")
+
+    if not _controller_callback:
+        print("[flask_app] ERROR: Controller callback not set. Dashboard commands will not work.")
+        raise RuntimeError('controller_not_connected')
+    try:
+        _controller_callback(cmd, text=cmd, source='dashboard')
+    except Exception as e:
+        print(f"[flask_app] error calling controller callback: {e}")
+        raise
+
+    publish('action_ack', f"Dashboard command: {cmd}")
+
+def _debounced_failed(cmd, err):
+    # the POST already acked it as queued; the failure only shows up here
+    publish('action_ack', f"Dashboard command failed: {cmd} ({err})")
+
+# slider-style commands (FAN_PWM:<n>) are applied at most once per window, newest value wins
+DEBOUNCER = command_batch.Debouncer(apply_dashboard_command, on_error=_debounced_failed)
+_metrics_providers["commands"] = DEBOUNCER.stats
+
 @app.route('/command', methods=['POST'])
 def command():
     data = request.get_json(force=True)
@@ -453,74 +704,195 @@ def command():
     if not cmd:
         return {'ok': False, 'error': 'no cmd'}, 400
 
-    print("dashboard cmd received:", cmd)
-    ACTION_LOG.insert(0, f"{time.strftime('%H:%M:%S')} - {cmd}")
+    try:
+        DEBOUNCER.apply_now(cmd)
+    except Exception as e:
+        return {'ok': False, 'error': str(e)}, 500
+    return {'ok': True}
 
-    if _controller_callback:
+@app.route('/commands', methods=['POST'])
+def commands():
+    """
+    Batch of dashboard commands: {"cmds": ["LED_ON", {"id": 7, "cmd": "FAN_PWM:120"}, ...]}.
+    Commands run in order. The response holds one ack per command:
+    {"id", "ok", "error"?, "debounced"?}. A debounced command is applied
+    within command_batch.DEBOUNCE_SECONDS unless a newer value replaces it;
+    if applying it fails, an action_ack event reports the error.
+    """
+    data = request.get_json(force=True, silent=True) or {}
+    cmds = data.get('cmds')
+    if not isinstance(cmds, list) or not cmds:
+        return {'ok': False, 'error': 'no cmds'}, 400
+    if len(cmds) > command_batch.BATCH_MAX:
+        return {'ok': False, 'error': f'at most {command_batch.BATCH_MAX} cmds per batch'}, 400
+
+    acks = []
+    for i, item in enumerate(cmds):
+        cid, cmd = (item.get('id', i), item.get('cmd')) if isinstance(item, dict) else (i, item)
+        if not cmd or not isinstance(cmd, str):
+            acks.append({'id': cid, 'ok': False, 'error': 'no cmd'})
+            continue
+        if DEBOUNCER.key(cmd):
+            DEBOUNCER.submit(cmd)
+            acks.append({'id': cid, 'ok': True, 'debounced': True})
+            continue
         try:
-            _controller_callback(cmd, text=cmd, source='dashboard')
+            DEBOUNCER.apply_now(cmd)
+            acks.append({'id': cid, 'ok': True})
         except Exception as e:
-            print(f"[flask_app] error calling controller callback: {e}")
-            return {'ok': False, 'error': str(e)}, 500
-    else:
-        print("[flask_app] ERROR: Controller callback not set. Dashboard commands will not work.")
-        return {'ok': False, 'error': 'controller_not_connected'}, 500
-    
-    publish('action_ack', f"Dashboard command: {cmd}")
-    return {'ok': True}
+            acks.append({'id': cid, 'ok': False, 'error': str(e)})
+    return {'ok': all(a['ok'] for a in acks), 'acks': acks}
+
+def _history(log_file, recent):
+    """
+    One page of a persistent log: ?limit=50&before=<cursor from the previous page>.
+    Falls back to the in-memory ring when the controller hasn't written the log.
+    """
+    limit = request.args.get('limit', 50, type=int)
+    before = request.args.get('before', type=int)
+    try:
+        items, cursor = history_log.read_page(log_file, before, limit)
+    except FileNotFoundError:
+        items, cursor = ([] if before is not None else list(recent)[:max(limit, 0)]), None
+    except Exception as e:
+        return {'ok': False, 'error': str(e)}, 500
+    return {'ok': True, 'items': items, 'next': cursor}
+
+@app.route('/api/actions')
+def api_actions():
+    from controller import ACTION_LOG_FILE
+    return _history(ACTION_LOG_FILE, ACTION_LOG)
+
+@app.route('/api/voice')
+def api_voice():
+    from controller import VOICE_LOG_FILE
+    return _history(VOICE_LOG_FILE, VOICE_BUFFER)
 
 @app.route('/events/stream')
 def stream_events():
-    q = queue.Queue(maxsize=256)
-    add_subscriber(q)
+    """SSE stream. ?topics=state,voice limits it to those topics (default: all of event_hub.TOPICS)."""
+    topics = request.args.get('topics')
+    last_id = parse_last_event_id(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+    try:
+        sub = HUB.subscribe([t.strip() for t in topics.split(',') if t.strip()] if topics else None, last_id)
+    except ValueError as e:
+        return {'ok': False, 'error': str(e), 'topics': sorted(TOPICS)}, 400
+    wants_state = 'state' in sub.topics
+    wants_uptime = 'uptime' in sub.topics
+    comp = HUB.compressor(request.headers.get('Accept-Encoding'))
 
     def gen():
-        yield "event: state\n"
-        yield f"data: {json.dumps(state)}\n\n"
+        # first chunk goes out at once so headers (and EventSource 'open') aren't held back
+        if sub.replay is not None:
+            # resumed: exactly the events missed since Last-Event-ID
+            yield SSE_RETRY + (b"".join(sub.replay) or b": resumed\n\n")
+        else:
+            yield SSE_RETRY + snapshot_chunk(wants_state)
 
         last_hb = time.time()
         try:
             while True:
-                try:
-                    item = q.get(timeout=1.0)
-                    ev = item.get('event')
-                    data = item.get('data')
-                    yield f"event: {ev}\n"
-                    yield f"data: {json.dumps(data)}\n\n"
-                except queue.Empty:
-                    if time.time() - last_hb > 15:
-                        yield ": heartbeat\n\n"
-                        last_hb = time.time()
-                        uptime = int(time.time() - START_TIME)
-                        yield f"event: uptime\n"
-                        yield f"data: {uptime}\n\n"
-                    continue
+                chunks = sub.take(timeout=1.0)
+                if sub.take_resync():
+                    # this client fell too far behind and lost its backlog
+                    yield snapshot_chunk(wants_state)
+                if chunks:
+                    yield b"".join(chunks)
+                elif time.time() - last_hb > 15:
+                    last_hb = time.time()
+                    hb = b": heartbeat\n\n"
+                    if wants_uptime:
+                        hb += encode('uptime', int(time.time() - START_TIME))
+                    yield hb
         finally:
-            remove_subscriber(q)
+            HUB.unsubscribe(sub)
+
+    body = gen() if comp is None else _compressed(gen(), comp)
+    resp = Response(stream_with_context(body), mimetype="text/event-stream")
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['Vary'] = 'Accept-Encoding'
+    if comp is not None:
+        resp.headers['Content-Encoding'] = comp.encoding
+    return resp
 
-    return Response(stream_with_context(gen()), mimetype="text/event-stream")
+def _compressed(chunks, comp):
+    try:
+        for chunk in chunks:
+            yield comp.compress(chunk)
+    finally:
+        chunks.close()   # runs the stream's unsubscribe when the client goes away
 
 def emit_voice(text, intent=None):
     entry = {'text': text, 'intent': intent, 'time': time.strftime('%H:%M:%S')}
-    VOICE_BUFFER.insert(0, entry)
-    if len(VOICE_BUFFER) > VOICE_BUFFER_MAX:
-        VOICE_BUFFER.pop()
+    VOICE_BUFFER.appendleft(entry)
     publish('voice_event', entry)
 
-def publish_rms(level):
-    """Publishes the microphone RMS level."""
-    publish('voice_rms', level)
+def publish_rms(level, room=None):
+    """
+    Publishes {"room", "level"} for the microphone meter. With several rooms
+    only RMS_ROOM drives it, so it doesn't flicker between microphones.
+    Updates that would barely move the meter are skipped. Levels within
+    RMS_MIN_CHANGE of zero are sent as 0: anything published above that band
+    is then at least RMS_MIN_CHANGE away from rest, so the meter always drops
+    back to zero instead of sticking.
+    """
+    global RMS_ROOM, _last_rms
+    if level <= RMS_MIN_CHANGE:
+        level = 0
+    with _rms_lock:
+        if RMS_ROOM is None:
+            RMS_ROOM = room
+        if room != RMS_ROOM:
+            return
+        if _last_rms is not None and abs(level - _last_rms) < RMS_MIN_CHANGE:
+            return
+        _last_rms = level
+    publish('voice_rms', {'room': room, 'level': level})
+
+def parse_last_event_id(value):
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+def snapshot_chunk(with_state=True):
+    """
+    Fresh-start chunk for a stream: the state snapshot tagged with the current
+    event id (an id-only event when the client doesn't take state), so its
+    next reconnect can resume from here.
+    """
+    eid = HUB.last_id   # read before the snapshot: a resume may repeat an event, never skip one
+    if with_state:
+        return encode('state', state_snapshot(), eid)
+    return f"id: {eid}\n\n".encode()
+
+def state_snapshot():
+    with _state_lock:
+        return {'v': state_version, 'state': dict(state)}
 
 def update_state(new):
     """
     This is called by the CONTROLLER to update the dashboard's state
-    and broadcast it. 
+    and broadcast it. Only the changed keys go out, as a versioned `delta`;
+    a full `state` snapshot follows every STATE_SNAPSHOT_EVERY seconds.
     """
-    global state
-    state.update(new)
-    if 'led_mode' not in state: state['led_mode'] = 'auto'
-    if 'fan_mode' not in state: state['fan_mode'] = 'auto'
-    publish('state', state)
+    global state_version, _last_snapshot
+    with _state_lock:
+        changes = {k: v for k, v in new.items() if k not in state or state[k] != v}
+        for k in ('led_mode', 'fan_mode'):
+            if k not in state and k not in changes:
+                changes[k] = 'auto'
+        if not changes:
+            return
+        state.update(changes)
+        state_version += 1
+        now = time.time()
+        # published under the lock so versions reach the hub in order
+        if now - _last_snapshot >= STATE_SNAPSHOT_EVERY:
+            _last_snapshot = now
+            publish('state', {'v': state_version, 'state': dict(state)})
+        else:
+            publish('delta', {'v': state_version, 'set': changes})
 
 if __name__ == '__main__':
     print("Starting Vesta SSE dashboard on http://0.0.0.0:5000")
@@ -0,0 +1,72 @@
+"""
+Cursor pagination over the controller's append-only CSV logs
+(action_log.csv, voice_log.csv).
+
+A page is read backwards from a byte offset, one block at a time, so serving
+the newest 50 rows of a multi-year log costs one or two small reads, and RAM
+holds only the page. The cursor is the byte offset where the oldest returned
+row starts. Rows are only ever appended, so a cursor stays valid while the log
+grows and the next page never repeats or skips a row.
+
+    rows, cursor = read_page('action_log.csv', limit=50)          # newest first
+    older, cursor = read_page('action_log.csv', before=cursor)    # cursor None = start of log
+
+Rows are assumed to be one line each (the logs hold short phrases and numbers).
+"""
+import csv
+import os
+
+READ_BLOCK = 64 * 1024
+PAGE_MAX = 500
+
+
+def read_page(path, before=None, limit=50):
+    """
+    Rows of `path` as dicts, newest first, ending just before byte offset
+    `before` (default: end of file). Returns (rows, cursor). cursor is the
+    offset to pass as `before` for the next older page, or None once the
+    first row has been returned.
+    """
+    limit = max(1, min(int(limit), PAGE_MAX))
+    with open(path, 'rb') as f:
+        header = f.readline()
+        header_end = f.tell()
+        fields = next(csv.reader([header.decode('utf-8', 'replace').strip()]), [])
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        end = size if before is None else max(header_end, min(int(before), size))
+
+        # grow the window backwards until it holds `limit` complete rows
+        data = b''
+        pos = end
+        while pos > header_end and data.count(b'\n') <= limit:
+            n = min(READ_BLOCK, pos - header_end)
+            pos -= n
+            f.seek(pos)
+            data = f.read(n) + data
+
+    lines = data.split(b'\n')
+    lines.pop()   # b'' after the final newline, or a row the controller is still writing
+    if pos > header_end:
+        # first piece started before the window
+        off = pos + len(lines.pop(0)) + 1
+    else:
+        off = pos
+    starts = []
+    for line in lines:
+        starts.append(off)
+        off += len(line) + 1
+
+    rows = []
+    first = len(lines)
+    for i in range(len(lines) - 1, -1, -1):
+        if len(rows) >= limit:
+            break
+        first = i
+        text = lines[i].rstrip(b'\r').decode('utf-8', 'replace')
+        if not text:
+            continue
+        values = next(csv.reader([text]), [])
+        rows.append(dict(zip(fields, values)))
+    cursor = starts[first] if first < len(lines) and starts[first] > header_end else None
+    return rows, cursor
@@ -0,0 +1,162 @@
+import re
+from functools import lru_cache
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+INTENT_CACHE_SIZE = 1024
+
+# Numeric slot for fan speed ("set fan to seventy five percent" -> FAN_PWM)
+NUMBER_WORDS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "thirteen": 13, "fourteen": 14, "fifteen": 15, "sixteen": 16, "seventeen": 17,
+    "eighteen": 18, "nineteen": 19, "twenty": 20, "thirty": 30, "forty": 40,
+    "fifty": 50, "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90, "hundred": 100
+}
+
+_WORD_RE = re.compile(r"[a-zA-Z]+")
+_TOKEN_RE = re.compile(r"[a-z]+|\d+")
+_ON_RE = re.compile(r"\bon\b")
+# a number only sets the fan level next to the literal word "fan" and one of these
+FAN_LEVEL_CUES = {"to", "speed", "percent"}
+_OFF_RE = re.compile(r"\boff\b")
+
+
+def parse_number(words):
+    """Spoken number (0..100) from a word list, e.g. ['seventy', 'five'] -> 75. None if absent."""
+    total = None
+    for w in words:
+        if w.isdigit():
+            total = (total or 0) + int(w)
+        elif w in NUMBER_WORDS:
+            v = NUMBER_WORDS[w]
+            if v == 100 and total:
+                total *= 100
+            else:
+                total = (total or 0) + v
+    return total
+
+
+class IntentMatcher:
+    """
+    Compiled phrase -> intent resolver (what VoiceHandler._map_intent used to do
+    with linear scans on every utterance).
+
+    The phrase table is turned into a choice list once, so fuzzy matching is a
+    single rapidfuzz extractOne/cdist call. Device words and per-word on/off
+    decisions come from dict lookups and a memo instead of per-word fuzz
+    calls. Whole results are kept in an LRU keyed on the normalised text.
+    Resolution order and thresholds are the same as before:
+
+      1. exact phrase
+      2. numeric fan level: "fan" + a level cue ("to", "speed", "percent", "%")
+         + a number, with no on/off word ("fan to fifty")
+      3. best fuzz.ratio over all phrases >= intent_fuzz
+      4. device word (+ mishear map) and an on/off word
+      5. for 1-2 word inputs, the first phrase with partial_ratio >= intent_fuzz - 8
+    """
+    def __init__(self, intent_map, mishear_map=None, intent_fuzz=70, on_off_fuzz=70,
+                 cache_size=INTENT_CACHE_SIZE):
+        self.intent_map = dict(intent_map)
+        self.mishear_map = dict(mishear_map or {})
+        self.intent_fuzz = intent_fuzz
+        self.on_off_fuzz = on_off_fuzz
+
+        self._choices = list(self.intent_map.keys())
+        self._labels = list(self.intent_map.values())
+
+        self.match = lru_cache(maxsize=cache_size)(self._match)
+        self._word_action = lru_cache(maxsize=cache_size)(self._word_action_uncached)
+
+    def __call__(self, text):
+        t = (text or "").lower().strip()
+        if not t:
+            return None
+        return self.match(t)
+
+    def confident(self, text, cutoff):
+        """
+        True if `text` resolves to a phrase-table intent on an exact or
+        fuzz.ratio >= cutoff match. Numeric fan levels never count: a partial
+        "fan to fifty" may still grow into "fan to fifty five".
+        """
+        t = (text or "").lower().strip()
+        if not t:
+            return False
+        intent = self.match(t)
+        if intent is None or intent.startswith("FAN_PWM:"):
+            return False
+        if t in self.intent_map:
+            return True
+        if not self._choices:
+            return False
+        best = process.extractOne(t, self._choices, scorer=fuzz.ratio, score_cutoff=cutoff)
+        return best is not None and self._labels[best[2]] == intent
+
+    def cache_info(self):
+        return self.match.cache_info()
+
+    def _word_action_uncached(self, w):
+        if fuzz.partial_ratio("on", w) >= self.on_off_fuzz:
+            return "on"
+        if fuzz.partial_ratio("off", w) >= self.on_off_fuzz:
+            return "off"
+        return None
+
+    def _device(self, words):
+        if "light" in words:
+            return "light"
+        if "fan" in words:
+            return "fan"
+        for w in words:
+            if w in self.mishear_map:
+                return self.mishear_map[w]
+        return None
+
+    def _match(self, t):
+        """Resolve normalised (lowercased, stripped, non-empty) text."""
+        hit = self.intent_map.get(t)
+        if hit is not None:
+            return hit
+
+        tokens = _TOKEN_RE.findall(t)
+        if ("fan" in tokens and ("%" in t or FAN_LEVEL_CUES.intersection(tokens))
+                and "on" not in tokens and "off" not in tokens):
+            pct = parse_number(tokens)
+            if pct is not None and 0 <= pct <= 100:
+                return f"FAN_PWM:{int(round(pct * 255 / 100))}"
+
+        if self._choices:
+            best = process.extractOne(t, self._choices, scorer=fuzz.ratio,
+                                      score_cutoff=self.intent_fuzz)
+            if best is not None:
+                return self._labels[best[2]]
+
+        words = _WORD_RE.findall(t)
+        if not words:
+            return None
+
+        device = self._device(words)
+        action = None
+        for w in words:
+            action = self._word_action(w)
+            if action:
+                break
+        if action is None:
+            if _ON_RE.search(t): action = "on"
+            if _OFF_RE.search(t): action = "off"
+
+        if device and action:
+            if device == "fan":
+                return "FAN_ON" if action == "on" else "FAN_OFF"
+            return "LED_ON" if action == "on" else "LED_OFF"
+
+        if len(t.split()) <= 2 and self._choices:
+            scores = process.cdist([t], self._choices, scorer=fuzz.partial_ratio,
+                                   score_cutoff=self.intent_fuzz - 8)[0]
+            hits = np.flatnonzero(scores)
+            if hits.size:
+                return self._labels[hits[0]]
+
+        return None
@@ -0,0 +1,212 @@
+"""
+Per-utterance latency traces for the voice -> controller -> Arduino path.
+
+A Trace is a set of named stage timestamps (perf_counter based, exported as
+wall-clock microseconds). VoiceHandler starts one at speech onset and makes
+it the thread's active trace while it calls on_intent and queues the TTS
+reply. Controller.apply_intent, send_command, the serial writer thread and
+the TTS worker pick it up from there, so the callback contract stays
+(intent, text, source).
+
+Traces live in a bounded ring (TRACES) and can be summarised for the
+dashboard or exported as Chrome trace-event JSON (chrome://tracing, Perfetto).
+A trace recorded in another process (the out-of-process voice engine) is
+carried over as Trace.export() and recorded here with TRACES.adopt().
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from itertools import count
+
+import numpy as np
+
+# pipeline stages in their nominal order
+STAGES = (
+    "speech_onset", "speech_end", "recognized", "intent_mapped",
+    "callback_returned", "command_enqueued", "serial_written", "tts_started",
+)
+TRACE_BUFFER = 256
+
+# perf_counter() + _EPOCH ~ time.time(), without time.time()'s coarse resolution
+_EPOCH = time.time() - time.perf_counter()
+_ids = count(1)
+
+
+class Trace:
+    __slots__ = ("id", "source", "text", "intent", "marks")
+
+    def __init__(self, source="voice", text=None, intent=None):
+        self.id = next(_ids)
+        self.source = source
+        self.text = text
+        self.intent = intent
+        self.marks = {}
+
+    def mark(self, stage, t=None):
+        """Record `stage` once; later marks of the same stage are ignored."""
+        if stage not in self.marks:
+            self.marks[stage] = time.perf_counter() if t is None else t
+
+    def ordered(self):
+        return sorted(self.marks.items(), key=lambda kv: kv[1])
+
+    def as_dict(self):
+        """Stage offsets in ms from the first mark, plus the total."""
+        marks = self.ordered()
+        t0 = marks[0][1] if marks else 0.0
+        return {
+            "id": self.id,
+            "source": self.source,
+            "text": self.text,
+            "intent": self.intent,
+            "start": round(_EPOCH + t0, 3) if marks else None,
+            "stages_ms": {k: round((t - t0) * 1000.0, 2) for k, t in marks},
+            "total_ms": round((marks[-1][1] - t0) * 1000.0, 2) if marks else 0.0,
+        }
+
+    def export(self):
+        """Picklable copy with wall-clock marks, for TraceBuffer.adopt() in another process."""
+        return {"id": self.id, "source": self.source, "text": self.text, "intent": self.intent,
+                "marks": {k: _EPOCH + t for k, t in self.marks.items()}}
+
+
+class TraceBuffer:
+    """Bounded, thread-safe store of recent traces."""
+    def __init__(self, maxlen=TRACE_BUFFER):
+        self._traces = deque(maxlen=maxlen)
+        self._adopted = {}      # exporting process's trace id -> local Trace
+        self._lock = threading.Lock()
+
+    def start(self, source="voice", text=None, intent=None, first_stage=None):
+        trace = Trace(source, text, intent)
+        if first_stage:
+            trace.mark(first_stage)
+        with self._lock:
+            self._traces.append(trace)
+        return trace
+
+    def adopt(self, data):
+        """
+        Record a trace exported by another process (Trace.export()). A trace
+        adopted earlier under the same id gets the new marks merged in.
+        """
+        with self._lock:
+            trace = self._adopted.get(data["id"])
+            if trace is None or trace not in self._traces:
+                trace = Trace(data.get("source", "voice"))
+                self._traces.append(trace)
+                self._adopted[data["id"]] = trace
+                if len(self._adopted) > 2 * self._traces.maxlen:
+                    live = set(self._traces)
+                    self._adopted = {k: t for k, t in self._adopted.items() if t in live}
+        trace.text = data.get("text") or trace.text
+        trace.intent = data.get("intent") or trace.intent
+        for stage, wall in data.get("marks", {}).items():
+            trace.mark(stage, wall - _EPOCH)
+        return trace
+
+    def exports(self):
+        """Trace.export() of every buffered trace, oldest first."""
+        with self._lock:
+            traces = list(self._traces)
+        return [t.export() for t in traces]
+
+    def discard(self, trace):
+        with self._lock:
+            try:
+                self._traces.remove(trace)
+            except ValueError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            self._traces.clear()
+            self._adopted.clear()
+
+    def recent(self, n=50):
+        with self._lock:
+            traces = list(self._traces)[-n:] if n > 0 else []
+        return [t.as_dict() for t in reversed(traces)]
+
+    def summary(self):
+        """p50/p95/max (ms) of the time spent reaching each stage from the previous one."""
+        with self._lock:
+            traces = list(self._traces)
+        gaps = {s: [] for s in STAGES}
+        totals = []
+        for tr in traces:
+            marks = tr.ordered()
+            if len(marks) < 2:
+                continue
+            for (_, prev), (stage, t) in zip(marks, marks[1:]):
+                gaps.setdefault(stage, []).append((t - prev) * 1000.0)
+            totals.append((marks[-1][1] - marks[0][1]) * 1000.0)
+
+        def stats(v):
+            if not v:
+                return None
+            a = np.asarray(v)
+            return {"n": int(a.size), "p50": round(float(np.percentile(a, 50)), 2),
+                    "p95": round(float(np.percentile(a, 95)), 2), "max": round(float(a.max()), 2)}
+
+        return {"traces": len(traces),
+                "stages": {s: stats(v) for s, v in gaps.items()},
+                "total": stats(totals)}
+
+    def chrome(self, n=None):
+        """
+        Chrome trace-event JSON: one complete ("X") event per utterance and one
+        per stage interval (named after the stage it ends in), one track per source.
+        """
+        with self._lock:
+            traces = list(self._traces)
+        if n:
+            traces = traces[-n:]
+        tids = {}
+        events = []
+        for tr in traces:
+            marks = tr.ordered()
+            if len(marks) < 2:
+                continue
+            tid = tids.setdefault(tr.source, len(tids) + 1)
+            us = lambda t: round((_EPOCH + t) * 1e6, 1)
+            events.append({"name": tr.intent or tr.text or "utterance", "cat": "utterance", "ph": "X",
+                           "ts": us(marks[0][1]), "dur": round((marks[-1][1] - marks[0][1]) * 1e6, 1),
+                           "pid": 1, "tid": tid, "args": {"id": tr.id, "text": tr.text}})
+            for (_, prev), (stage, t) in zip(marks, marks[1:]):
+                events.append({"name": stage, "cat": "stage", "ph": "X", "ts": us(prev),
+                               "dur": round((t - prev) * 1e6, 1), "pid": 1, "tid": tid,
+                               "args": {"id": tr.id}})
+        meta = [{"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": src}}
+                for src, tid in tids.items()]
+        return {"traceEvents": meta + events, "displayTimeUnit": "ms"}
+
+
+TRACES = TraceBuffer()
+
+# ---------------- Active trace (per thread) ----------------
+_local = threading.local()
+
+
+def current():
+    return getattr(_local, "trace", None)
+
+
+@contextmanager
+def active(trace):
+    """Make `trace` the calling thread's current trace for the duration of the block."""
+    prev = current()
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = prev
+
+
+def mark(stage):
+    """Mark `stage` on the current thread's trace, if there is one."""
+    trace = current()
+    if trace is not None:
+        trace.mark(stage)
+    return trace
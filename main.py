@@ -6,8 +6,15 @@ import traceback
 
 # CONFIG
 VOSK_MODEL = "models/vosk-model-small-en-us-0.15"  
+# Several microphones: {room: sounddevice device index/name}, served by
+# voice_service.VoiceService with one shared model. None = single default mic.
+VOICE_ROOMS = None
+# Run the voice engine in its own process (voice_process.VoiceProcess), restarted if it crashes
+VOICE_PROCESS = False
 HOST = "0.0.0.0"
 PORT = 5000
+# Serve the dashboard from asgi_app (uvicorn, event-loop SSE) instead of Flask's threaded server
+ASYNC_SERVER = False
 
 def start_thread_from_module(mod, candidates=("start","run","main")):
     """
@@ -74,6 +81,14 @@ else:
         traceback.print_exc()
         sys.exit(1)
 
+series_mod = safe_import("series_store")
+if series_mod:
+    try:
+        series_mod.SERIES.start(getattr(controller_mod, "SENSOR_LOG_FILE", None))
+        print("[main] Sensor history rollups started.")
+    except Exception as e:
+        print("[main] series_store.start() failed:", e)
+
 serial_mod = safe_import("serial_reader")
 if serial_mod:
     serial_thread = start_thread_from_module(serial_mod)
@@ -97,8 +112,9 @@ if vh_mod:
         voice_thread = start_thread_from_module(vh_mod)
     else:
 
-        def on_intent(intent, text, source='voice'):
-            print(f"[main] on_intent received: {intent} | text: {text} | source: {source}")
+        def on_intent(intent, text, source='voice', room=None):
+            print(f"[main] on_intent received: {intent} | text: {text} | source: {source}"
+                  + (f" | room: {room}" if room else ""))
             if hasattr(controller, "apply_intent"):
                 try:
                     controller.apply_intent(intent, text, source=source)
@@ -115,16 +131,32 @@ if vh_mod:
                 print("[main] No controller method to accept intent. Intent dropped.")
 
         try:
-            try:
-                voice_handler_instance = VH(
-                    model_path=VOSK_MODEL,
-                    on_intent_callback=on_intent,
-                    tts_enabled=True,
-                    on_rms_callback=None 
-                )
-            except TypeError as e:
-                print(f"[main] VoiceHandler init failed: {e}")
-                voice_handler_instance = VH(model_path=VOSK_MODEL, on_intent_callback=on_intent, tts_enabled=True)
+            if VOICE_PROCESS:
+                from voice_process import VoiceProcess
+                voice_handler_instance = VoiceProcess(VOSK_MODEL, on_intent, tts_enabled=True, rooms=VOICE_ROOMS,
+                                                      use_grammar=getattr(vh_mod, "GRAMMAR_MODE", True))
+            elif VOICE_ROOMS:
+                from voice_service import VoiceService
+                voice_handler_instance = VoiceService(VOSK_MODEL, VOICE_ROOMS, on_intent, tts_enabled=True)
+            else:
+                try:
+                    voice_handler_instance = VH(
+                        model_path=VOSK_MODEL,
+                        on_intent_callback=on_intent,
+                        tts_enabled=True,
+                        on_rms_callback=None 
+                    )
+                except TypeError as e:
+                    print(f"[main] VoiceHandler init failed: {e}")
+                    voice_handler_instance = VH(model_path=VOSK_MODEL, on_intent_callback=on_intent, tts_enabled=True)
+
+            if (getattr(voice_handler_instance, "mode", "free") != "free"
+                    and hasattr(controller, "voice_state_listener")):
+                # wake-word grammar while idle, command grammar once "hey vista" is heard
+                voice_handler_instance.set_mode("command" if getattr(controller, "voice_active", False) else "wake")
+                controller.voice_state_listener = (
+                    lambda active: voice_handler_instance.set_mode("command" if active else "wake"))
+                print("[main] Voice grammar follows controller wake/sleep state.")
 
             if hasattr(voice_handler_instance, "start") and callable(voice_handler_instance.start):
                 voice_handler_instance.start()
@@ -157,10 +189,24 @@ try:
 except Exception as e:
     print("[main] Failed to plumb flask_app:", e)
 
+try:
+    reg_metrics = getattr(flask_mod, "register_metrics_provider", None)
+    if reg_metrics and ml_brain_instance and hasattr(ml_brain_instance, "quality"):
+        reg_metrics("ml", ml_brain_instance.quality)
+        print("[main] Plumbed ML quality monitor to flask_app")
+    if reg_metrics and voice_handler_instance and hasattr(voice_handler_instance, "voice_stats"):
+        reg_metrics("voice", voice_handler_instance.voice_stats)
+        print("[main] Plumbed voice pipeline stats to flask_app")
+except Exception as e:
+    print("[main] Failed to plumb ML metrics:", e)
+
 try:
     publish_rms_cb = getattr(flask_mod, "publish_rms", None)
     if publish_rms_cb and voice_handler_instance:
         voice_handler_instance.on_rms = publish_rms_cb
+        if VOICE_ROOMS:
+            # one meter on the dashboard: the first configured room drives it
+            flask_mod.RMS_ROOM = next(iter(VOICE_ROOMS))
         print("[main] Plumbed voice RMS to flask_app")
 except Exception as e:
     print("[main] Failed to plumb RMS:", e)
@@ -187,6 +233,11 @@ try:
         print("[main] flask_app.py missing `app`. Cannot start dashboard.")
         sys.exit(1)
 
+    if ASYNC_SERVER:
+        import asgi_app
+        asgi_app.run(HOST, PORT, app)
+        sys.exit(0)
+
     if socketio is None:
         print("[main] No socketio found — running Flask app directly (SSE mode).")
         print(f"[main] Starting dashboard at http://{HOST}:{PORT}")
@@ -212,5 +263,7 @@ finally:
         if ml_brain_instance and hasattr(ml_brain_instance, "stop"):
             ml_brain_instance.stop() # Save models on exit
             print("[main] ML Brain stopped and models saved.")
+        if series_mod:
+            series_mod.SERIES.stop()
     except Exception:
         pass
\ No newline at end of file
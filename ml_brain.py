@@ -7,12 +7,19 @@ from sklearn.linear_model import SGDRegressor, SGDClassifier
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.preprocessing import StandardScaler
 
+from features import FeaturePipeline, N_FEATURES
+from model_monitor import ModelMonitor
+
 MODEL_FNAME = "ml_models.pkl"
 
 class MLBrain:
-    def __init__(self, model_path=MODEL_FNAME, verbose=False):
+    def __init__(self, model_path=MODEL_FNAME, verbose=False, features=None, monitor=None):
         self.model_path = model_path
         self.verbose = verbose
+        # streaming feature stage (rolling means/slopes, occupancy, time of day)
+        self.features = features if features is not None else FeaturePipeline()
+        # prequential quality metrics + drift flags
+        self.monitor = monitor if monitor is not None else ModelMonitor()
 
         self.reg = None
         self.vec = None
@@ -32,10 +39,11 @@ class MLBrain:
 
     def _bootstrap(self):
         """Create initial models so partial_fit works and scaler is initialized."""
-        X = np.array([[25.0, 40.0, 1, 1],
-                      [22.0, 45.0, 1, 0],
-                      [30.0, 60.0, 1, 1],
-                      [20.0, 30.0, 0, 0]])
+        X = np.array([FeaturePipeline.static_vector(*row) for row in
+                      ([25.0, 40.0, 1, 1],
+                       [22.0, 45.0, 1, 0],
+                       [30.0, 60.0, 1, 1],
+                       [20.0, 30.0, 0, 0])])
         y = np.array([0.0, 0.0, 200.0, 0.0])
 
         self.scaler = StandardScaler()
@@ -81,18 +89,27 @@ class MLBrain:
             except Exception as e:
                 self._log("Failed to load model file:", e)
 
+    def observe(self, frame):
+        """Feed one telemetry frame (dict with temp/hum/pir) to the feature stage. O(1)."""
+        self.features.push(frame)
+
+    def feature_vector(self, temp, hum, led_state, pir, ts=None):
+        """The regressor's input row for this reading; shared by training and inference."""
+        return self.features.vector(temp, hum, led_state, pir, ts=ts)
+
     def predict_fan(self, temp, hum, led_state, pir):
         """Synchronous prediction (0..255 int). Thread-safe read."""
+        try:
+            return self._predict_row(self.feature_vector(temp, hum, led_state, pir))
+        except Exception as e:
+            self._log("predict_fan error:", e)
+            return 0
+
+    def _predict_row(self, feat):
         with self._lock:
-            try:
-                feat = np.array([[float(temp), float(hum), 1.0 if led_state else 0.0, 1.0 if pir else 0.0]])
-                Xs = self.scaler.transform(feat)
-                pred = float(self.reg.predict(Xs)[0])
-                val = int(np.clip(np.round(pred), 0, 255))
-                return val
-            except Exception as e:
-                self._log("predict_fan error:", e)
-                return 0
+            Xs = self.scaler.transform(np.array([feat]))
+            pred = float(self.reg.predict(Xs)[0])
+        return int(np.clip(np.round(pred), 0, 255))
 
     def predict_intent(self, text):
         """Return predicted label from classifier. If classifier not ready, return None."""
@@ -104,15 +121,24 @@ class MLBrain:
                 self._log("predict_intent error:", e)
                 return None
 
-    def update_regressor(self, temp, hum, led_state, pir, fan_label, async_train=True):
-        """Queue or run a partial_fit for the regressor. Scaler updated incrementally first."""
-        feat = (float(temp), float(hum), 1.0 if led_state else 0.0, 1.0 if pir else 0.0)
+    def update_regressor(self, temp, hum, led_state, pir, fan_label, async_train=True, feat=None):
+        """Queue or run a partial_fit for the regressor. Scaler updated incrementally first.
+        The feature row is captured now (or passed in as `feat`) so queued training
+        sees the same window state as inference did."""
+        if feat is None:
+            feat = self.feature_vector(temp, hum, led_state, pir)
+        feat = tuple(feat)
         item = ("reg", feat, float(fan_label))
+        # prequential: score the current model on this label before it learns from it
+        try:
+            self.monitor.score_regression(self._predict_row(feat), item[2])
+        except Exception as e:
+            self._log("monitor score (reg) failed:", e)
         if async_train:
             self._train_q.put(item)
         else:
             with self._lock:
-                X = np.array([[feat[0], feat[1], feat[2], feat[3]]])
+                X = np.array([feat])
                 try:
                     self.scaler.partial_fit(X)
                     Xs = self.scaler.transform(X)
@@ -123,6 +149,9 @@ class MLBrain:
     def update_intent(self, text, label, async_train=True):
         """Queue or run a partial_fit for the intent classifier (vectorizes text first)."""
         item = ("int", text, label)
+        predicted = self.predict_intent(text)
+        if predicted is not None:
+            self.monitor.score_intent(predicted, label)
         if async_train:
             self._train_q.put(item)
         else:
@@ -133,6 +162,10 @@ class MLBrain:
                 except Exception as e:
                     self._log("blocking update_intent failed:", e)
 
+    def quality(self):
+        """Windowed error/accuracy and drift flags from the prequential monitor."""
+        return self.monitor.snapshot()
+
     # ---------------- Trainer thread ----------------
     def _trainer_loop(self):
         self._log("trainer thread started")
@@ -144,7 +177,7 @@ class MLBrain:
             try:
                 if item[0] == "reg":
                     _, feat_tuple, label = item
-                    X = np.array([[feat_tuple[0], feat_tuple[1], feat_tuple[2], feat_tuple[3]]])
+                    X = np.array([feat_tuple])
                     y = np.array([label])
                     with self._lock:
                         try:
@@ -202,7 +235,13 @@ class MLBrain:
             raise FileNotFoundError(fname)
         with self._lock:
             d = joblib.load(fname)
-            self.reg = d['reg']; self.clf = d['clf']; self.vec = d['vec']; self.scaler = d.get('scaler', self.scaler)
+            scaler = d.get('scaler', self.scaler)
+            if getattr(scaler, 'n_features_in_', N_FEATURES) != N_FEATURES:
+                # saved before the feature pipeline existed; keep the bootstrapped regressor
+                self._log("saved regressor has", scaler.n_features_in_, "features, expected", N_FEATURES, "- retraining")
+            else:
+                self.reg = d['reg']; self.scaler = scaler
+            self.clf = d['clf']; self.vec = d['vec']
         self._log("models loaded from", fname)
 
 default_ml = MLBrain(verbose=False)
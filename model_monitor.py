@@ -0,0 +1,118 @@
+import math
+import time
+from threading import Lock
+
+from features import RollingWindow
+
+MONITOR_WINDOW = 200      # labelled samples per sliding window
+PH_DELTA_REG = 5.0        # Page-Hinkley tolerance, PWM units of abs error
+PH_LAMBDA_REG = 1500.0    # Page-Hinkley alarm threshold (cumulative PWM units)
+PH_DELTA_CLS = 0.05       # tolerance on the 0/1 error rate
+PH_LAMBDA_CLS = 8.0
+
+
+class PageHinkley:
+    """
+    Page-Hinkley change detector on a stream of errors (detects upward shifts
+    of the mean). O(1) state: running mean, cumulative deviation and its minimum.
+    """
+    def __init__(self, delta, threshold, min_samples=30):
+        self.delta = float(delta)
+        self.threshold = float(threshold)
+        self.min_samples = int(min_samples)
+        self.reset()
+
+    def reset(self):
+        self.n = 0
+        self.mean = 0.0
+        self.cum = 0.0
+        self.cum_min = 0.0
+
+    def update(self, x):
+        """Add one error value; returns True when a drift is detected (detector then resets)."""
+        self.n += 1
+        self.mean += (x - self.mean) / self.n
+        self.cum += x - self.mean - self.delta
+        self.cum_min = min(self.cum_min, self.cum)
+        if self.n >= self.min_samples and self.cum - self.cum_min > self.threshold:
+            self.reset()
+            return True
+        return False
+
+
+class _Stream:
+    """Windowed + lifetime counters for one model, plus its drift detector."""
+    def __init__(self, window, detector):
+        self.err = RollingWindow(window)     # abs error (reg) or 0/1 miss (cls)
+        self.sq = RollingWindow(window)      # squared error (reg only)
+        self.detector = detector
+        self.count = 0
+        self.total_err = 0.0
+        self.drifts = 0
+        self.last_drift = None
+        self.drifting = False
+
+
+class ModelMonitor:
+    """
+    Prequential (test-then-train) quality monitor for MLBrain.
+
+    Each incoming label is scored against the prediction the current model
+    makes *before* it is trained on that label. Only fixed-size error windows
+    and O(1) aggregates are kept; raw samples are never stored.
+    """
+    def __init__(self, window=MONITOR_WINDOW):
+        self._lock = Lock()
+        self.reg = _Stream(window, PageHinkley(PH_DELTA_REG, PH_LAMBDA_REG))
+        self.cls = _Stream(window, PageHinkley(PH_DELTA_CLS, PH_LAMBDA_CLS))
+
+    def score_regression(self, predicted, actual):
+        if predicted is None:
+            return
+        e = abs(float(actual) - float(predicted))
+        self._record(self.reg, e, e * e)
+
+    def score_intent(self, predicted, actual):
+        miss = 0.0 if predicted == actual else 1.0
+        self._record(self.cls, miss, miss)
+
+    def _record(self, st, err, sq):
+        with self._lock:
+            st.err.push(err)
+            st.sq.push(sq)
+            st.count += 1
+            st.total_err += err
+            if st.detector.update(err):
+                st.drifts += 1
+                st.last_drift = time.strftime('%Y-%m-%d %H:%M:%S')
+                st.drifting = True
+            elif st.drifting and st.detector.n >= st.detector.min_samples:
+                # a full quiet period after the alarm clears the flag
+                st.drifting = False
+
+    def snapshot(self):
+        """JSON-friendly summary for the dashboard / metrics endpoint."""
+        with self._lock:
+            r, c = self.reg, self.cls
+            return {
+                "fan": {
+                    "samples": r.count,
+                    "window": len(r.err),
+                    "mae": round(r.err.mean(), 3) if len(r.err) else None,
+                    "rmse": round(math.sqrt(r.sq.mean()), 3) if len(r.sq) else None,
+                    "mae_lifetime": round(r.total_err / r.count, 3) if r.count else None,
+                    "trend": round(r.err.slope(), 5),
+                    "drift": r.drifting,
+                    "drift_count": r.drifts,
+                    "last_drift": r.last_drift,
+                },
+                "intent": {
+                    "samples": c.count,
+                    "window": len(c.err),
+                    "accuracy": round(1.0 - c.err.mean(), 4) if len(c.err) else None,
+                    "accuracy_lifetime": round(1.0 - c.total_err / c.count, 4) if c.count else None,
+                    "drift": c.drifting,
+                    "drift_count": c.drifts,
+                    "last_drift": c.last_drift,
+                },
+            }
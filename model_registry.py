@@ -0,0 +1,368 @@
+from threading import Thread, Event, RLock
+from queue import Queue, Empty
+from collections import OrderedDict
+import os, re, pickle
+import numpy as np
+
+from ml_brain import MLBrain
+from features import FeaturePipeline
+from model_monitor import ModelMonitor
+
+MODEL_DIR = "room_models"
+MEMORY_BUDGET_BYTES = 64 * 1024 * 1024
+
+class ModelRegistry:
+    """
+    Per-room (or per-user) MLBrain model sets.
+
+    Brains are created lazily on first use and kept in an LRU. When the summed
+    size of the resident models goes over `memory_budget` the least recently
+    used brains are saved to `model_dir/<key>.pkl` and dropped; MLBrain's own
+    bootstrap reloads them from that file next time the key is touched.
+    Training for all rooms goes through a single trainer thread instead of one
+    thread per brain.
+
+    The per-room FeaturePipeline windows and ModelMonitor live in the
+    registry, not in the evictable brain: observe() feeds the windows without
+    loading anything, and a reloaded brain picks its room's windows and
+    quality history up again. A brain being trained is pinned so it can't be
+    evicted (and its update lost) mid-update. Loading a brain and saving an
+    evicted one happen outside the registry lock, so one room's disk IO does
+    not stall the others.
+    """
+    def __init__(self, model_dir=MODEL_DIR, memory_budget=MEMORY_BUDGET_BYTES, verbose=False):
+        self.model_dir = model_dir
+        self.memory_budget = int(memory_budget)
+        self.verbose = verbose
+
+        self._brains = OrderedDict()   # key -> MLBrain, most recently used last
+        self._sizes = {}               # key -> approx bytes
+        self._features = {}            # key -> FeaturePipeline, survives eviction
+        self._monitors = {}            # key -> ModelMonitor, survives eviction
+        self._pinned = {}              # key -> trainings in progress
+        self._loading = {}             # key -> Event set when its load finishes
+        self._saving = {}              # key -> evicted brain still being written out
+        self._evicted_sizes = {}
+        self._lock = RLock()
+
+        self._train_q = Queue()
+        self._stop_evt = Event()
+        self._trainer = None
+
+        self.evictions = 0
+        self.loads = 0
+
+        os.makedirs(self.model_dir, exist_ok=True)
+
+    def _log(self, *a, **k):
+        if self.verbose:
+            print("[ModelRegistry]", *a, **k)
+
+    def _path_for(self, key):
+        safe = re.sub(r"[^A-Za-z0-9_.-]+", "_", str(key)) or "default"
+        return os.path.join(self.model_dir, safe + ".pkl")
+
+    @staticmethod
+    def _estimate_nbytes(brain):
+        """Approximate resident size of a brain's models (pickled size)."""
+        with brain._lock:
+            try:
+                return len(pickle.dumps({'reg': brain.reg, 'clf': brain.clf,
+                                         'vec': brain.vec, 'scaler': brain.scaler},
+                                        protocol=pickle.HIGHEST_PROTOCOL))
+            except Exception:
+                return 0
+
+    def _pipeline(self, key):
+        with self._lock:
+            pipe = self._features.get(key)
+            if pipe is None:
+                pipe = self._features[key] = FeaturePipeline()
+            return pipe
+
+    def monitor(self, key):
+        """The room's ModelMonitor (kept across evictions)."""
+        with self._lock:
+            mon = self._monitors.get(key)
+            if mon is None:
+                mon = self._monitors[key] = ModelMonitor()
+            return mon
+
+    # ---------------- Residency ----------------
+    def get(self, key, enforce=True):
+        """
+        Return the MLBrain for `key`, creating or reloading it if needed.
+        Loading, and saving any brains that makes room for, run outside the
+        registry lock. enforce=False leaves the budget to the caller.
+        """
+        evicted = []
+        while True:
+            with self._lock:
+                brain = self._brains.get(key)
+                if brain is not None:
+                    self._brains.move_to_end(key)
+                    return brain
+                brain = self._saving.get(key)
+                if brain is not None:
+                    # evicted but still being written out: take it back as is
+                    self._brains[key] = brain
+                    self._sizes[key] = self._evicted_sizes.get(key, 0)
+                    if enforce:
+                        evicted = self._enforce_budget(keep={key})
+                    break
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = self._loading[key] = Event()
+                    features, monitor = self._pipeline(key), self.monitor(key)
+                    break
+            loading.wait()      # another thread is loading this room
+        if brain is None:
+            try:
+                brain = MLBrain(model_path=self._path_for(key), verbose=self.verbose,
+                                features=features, monitor=monitor)
+                size = self._estimate_nbytes(brain)
+                with self._lock:
+                    self._brains[key] = brain
+                    self._sizes[key] = size
+                    self.loads += 1
+                    if enforce:
+                        evicted = self._enforce_budget(keep={key})
+            finally:
+                with self._lock:
+                    self._loading.pop(key).set()
+            self._log("loaded", key, "(%d bytes)" % size)
+        self._save_evicted(evicted)
+        return brain
+
+    def _enforce_budget(self, keep=()):
+        """Drop LRU brains until within budget (lock held); returns them for _save_evicted()."""
+        evicted = []
+        while sum(self._sizes.values()) > self.memory_budget:
+            # the brains we were asked for and brains being trained stay resident
+            key = next((k for k in self._brains if k not in keep and not self._pinned.get(k)), None)
+            if key is None:
+                break
+            evicted.append(self._evict(key))
+        return [e for e in evicted if e is not None]
+
+    def _evict(self, key):
+        brain = self._brains.pop(key, None)
+        size = self._sizes.pop(key, 0)
+        if brain is None:
+            return None
+        self._saving[key] = brain
+        self._evicted_sizes[key] = size
+        self.evictions += 1
+        self._log("evicted", key)
+        return key, brain
+
+    def _save_evicted(self, evicted):
+        """Write evicted brains to disk without holding the registry lock."""
+        for key, brain in evicted:
+            try:
+                brain.save()
+            except Exception as e:
+                self._log("save on evict failed for", key, e)
+            finally:
+                with self._lock:
+                    if self._saving.get(key) is brain:
+                        del self._saving[key]
+                        self._evicted_sizes.pop(key, None)
+
+    def enforce_budget(self):
+        """Evict down to the memory budget now."""
+        with self._lock:
+            evicted = self._enforce_budget()
+        self._save_evicted(evicted)
+
+    def resident_bytes(self):
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def resident_keys(self):
+        with self._lock:
+            return list(self._brains.keys())
+
+    def evict(self, key):
+        """Save and drop `key` from memory (no-op if not resident)."""
+        with self._lock:
+            evicted = self._evict(key)
+        self._save_evicted([evicted] if evicted else [])
+
+    def observe(self, key, frame):
+        """Feed a telemetry frame to one room's feature stage (does not load the brain)."""
+        self._pipeline(key).push(frame)
+
+    def quality(self):
+        """Prequential quality snapshot for every room seen (resident or not)."""
+        with self._lock:
+            monitors = list(self._monitors.items())
+        return {k: m.snapshot() for k, m in monitors}
+
+    # ---------------- Prediction ----------------
+    def predict_fan(self, key, temp, hum, led_state, pir):
+        return self.get(key).predict_fan(temp, hum, led_state, pir)
+
+    def predict_intent(self, key, text):
+        return self.get(key).predict_intent(text)
+
+    def predict_fan_batch(self, rows):
+        """
+        Predict fan PWM for many rooms at once.
+        rows: {key: (temp, hum, led_state, pir)} -> {key: int 0..255}
+
+        The comfort models are linear (StandardScaler + SGDRegressor), so the
+        scaler/coef parameters of every room are stacked and evaluated in one
+        vectorised pass. Falls back to per-room predict_fan on any mismatch.
+        Every brain of the batch is resolved before the budget is enforced, so
+        loading one room can't evict another mid-batch.
+        """
+        keys = list(rows.keys())
+        if not keys:
+            return {}
+        feats, means, scales, coefs, intercepts = [], [], [], [], []
+        try:
+            brains = {k: self.get(k, enforce=False) for k in keys}
+            for k in keys:
+                temp, hum, led_state, pir = rows[k]
+                brain = brains[k]
+                with brain._lock:
+                    means.append(np.asarray(brain.scaler.mean_, dtype=float))
+                    scales.append(np.asarray(brain.scaler.scale_, dtype=float))
+                    coefs.append(np.asarray(brain.reg.coef_, dtype=float).ravel())
+                    intercepts.append(float(np.ravel(brain.reg.intercept_)[0]))
+                feats.append(brain.feature_vector(temp, hum, led_state, pir))
+            X = np.array(feats)
+            Xs = (X - np.vstack(means)) / np.vstack(scales)
+            preds = np.einsum('ij,ij->i', Xs, np.vstack(coefs)) + np.array(intercepts)
+            vals = np.clip(np.round(preds), 0, 255).astype(int)
+            return {k: int(v) for k, v in zip(keys, vals)}
+        except Exception as e:
+            self._log("batch predict fell back to per-room:", e)
+            return {k: self.predict_fan(k, *rows[k]) for k in keys}
+        finally:
+            self.enforce_budget()
+
+    # ---------------- Training ----------------
+    def update_regressor(self, key, temp, hum, led_state, pir, fan_label, async_train=True):
+        feat = self._pipeline(key).vector(temp, hum, led_state, pir)
+        item = ("reg", key, (temp, hum, led_state, pir, fan_label, feat))
+        if async_train:
+            self._train_q.put(item)
+        else:
+            self._train(item)
+
+    def update_intent(self, key, text, label, async_train=True):
+        item = ("int", key, (text, label))
+        if async_train:
+            self._train_q.put(item)
+        else:
+            self._train(item)
+
+    def _train(self, item):
+        kind, key, args = item
+        while True:
+            brain = self.get(key)
+            with self._lock:
+                # pin only if it is still the resident brain (it may have been evicted since)
+                if self._brains.get(key) is brain:
+                    self._pinned[key] = self._pinned.get(key, 0) + 1
+                    break
+        try:
+            if kind == "reg":
+                temp, hum, led_state, pir, fan_label, feat = args
+                brain.update_regressor(temp, hum, led_state, pir, fan_label, async_train=False, feat=feat)
+            elif kind == "int":
+                brain.update_intent(*args, async_train=False)
+            else:
+                self._log("Unknown training record:", item)
+        finally:
+            size = self._estimate_nbytes(brain)
+            with self._lock:
+                self._pinned[key] -= 1
+                if not self._pinned[key]:
+                    del self._pinned[key]
+                if self._brains.get(key) is brain:
+                    self._sizes[key] = size
+                evicted = self._enforce_budget()
+            self._save_evicted(evicted)
+
+    def _trainer_loop(self):
+        self._log("trainer thread started")
+        while not self._stop_evt.is_set():
+            try:
+                item = self._train_q.get(timeout=0.5)
+            except Empty:
+                continue
+            try:
+                self._train(item)
+            except Exception as e:
+                self._log("trainer loop exception:", e)
+        self._log("trainer thread stopping")
+
+    def start(self):
+        """Start the shared background trainer thread."""
+        if self._trainer and self._trainer.is_alive():
+            return
+        self._stop_evt.clear()
+        self._trainer = Thread(target=self._trainer_loop, daemon=True)
+        self._trainer.start()
+
+    def stop(self):
+        """Stop the trainer thread and save every resident brain."""
+        self._stop_evt.set()
+        if self._trainer:
+            self._trainer.join(timeout=2.0)
+        with self._lock:
+            brains = list(self._brains.items())
+        for key, brain in brains:
+            try:
+                brain.save()
+            except Exception as e:
+                self._log("save failed for", key, e)
+
+    def view(self, key):
+        """An MLBrain-shaped handle bound to one room (usable as Controller(ml_brain=...))."""
+        return RoomBrain(self, key)
+
+
+class RoomBrain:
+    """Thin MLBrain-compatible proxy that routes calls for one key through a ModelRegistry."""
+    def __init__(self, registry, key):
+        self.registry = registry
+        self.key = key
+
+    def observe(self, frame):
+        self.registry.observe(self.key, frame)
+
+    def predict_fan(self, temp, hum, led_state, pir):
+        return self.registry.predict_fan(self.key, temp, hum, led_state, pir)
+
+    def predict_intent(self, text):
+        return self.registry.predict_intent(self.key, text)
+
+    def quality(self):
+        return self.registry.monitor(self.key).snapshot()
+
+    def update_regressor(self, temp, hum, led_state, pir, fan_label, async_train=True):
+        self.registry.update_regressor(self.key, temp, hum, led_state, pir, fan_label, async_train=async_train)
+
+    def update_intent(self, text, label, async_train=True):
+        self.registry.update_intent(self.key, text, label, async_train=async_train)
+
+    def start(self):
+        self.registry.start()
+
+    def stop(self):
+        self.registry.stop()
+
+
+if __name__ == "__main__":
+    reg = ModelRegistry(memory_budget=200 * 1024, verbose=True)
+    reg.start()
+    rooms = {f"room{i}": (24.0 + i, 50.0, True, 1) for i in range(12)}
+    print("batch:", reg.predict_fan_batch(rooms))
+    reg.update_regressor("room0", 30, 60, True, 1, 220.0, async_train=False)
+    print("room0 after update:", reg.predict_fan("room0", 30, 60, True, 1))
+    print("resident:", reg.resident_keys(), reg.resident_bytes(), "bytes, evictions:", reg.evictions)
+    reg.stop()
@@ -0,0 +1,154 @@
+from collections import namedtuple
+from functools import lru_cache
+from threading import Lock
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+DETECT_CACHE_SIZE = 512
+# strip() removes a span only if it is this close (fuzz.ratio) to the phrase:
+# at a 65 wake threshold "the" would still pass as "hey" (66.7)
+STRIP_FUZZ = 80
+
+# controller's wake/sleep phrases; voice_handler's grammars are built to include them
+WAKE_PHRASES = ("hey vista","hey vesta","hi vista","hii vista","hello vista","hello vesta", "hello", "heavy stuff")
+SLEEP_PHRASES = ("stop vista","bye vista","sleep","go auto","auto mode","goodbye vista")
+
+# phrase: the configured phrase that matched; start/end: span of the match in the text
+PhraseMatch = namedtuple("PhraseMatch", "phrase score start end")
+
+
+class _PhrasePool:
+    """
+    The union of the phrases of every detector in one pool, scored against a
+    text in a single rapidfuzz cdist(partial_ratio) call. The score row is
+    memoised per text, so the voice handler and the controller looking at the
+    same utterance scan it once between them.
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self.phrases = ()
+        self.index = {}
+        self._reset()
+
+    def add(self, phrases):
+        """Append phrases not yet pooled; existing column indices never change."""
+        with self._lock:
+            missing = [p for p in phrases if p not in self.index]
+            if missing:
+                self.phrases += tuple(missing)
+                self.index = {p: i for i, p in enumerate(self.phrases)}
+                self._reset()
+
+    def scorer(self):
+        """The current memoised scorer; its rows cover every phrase added so far."""
+        with self._lock:
+            return self.scores
+
+    def _reset(self):
+        phrases = self.phrases
+        self.scores = lru_cache(maxsize=DETECT_CACHE_SIZE)(
+            lambda text: process.cdist([text], phrases, scorer=fuzz.partial_ratio)[0])
+
+
+class PhraseDetector:
+    """
+    Fuzzy wake/sleep phrase spotting for voice_handler and controller.
+
+    Phrases are normalised once and scored through a _PhrasePool, which may be
+    shared with other detectors. Each detector keeps its own phrase list and
+    threshold: the first of its phrases (in configured order) at or above the
+    threshold wins, the same rule the old per-phrase loops used. The result
+    includes the matched span in the text, so callers strip the tail by
+    slicing instead of building a regex.
+    """
+    def __init__(self, phrases, threshold, pool=None):
+        self._lock = Lock()
+        self.pool = pool or _PhrasePool()
+        self.configure(phrases, threshold)
+
+    def configure(self, phrases=None, threshold=None):
+        """Replace the phrase list and/or threshold at runtime."""
+        with self._lock:
+            if phrases is not None:
+                self.phrases = tuple(dict.fromkeys(p.lower().strip() for p in phrases if p and p.strip()))
+                self.pool.add(self.phrases)
+            if threshold is not None:
+                self.threshold = float(threshold)
+            self._cols = np.array([self.pool.index[p] for p in self.phrases], dtype=np.int64)
+
+    def detect(self, text):
+        """PhraseMatch for the first configured phrase found in `text`, or None."""
+        t = " ".join((text or "").lower().split())
+        # one consistent view against a concurrent configure(); the pool only
+        # appends, so a scorer taken after the columns always covers them
+        with self._lock:
+            phrases, cols, threshold = self.phrases, self._cols, self.threshold
+            scores = self.pool.scorer()
+        if not t or not phrases:
+            return None
+        row = scores(t)[cols]
+        hits = np.flatnonzero(row >= threshold)
+        if not hits.size:
+            return None
+        phrase = phrases[hits[0]]
+        al = fuzz.partial_ratio_alignment(phrase, t)
+        return PhraseMatch(phrase, float(row[hits[0]]), al.dest_start, al.dest_end)
+
+    def strip(self, text, match=None):
+        """
+        `text` with the matched span removed (whitespace-normalised). The span
+        must fall on word boundaries and itself score fuzz.ratio >= the
+        threshold (at least STRIP_FUZZ) against the phrase; otherwise ("hey"
+        aligned onto "the") the text is returned unchanged.
+        """
+        t = " ".join((text or "").lower().split())
+        match = match or self.detect(t)
+        if match is None:
+            return t
+        start, end = match.start, match.end
+        while start < end and t[start] == " ":
+            start += 1
+        while end > start and t[end - 1] == " ":
+            end -= 1
+        if start == end or (start > 0 and t[start - 1] != " ") or (end < len(t) and t[end] != " "):
+            return t
+        with self._lock:
+            threshold = self.threshold
+        if fuzz.ratio(match.phrase, t[start:end]) < max(threshold, STRIP_FUZZ):
+            return t
+        return " ".join((t[:start] + " " + t[end:]).split())
+
+
+# ---------------- Shared detectors ----------------
+_detectors = {}
+_pools = {}
+_registry_lock = Lock()
+
+
+def register(name, phrases, threshold, pool=None):
+    """
+    Create (or reconfigure) the named detector and return it. Detectors
+    registered with the same `pool` name share one memoised scan per text.
+    """
+    with _registry_lock:
+        det = _detectors.get(name)
+        if det is None:
+            shared = _pools.setdefault(pool, _PhrasePool()) if pool else None
+            det = _detectors[name] = PhraseDetector(phrases, threshold, shared)
+        else:
+            det.configure(phrases, threshold)
+        return det
+
+
+def get(name):
+    return _detectors.get(name)
+
+
+def configure(name, phrases=None, threshold=None):
+    """Runtime reconfiguration of a registered detector (e.g. new wake words)."""
+    det = _detectors.get(name)
+    if det is None:
+        raise KeyError(name)
+    det.configure(phrases, threshold)
+    return det
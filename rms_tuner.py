@@ -1,4 +1,4 @@
-import numpy as np, sounddevice as sd, time
+import numpy as np, time, sys
 
 RATE = 16000
 FRAME_MS = 30
@@ -8,6 +8,20 @@ def rms(frame):
     a = np.frombuffer(frame, dtype=np.int16).astype(float)
     return (a*a).mean()**0.5
 
+if len(sys.argv) > 1:
+    # offline: python rms_tuner.py recording.wav
+    from voice_offline import FileCapture
+    cap = FileCapture(sys.argv[1], RATE, FRAME_SAMPLES)
+    while True:
+        frame = cap.read()
+        if frame is None:
+            break
+        print(f"{cap.clock():7.2f}s", int(rms(frame.tobytes())))
+        cap.release()
+    sys.exit(0)
+
+import sounddevice as sd
+
 stream = sd.RawInputStream(samplerate=RATE, blocksize=FRAME_SAMPLES,
                            dtype='int16', channels=1)
 stream.start()
@@ -0,0 +1,369 @@
+"""
+Downsampled sensor history for dashboard charts.
+
+Every telemetry frame is folded into rollup tiers as it arrives (raw 1 s,
+1 min, 1 h and 1 day buckets, each holding per-metric min/max/sum/count).
+Each tier is a fixed-size NumPy ring indexed by bucket number modulo its
+length, so an update touches one slot per tier and memory never grows.
+
+A query picks the finest tier that still covers the requested range with at
+most SCAN_MAX buckets, gathers that slice with one fancy index, and
+downsamples it to the requested number of points. The default keeps
+min/max/avg per point (reduceat over point groups), so spikes survive. LTTB
+gives one representative value per point instead. A year of 1 Hz data is read
+from the 1 h tier (8760 buckets), so the answer takes milliseconds.
+
+The tiers are saved to ROLLUP_FILE periodically and on stop. At startup,
+rows of sensor_log.csv that never reached a saved rollup are backfilled in
+the background.
+
+    SERIES.observe({"temp": 24.5, "hum": 40})            # controller, per frame
+    SERIES.query("temp", t_from, t_to, points=500)       # /api/series
+"""
+import csv
+import os
+import threading
+import time
+
+import numpy as np
+
+import history_log
+
+METRICS = ("temp", "hum", "pir", "smoke", "led", "fan")
+# (name, bucket seconds, buckets kept)
+TIERS = (
+    ("raw", 1, 6 * 3600),         # 6 hours
+    ("1m", 60, 14 * 24 * 60),     # 2 weeks
+    ("1h", 3600, 2 * 366 * 24),   # 2 years
+    ("1d", 86400, 20 * 366),      # 20 years
+)
+SCAN_MAX = 50000          # most buckets a query reads before it moves to a coarser tier
+POINTS_MAX = 5000
+ROLLUP_FILE = "series_rollup.npz"
+SAVE_EVERY = 300.0
+BACKFILL_CHUNK = 100000
+
+
+class _Tier:
+    def __init__(self, name, width, slots, n):
+        self.name = name
+        self.width = width
+        self.slots = slots
+        self.b = np.full(slots, -1, np.int64)      # bucket number held by each slot
+        self.mn = np.full((slots, n), np.nan, np.float32)
+        self.mx = np.full((slots, n), np.nan, np.float32)
+        self.sm = np.zeros((slots, n), np.float64)
+        self.cnt = np.zeros((slots, n), np.int32)
+
+    def ingest(self, ts, vals):
+        """Fold rows (ts sorted, vals NaN where a metric is missing) into their buckets."""
+        b = (ts // self.width).astype(np.int64)
+        keep = b > b[-1] - self.slots                  # older rows would wrap onto newer buckets
+        b, vals = b[keep], vals[keep]
+        if not b.size:
+            return
+        starts = np.flatnonzero(np.r_[True, b[1:] != b[:-1]])
+        b = b[starts]
+        idx = b % self.slots
+        live = self.b[idx] <= b                        # never overwrite a newer bucket with an old row
+        fresh = live & (self.b[idx] != b)
+        reset = idx[fresh]
+        self.b[reset] = b[fresh]
+        self.mn[reset] = np.nan
+        self.mx[reset] = np.nan
+        self.sm[reset] = 0.0
+        self.cnt[reset] = 0
+
+        present = ~np.isnan(vals)
+        with np.errstate(invalid="ignore"):
+            g_mn = np.fmin.reduceat(vals, starts, axis=0)[live]
+            g_mx = np.fmax.reduceat(vals, starts, axis=0)[live]
+        g_sm = np.add.reduceat(np.where(present, vals, 0.0), starts, axis=0)[live]
+        g_cnt = np.add.reduceat(present.astype(np.int32), starts, axis=0)[live]
+        idx = idx[live]
+        self.mn[idx] = np.fmin(self.mn[idx], g_mn)
+        self.mx[idx] = np.fmax(self.mx[idx], g_mx)
+        self.sm[idx] += g_sm
+        self.cnt[idx] += g_cnt
+
+    def add(self, ts, row):
+        """Single-frame fast path of ingest()."""
+        b = int(ts // self.width)
+        i = b % self.slots
+        if self.b[i] > b:
+            return
+        if self.b[i] != b:
+            self.b[i] = b
+            self.mn[i] = np.nan
+            self.mx[i] = np.nan
+            self.sm[i] = 0.0
+            self.cnt[i] = 0
+        present = ~np.isnan(row)
+        self.mn[i] = np.fmin(self.mn[i], row)
+        self.mx[i] = np.fmax(self.mx[i], row)
+        self.sm[i] += np.where(present, row, 0.0)
+        self.cnt[i] += present
+
+    def covers(self, t_from, now):
+        return t_from // self.width > now // self.width - self.slots
+
+    def read(self, col, t_from, t_to):
+        """(bucket start times, min, max, sum, count) of non-empty buckets in [t_from, t_to]."""
+        b = np.arange(int(t_from // self.width), int(t_to // self.width) + 1, dtype=np.int64)
+        idx = b % self.slots
+        ok = (self.b[idx] == b) & (self.cnt[idx, col] > 0)
+        idx = idx[ok]
+        return (b[ok] * self.width, self.mn[idx, col], self.mx[idx, col],
+                self.sm[idx, col], self.cnt[idx, col])
+
+
+def _local_epoch(naive):
+    """Local wall-clock seconds (as parsed from the CSV) -> epoch seconds, DST-aware per hour."""
+    hours, inv = np.unique(naive // 3600, return_inverse=True)
+    offsets = np.array([time.mktime(time.gmtime(int(h) * 3600)[:8] + (-1,)) - int(h) * 3600
+                        for h in hours])
+    return naive + offsets[inv]
+
+
+def _rows_to_arrays(rows):
+    """csv rows (timestamp, then one string per metric) -> (epoch ts, values)"""
+    stamps = np.array([r[0] for r in rows], dtype="datetime64[s]").astype(np.int64)
+    vals = np.full((len(rows), len(rows[0]) - 1), np.nan)
+    for j in range(vals.shape[1]):
+        for i, r in enumerate(rows):
+            v = r[j + 1]
+            if v:
+                vals[i, j] = 1.0 if v == "True" else 0.0 if v == "False" else float(v)
+    return _local_epoch(stamps).astype(np.float64), vals
+
+
+def lttb(t, v, points):
+    """Largest-Triangle-Three-Buckets: indices of `points` samples that keep the shape of (t, v)."""
+    n = t.size
+    if points >= n or points < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    out = np.empty(points, np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for k in range(points - 2):
+        lo, hi = edges[k], edges[k + 1]
+        nxt_hi = edges[k + 2] if k + 2 < points - 1 else n
+        avg_t, avg_v = t[hi:nxt_hi].mean(), v[hi:nxt_hi].mean()
+        area = np.abs((t[a] - avg_t) * (v[lo:hi] - v[a]) - (t[a] - t[lo:hi]) * (avg_v - v[a]))
+        a = lo + int(area.argmax())
+        out[k + 1] = a
+    return out
+
+
+class SeriesStore:
+    def __init__(self, metrics=METRICS, tiers=TIERS):
+        self.metrics = tuple(metrics)
+        self._col = {m: i for i, m in enumerate(self.metrics)}
+        self.tiers = [_Tier(name, width, slots, len(self.metrics)) for name, width, slots in tiers]
+        self._lock = threading.Lock()
+        self.high_water = 0.0        # newest timestamp folded in
+        self.frames = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self.path = None
+
+    # ---------------- ingest ----------------
+    def observe(self, frame, ts=None):
+        """Fold one telemetry frame ({"temp": .., "hum": .., ...}) into every tier."""
+        ts = time.time() if ts is None else float(ts)
+        row = np.full(len(self.metrics), np.nan)
+        for k, v in frame.items():
+            j = self._col.get(k)
+            if j is not None:
+                try:
+                    row[j] = float(v)
+                except (TypeError, ValueError):
+                    pass
+        with self._lock:
+            for tier in self.tiers:
+                tier.add(ts, row)
+            self.high_water = max(self.high_water, ts)
+            self.frames += 1
+
+    def ingest(self, ts, vals):
+        """Bulk fold: ts (k,) epoch seconds, vals (k, len(metrics)) with NaN for missing."""
+        if not len(ts):
+            return
+        if np.any(np.diff(ts) < 0):
+            order = np.argsort(ts, kind="stable")
+            ts, vals = ts[order], vals[order]
+        with self._lock:
+            for tier in self.tiers:
+                tier.ingest(ts, vals)
+            self.high_water = max(self.high_water, float(ts[-1]))
+            self.frames += len(ts)
+
+    # ---------------- query ----------------
+    def query(self, metric, t_from, t_to, points=500, mode="minmax"):
+        """
+        Downsampled series of `metric` over [t_from, t_to] (epoch seconds).
+        mode "minmax": {"t", "min", "max", "avg"} per point; "lttb": {"t", "v"}.
+        Raises ValueError for an unknown metric or mode.
+        """
+        if metric not in self._col:
+            raise ValueError(f"unknown metric {metric!r} (known: {', '.join(self.metrics)})")
+        if mode not in ("minmax", "lttb"):
+            raise ValueError(f"unknown mode {mode!r} (minmax or lttb)")
+        points = max(1, min(int(points), POINTS_MAX))
+        now = time.time()
+        oldest = self.tiers[-1]
+        t_from, t_to = sorted((float(t_from), float(t_to)))
+        t_from = max(t_from, (now // oldest.width - oldest.slots + 1) * oldest.width)
+        t_to = max(t_from, min(t_to, now))
+        tier = self.tiers[-1]
+        for cand in self.tiers:
+            if cand.covers(t_from, now) and (t_to - t_from) / cand.width <= SCAN_MAX:
+                tier = cand
+                break
+        col = self._col[metric]
+        with self._lock:
+            t, mn, mx, sm, cnt = tier.read(col, t_from, t_to)
+        out = {"metric": metric, "tier": tier.name, "from": t_from, "to": t_to, "buckets": int(t.size)}
+        avg = sm / np.maximum(cnt, 1)
+
+        if mode == "lttb":
+            keep = lttb(t, avg, points)
+            out.update(t=t[keep].tolist(), v=np.round(avg[keep], 3).tolist())
+            return out
+
+        if t.size > points:
+            # group buckets into `points` equal time slices
+            g = np.clip((t - t_from) * points // max(t_to - t_from, 1e-9), 0, points - 1).astype(np.int64)
+            starts = np.flatnonzero(np.r_[True, g[1:] != g[:-1]])
+            t = t[starts]
+            mn = np.fmin.reduceat(mn, starts)
+            mx = np.fmax.reduceat(mx, starts)
+            avg = np.add.reduceat(sm, starts) / np.maximum(np.add.reduceat(cnt, starts), 1)
+        out.update(t=t.tolist(), min=np.round(mn.astype(np.float64), 3).tolist(),
+                   max=np.round(mx.astype(np.float64), 3).tolist(), avg=np.round(avg, 3).tolist())
+        return out
+
+    def stats(self):
+        return {"frames": self.frames, "high_water": self.high_water,
+                "tiers": {t.name: int((t.b >= 0).sum()) for t in self.tiers}}
+
+    # ---------------- persistence ----------------
+    def save(self, path=None):
+        path = path or self.path or ROLLUP_FILE
+        with self._lock:
+            arrays = {"metrics": np.array(self.metrics), "high_water": np.array(self.high_water)}
+            for t in self.tiers:
+                for a in ("b", "mn", "mx", "sm", "cnt"):
+                    arrays[f"{t.name}_{a}"] = getattr(t, a)
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                np.savez(f, **arrays)
+        os.replace(tmp, path)
+
+    def load(self, path=None):
+        path = path or self.path or ROLLUP_FILE
+        try:
+            with np.load(path) as z:
+                if tuple(z["metrics"]) != self.metrics:
+                    print("[series_store] rollup metrics changed, starting fresh")
+                    return False
+                with self._lock:
+                    for t in self.tiers:
+                        for a in ("b", "mn", "mx", "sm", "cnt"):
+                            saved = z[f"{t.name}_{a}"]
+                            if saved.shape != getattr(t, a).shape:
+                                raise ValueError(f"tier {t.name} was saved with a different size")
+                        for a in ("b", "mn", "mx", "sm", "cnt"):
+                            setattr(t, a, z[f"{t.name}_{a}"].copy())
+                    self.high_water = float(z["high_water"])
+            print(f"[series_store] loaded rollups up to {time.ctime(self.high_water)}")
+            return True
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"[series_store] could not load {path}: {e}")
+            return False
+
+    def backfill_csv(self, csv_path, after=0.0, before=None):
+        """
+        Fold sensor_log.csv rows with after < ts < before into the tiers. With a
+        saved high-water mark only the tail of the log is read (backwards,
+        newest first). Otherwise the whole file is streamed in chunks.
+        """
+        before = time.time() if before is None else before
+        n = 0
+        if after > 0:
+            rows, cursor = [], None
+            while True:
+                page, cursor = history_log.read_page(csv_path, cursor, history_log.PAGE_MAX)
+                page = [[r.get("timestamp", "")] + [r.get(m, "") for m in self.metrics] for r in page]
+                rows.extend(page)
+                if cursor is None or not page:
+                    break
+                ts, _ = _rows_to_arrays(page[-1:])
+                if ts[0] <= after:
+                    break
+            n += self._fold_rows(rows, after, before)
+        else:
+            with open(csv_path, newline="") as f:
+                reader = csv.reader(f)
+                header = next(reader, [])
+                cols = [header.index(c) if c in header else None for c in ("timestamp",) + self.metrics]
+                chunk = []
+                for r in reader:
+                    chunk.append([r[c] if c is not None and c < len(r) else "" for c in cols])
+                    if len(chunk) >= BACKFILL_CHUNK:
+                        n += self._fold_rows(chunk, after, before)
+                        chunk = []
+                n += self._fold_rows(chunk, after, before)
+        return n
+
+    def _fold_rows(self, rows, after, before):
+        rows = [r for r in rows if r[0]]
+        if not rows:
+            return 0
+        try:
+            ts, vals = _rows_to_arrays(rows)
+        except ValueError as e:
+            print(f"[series_store] skipping unparsable rows: {e}")
+            return 0
+        keep = (ts > after) & (ts < before)
+        if keep.any():
+            self.ingest(ts[keep], vals[keep])
+        return int(keep.sum())
+
+    # ---------------- lifecycle ----------------
+    def start(self, csv_path=None, path=ROLLUP_FILE):
+        """Load saved rollups, backfill the sensor log in the background and save periodically."""
+        self.path = path
+        live_from = time.time()
+        after = self.high_water if self.load(path) else 0.0
+
+        def run():
+            if csv_path and os.path.exists(csv_path):
+                try:
+                    t0 = time.time()
+                    n = self.backfill_csv(csv_path, after=after, before=live_from)
+                    print(f"[series_store] backfilled {n} rows from {csv_path} in {time.time() - t0:.1f}s")
+                except Exception as e:
+                    print(f"[series_store] backfill from {csv_path} failed: {e}")
+            while not self._stop.wait(SAVE_EVERY):
+                try:
+                    self.save()
+                except Exception as e:
+                    print(f"[series_store] save failed: {e}")
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        try:
+            self.save()
+        except Exception as e:
+            print(f"[series_store] save failed: {e}")
+
+
+SERIES = SeriesStore()
@@ -0,0 +1,92 @@
+"""
+Build-once static assets for the dashboard page.
+
+build(html) runs once at import. It moves the page's inline <style> and
+<script> into content-hashed files (/assets/app.<hash>.css, .js) and
+precompresses every file with gzip and, if the brotli package is installed,
+brotli. serve() then picks an encoding from Accept-Encoding and answers
+If-None-Match with 304.
+
+The hashed assets are immutable: a changed file gets a new name, so browsers
+may cache them for a year without revalidating. The page itself is small and
+marked no-cache, so every load revalidates it with its ETag (304, no body),
+and a new build is picked up at once.
+"""
+import gzip
+import hashlib
+import re
+
+from flask import Response, request
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except Exception:
+    BROTLI_AVAILABLE = False
+
+ASSET_PREFIX = "/assets/"
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+MIN_COMPRESS = 256        # smaller bodies are sent as-is
+
+
+class Asset:
+    def __init__(self, body, content_type, cache_control):
+        self.body = body if isinstance(body, bytes) else body.encode("utf-8")
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.digest = hashlib.sha256(self.body).hexdigest()[:16]
+        self.variants = {"identity": self.body}
+        if len(self.body) >= MIN_COMPRESS:
+            self.variants["gzip"] = gzip.compress(self.body, compresslevel=9, mtime=0)
+            if BROTLI_AVAILABLE:
+                self.variants["br"] = brotli.compress(self.body, quality=11)
+
+    def etag(self, encoding):
+        return self.digest if encoding == "identity" else f"{self.digest}-{encoding}"
+
+    def sizes(self):
+        return {enc: len(b) for enc, b in self.variants.items()}
+
+
+def build(html):
+    """
+    Split `html` into a page plus hashed CSS/JS assets.
+    Returns (page Asset, {asset name: Asset}).
+    """
+    assets = {}
+
+    def extract(pattern, ext, content_type, tag):
+        nonlocal html
+        m = re.search(pattern, html, re.S)
+        if not m:
+            return
+        asset = Asset(m.group(1).strip() + "\n", content_type, IMMUTABLE)
+        name = f"app.{asset.digest}.{ext}"
+        assets[name] = asset
+        html = html[:m.start()] + tag.format(ASSET_PREFIX + name) + html[m.end():]
+
+    extract(r"<style>(.*?)</style>", "css", "text/css; charset=utf-8",
+            '<link rel="stylesheet" href="{}">')
+    extract(r"<script>(.*?)</script>", "js", "application/javascript; charset=utf-8",
+            '<script src="{}"></script>')
+    page = Asset(html, "text/html; charset=utf-8", REVALIDATE)
+    return page, assets
+
+
+def serve(asset):
+    """Flask response for `asset`: best accepted encoding, ETag, Cache-Control, 304 on a match."""
+    encoding = "identity"
+    if request.headers.get("Accept-Encoding"):
+        encoding = request.accept_encodings.best_match(
+            [e for e in ("br", "gzip") if e in asset.variants]) or "identity"
+    etag = asset.etag(encoding)
+    headers = {"Cache-Control": asset.cache_control, "Vary": "Accept-Encoding"}
+    if etag in request.if_none_match:
+        resp = Response(status=304, headers=headers)
+    else:
+        resp = Response(asset.variants[encoding], content_type=asset.content_type, headers=headers)
+        if encoding != "identity":
+            resp.headers["Content-Encoding"] = encoding
+    resp.set_etag(etag)
+    return resp
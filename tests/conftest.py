@@ -0,0 +1,5 @@
+"""Make the repo's flat root modules importable from the tests."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,32 @@
+"""LoopBroadcaster: a resuming async client gets every event it missed, once."""
+import asyncio
+
+from asgi_app import LoopBroadcaster
+from event_hub import EventHub
+
+
+def test_event_published_while_first_client_joins_is_not_lost():
+    hub = EventHub()
+    loop = asyncio.new_event_loop()
+    try:
+        b = LoopBroadcaster(hub, loop)
+        hub.publish("action_ack", "before")
+        last_id = hub.last_id - 1
+
+        # an event that lands while the broadcaster is registering its first topic
+        update = hub.update_topics
+        def racing_update(*a, **k):
+            hub.publish("action_ack", "during")
+            return update(*a, **k)
+        hub.update_topics = racing_update
+
+        client = b.add(frozenset({"actions"}), last_id=last_id)
+        hub.update_topics = update
+        hub.publish("action_ack", "after")
+        loop.run_until_complete(asyncio.sleep(0))
+
+        got = b"".join(client.replay + client.take(timeout=0))
+        for data in (b"before", b"during", b"after"):
+            assert got.count(data) == 1
+    finally:
+        loop.close()
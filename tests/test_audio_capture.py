@@ -0,0 +1,31 @@
+"""FrameRing: framing of arbitrary-size blocks and overrun accounting."""
+import numpy as np
+
+from audio_capture import FrameRing
+
+
+def test_blocks_are_cut_into_frames_in_order():
+    ring = FrameRing(frame_samples=4, slots=4)
+    ring.push(np.arange(6, dtype=np.int16))
+    assert len(ring) == 1
+    ring.push(np.arange(6, 8, dtype=np.int16))
+    assert len(ring) == 2
+    assert ring.peek(timeout=0).tolist() == [0, 1, 2, 3]
+    ring.release()
+    assert ring.peek(timeout=0).tolist() == [4, 5, 6, 7]
+    ring.release()
+    assert ring.peek(timeout=0) is None
+
+
+def test_full_ring_drops_and_counts_instead_of_blocking():
+    ring = FrameRing(frame_samples=2, slots=2)
+    ring.push(np.arange(4, dtype=np.int16))
+    ring.push(np.arange(10, 15, dtype=np.int16))
+    assert ring.overruns == 1 and ring.dropped_samples == 5
+    assert len(ring) == 2
+    assert ring.peek(timeout=0).tolist() == [0, 1]
+    ring.release()
+    # space again: the next block starts a fresh frame
+    ring.push(np.array([7, 8], dtype=np.int16))
+    ring.release()
+    assert ring.peek(timeout=0).tolist() == [7, 8]
@@ -0,0 +1,28 @@
+"""Ordering and error reporting of the dashboard command Debouncer."""
+import time
+
+from command_batch import Debouncer
+
+
+def test_pending_slider_value_applies_before_later_command():
+    applied = []
+    deb = Debouncer(applied.append, window=0.05)
+    deb.submit("FAN_PWM:100")
+    deb.submit("FAN_PWM:120")
+    deb.apply_now("FAN_OFF")
+    time.sleep(0.1)
+    assert applied == ["FAN_PWM:120", "FAN_OFF"]
+    assert deb.stats() == {"received": 2, "applied": 1, "superseded": 1, "failed": 0, "pending": 0}
+
+
+def test_failed_debounced_apply_is_reported():
+    errors = []
+
+    def apply(cmd):
+        raise RuntimeError("serial down")
+
+    deb = Debouncer(apply, window=0.01, on_error=lambda cmd, e: errors.append((cmd, str(e))))
+    deb.submit("FAN_PWM:50")
+    time.sleep(0.1)
+    assert errors == [("FAN_PWM:50", "serial down")]
+    assert deb.stats()["failed"] == 1
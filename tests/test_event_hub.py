@@ -0,0 +1,54 @@
+"""EventHub / Subscriber: coalescing, overflow resync and Last-Event-ID replay."""
+from event_hub import EventHub, Subscriber, encode
+
+
+def test_coalesced_events_keep_their_slot_and_newest_payload():
+    sub = Subscriber(maxlen=8)
+    sub.offer("state", b"s1", coalesce=True)
+    sub.offer("voice_event", b"v1")
+    sub.offer("state", b"s2", coalesce=True)
+    sub.offer("state", b"s3", coalesce=True)
+    assert sub.take(timeout=0) == [b"s3", b"v1"]
+    assert sub.coalesced == 2 and sub.delivered == 2
+
+
+def test_overflow_drops_backlog_and_requests_resync():
+    sub = Subscriber(maxlen=2)
+    assert sub.offer("voice_event", b"a") and sub.offer("voice_event", b"b")
+    assert sub.offer("voice_event", b"c") is False
+    assert sub.overflows == 1
+    assert sub.take_resync() is True and sub.take_resync() is False
+    assert sub.take(timeout=0) == []
+    # coalesced events never overflow
+    assert sub.offer("state", b"s", coalesce=True)
+
+
+def test_hub_counts_slow_events():
+    hub = EventHub(maxlen=1)
+    sub = hub.subscribe(["voice"])
+    hub.publish("voice_event", {"n": 1})
+    hub.publish("voice_event", {"n": 2})
+    assert hub.slow_events == 1 and sub.resync
+
+
+def test_resume_replays_exactly_the_missed_events():
+    hub = EventHub()
+    hub.publish("action_ack", "a")      # nobody listening: kept unencoded in the ring
+    seen = hub.last_id
+    hub.publish("action_ack", "b")
+    hub.publish("voice_rms", {"level": 5})   # ephemeral, never replayed
+    hub.publish("voice_event", {"text": "c"})
+    sub = hub.subscribe(["actions"], last_id=seen)
+    assert sub.replay == [encode("action_ack", "b", seen + 1)]
+    hub.publish("action_ack", "d")
+    assert sub.take(timeout=0) == [encode("action_ack", "d", seen + 3)]
+
+
+def test_resume_outside_the_ring_gets_no_replay():
+    hub = EventHub(replay=2)
+    first = hub.last_id
+    for i in range(4):
+        hub.publish("action_ack", i)
+    assert hub.subscribe(["actions"], last_id=first).replay is None
+    assert hub.subscribe(["actions"], last_id=hub.last_id + 10).replay is None
+    assert hub.subscribe(["actions"], last_id=hub.last_id).replay == []
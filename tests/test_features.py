@@ -0,0 +1,35 @@
+"""RollingWindow: O(1) rolling mean and least-squares slope."""
+import numpy as np
+
+import features
+from features import RollingWindow
+
+
+def test_slope_of_a_ramp_across_wraparound():
+    w = RollingWindow(5)
+    for y in range(1, 13):
+        w.push(2.0 * y)
+    assert len(w) == 5
+    assert w.slope() == 2.0
+    assert w.mean() == 20.0 and w.last() == 24.0
+
+
+def test_slope_matches_least_squares_after_resync():
+    rng = np.random.default_rng(0)
+    ys = rng.normal(24.0, 1.0, features.RESYNC_EVERY + 37)
+    w = RollingWindow(30)
+    for y in ys:
+        w.push(y)
+    expected = np.polyfit(np.arange(30), ys[-30:], 1)[0]
+    assert abs(w.slope() - expected) < 1e-9
+    assert abs(w.mean() - ys[-30:].mean()) < 1e-9
+
+
+def test_short_or_flat_window_has_zero_slope():
+    w = RollingWindow(10)
+    assert w.slope() == 0.0 and w.mean(default=-1) == -1 and w.last() is None
+    w.push(3.0)
+    assert w.slope() == 0.0
+    for _ in range(20):
+        w.push(3.0)
+    assert w.slope() == 0.0
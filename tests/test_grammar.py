@@ -0,0 +1,20 @@
+"""Vosk grammars must cover every phrase the controller acts on."""
+import json
+
+import controller
+from voice_handler import build_grammar
+
+
+def test_wake_grammar_has_controller_wake_phrases():
+    grammar = set(json.loads(build_grammar("wake")))
+    assert set(controller.WAKE_PHRASES) <= grammar
+
+
+def test_command_grammar_has_controller_wake_and_sleep_phrases():
+    grammar = set(json.loads(build_grammar("command")))
+    assert set(controller.WAKE_PHRASES) <= grammar
+    assert set(controller.SLEEP_PHRASES) <= grammar
+
+
+def test_free_mode_has_no_grammar():
+    assert build_grammar("free") is None
@@ -0,0 +1,42 @@
+"""Cursor pagination over append-only CSV logs."""
+import history_log
+from history_log import read_page
+
+
+def write_log(path, start, n, header=True):
+    with open(path, "a") as f:
+        if header:
+            f.write("timestamp,text,intent\n")
+        for i in range(start, start + n):
+            f.write(f"2024-01-01 00:00:{i:02d},row {i},LED_ON\n")
+
+
+def test_pages_walk_the_log_newest_first_without_gaps(tmp_path, monkeypatch):
+    monkeypatch.setattr(history_log, "READ_BLOCK", 64)    # force several block reads per page
+    path = tmp_path / "voice_log.csv"
+    write_log(path, 0, 45)
+    seen, cursor = [], None
+    while True:
+        rows, cursor = read_page(path, before=cursor, limit=20)
+        seen += [r["text"] for r in rows]
+        if cursor is None:
+            break
+    assert seen == [f"row {i}" for i in range(44, -1, -1)]
+
+
+def test_cursor_stays_valid_while_the_log_grows(tmp_path):
+    path = tmp_path / "action_log.csv"
+    write_log(path, 0, 10)
+    rows, cursor = read_page(path, limit=4)
+    assert [r["text"] for r in rows] == ["row 9", "row 8", "row 7", "row 6"]
+    write_log(path, 10, 5, header=False)
+    rows, cursor = read_page(path, before=cursor, limit=4)
+    assert [r["text"] for r in rows] == ["row 5", "row 4", "row 3", "row 2"]
+    rows, cursor = read_page(path, before=cursor, limit=4)
+    assert [r["text"] for r in rows] == ["row 1", "row 0"] and cursor is None
+
+
+def test_header_only_log_is_empty(tmp_path):
+    path = tmp_path / "empty.csv"
+    write_log(path, 0, 0)
+    assert read_page(path) == ([], None)
@@ -0,0 +1,34 @@
+"""Regression tests for the numeric fan-level slot in IntentMatcher."""
+
+from intent_index import IntentMatcher
+
+# the parts of voice_handler's tables the slot interacts with (voice_handler needs vosk to import)
+INTENT_MAP = {
+    "turn fan on": "FAN_ON", "turn fan off": "FAN_OFF",
+    "fan on": "FAN_ON", "fan off": "FAN_OFF",
+    "turn light on": "LED_ON", "turn light off": "LED_OFF",
+}
+MISHEAR_MAP = {"than": "fan", "then": "fan", "pan": "fan", "man": "fan", "van": "fan"}
+
+
+def matcher():
+    return IntentMatcher(INTENT_MAP, MISHEAR_MAP, intent_fuzz=70, on_off_fuzz=70)
+
+
+def test_mishear_alias_with_number_is_not_a_fan_level():
+    assert not (matcher()("more than one") or "").startswith("FAN_PWM:")
+
+
+def test_number_in_ordinary_speech_is_not_a_fan_level():
+    assert not (matcher()("the man had ten dogs") or "").startswith("FAN_PWM:")
+
+
+def test_explicit_off_beats_the_number():
+    assert matcher()("fan off one") == "FAN_OFF"
+
+
+def test_fan_level_still_parses():
+    m = matcher()
+    assert m("set fan to fifty") == "FAN_PWM:128"
+    assert m("fan speed seventy five percent") == "FAN_PWM:191"
+    assert m("fan 40%") == "FAN_PWM:102"
@@ -0,0 +1,21 @@
+"""Traces carried over from the voice engine process (Trace.export / TraceBuffer.adopt)."""
+
+import latency_trace
+from latency_trace import TraceBuffer
+
+
+def test_adopted_trace_merges_later_marks_and_local_stages():
+    child, parent = TraceBuffer(), TraceBuffer()
+    remote = child.start("voice", first_stage="speech_onset")
+    remote.intent = "LED_ON"
+    remote.mark("intent_mapped")
+
+    trace = parent.adopt(remote.export())
+    with latency_trace.active(trace):
+        latency_trace.mark("command_enqueued")
+    remote.mark("tts_started")
+    assert parent.adopt(remote.export()) is trace
+
+    [got] = parent.recent()
+    assert got["intent"] == "LED_ON"
+    assert list(got["stages_ms"]) == ["speech_onset", "intent_mapped", "command_enqueued", "tts_started"]
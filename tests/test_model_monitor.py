@@ -0,0 +1,30 @@
+"""Page-Hinkley drift alarm and the monitor's drift flag."""
+from model_monitor import ModelMonitor, PageHinkley
+
+
+def test_page_hinkley_alarms_on_a_shift_and_resets():
+    ph = PageHinkley(delta=0.05, threshold=8.0, min_samples=30)
+    assert not any(ph.update(0.0) for _ in range(200))
+    alarms = [ph.update(1.0) for _ in range(60)]
+    assert any(alarms)
+    assert ph.n < 60        # state restarted at the alarm
+
+
+def test_no_alarm_before_min_samples():
+    ph = PageHinkley(delta=0.0, threshold=1.0, min_samples=30)
+    assert not any(ph.update(5.0 * (i % 2)) for i in range(29))
+
+
+def test_monitor_flags_drift_and_clears_it_after_a_quiet_period():
+    mon = ModelMonitor(window=50)
+    for _ in range(100):
+        mon.score_intent("LED_ON", "LED_ON")
+    for _ in range(60):
+        mon.score_intent("LED_ON", "FAN_ON")
+        if mon.snapshot()["intent"]["drift"]:
+            break
+    snap = mon.snapshot()["intent"]
+    assert snap["drift"] and snap["drift_count"] == 1 and snap["last_drift"]
+    for _ in range(30):
+        mon.score_intent("LED_ON", "LED_ON")
+    assert mon.snapshot()["intent"]["drift"] is False
@@ -0,0 +1,57 @@
+"""Residency rules of ModelRegistry: observe() stays cheap, eviction keeps feature windows."""
+
+from model_registry import ModelRegistry
+
+
+def test_observe_does_not_load_evicted_brain(tmp_path):
+    reg = ModelRegistry(model_dir=str(tmp_path), memory_budget=1)
+    reg.get("a")
+    reg.get("b")
+    assert reg.resident_keys() == ["b"]
+    loads = reg.loads
+    reg.observe("a", {"temp": 25.0, "hum": 40, "pir": 1})
+    assert reg.loads == loads and reg.resident_keys() == ["b"]
+
+
+def test_feature_windows_survive_eviction(tmp_path):
+    reg = ModelRegistry(model_dir=str(tmp_path), memory_budget=1)
+    for t in (20.0, 21.0, 22.0):
+        reg.observe("a", {"temp": t, "hum": 40, "pir": 0})
+    before = reg.get("a").feature_vector(22.0, 40, False, 0, ts=0)
+    reg.get("b")
+    assert "a" not in reg.resident_keys()
+    assert list(reg.get("a").feature_vector(22.0, 40, False, 0, ts=0)) == list(before)
+
+
+def test_brain_in_training_is_not_evicted(tmp_path):
+    reg = ModelRegistry(model_dir=str(tmp_path), memory_budget=1)
+    brain = reg.get("a")
+    seen = []
+    original = brain.update_intent
+
+    def update_intent(text, label, async_train=True):
+        reg.get("b")    # another room loads mid-training
+        seen.append(reg.resident_keys())
+        return original(text, label, async_train=async_train)
+
+    brain.update_intent = update_intent
+    reg.update_intent("a", "lights on", "LED_ON", async_train=False)
+    assert "a" in seen[0]
+
+
+def test_quality_history_survives_eviction(tmp_path):
+    reg = ModelRegistry(model_dir=str(tmp_path), memory_budget=1)
+    reg.update_intent("a", "lights on", "LED_ON", async_train=False)
+    before = reg.quality()["a"]
+    reg.get("b")
+    assert "a" not in reg.resident_keys()
+    assert reg.get("a").quality() == before
+    assert reg.view("a").quality() == before
+
+
+def test_batch_keeps_its_rooms_until_done(tmp_path):
+    reg = ModelRegistry(model_dir=str(tmp_path), memory_budget=1)
+    out = reg.predict_fan_batch({k: (25.0, 50.0, True, 1) for k in ("a", "b", "c")})
+    assert sorted(out) == ["a", "b", "c"]
+    assert reg.loads == 3
+    assert reg.evictions == 3    # budget enforced once the batch is done
@@ -0,0 +1,77 @@
+"""Regression tests for wake-phrase stripping and the shared scan pool."""
+
+import phrase_detect
+from phrase_detect import PhraseDetector, PhraseMatch
+
+# voice_handler's wake words (voice_handler needs vosk to import)
+WAKE_WORDS = ["hello", "hey", "hey vesta", "vesta", "hey vista", "hi vista", "hey there"]
+
+
+def test_strip_leaves_text_when_match_is_inside_a_word():
+    det = PhraseDetector(WAKE_WORDS, 65)
+    m = det.detect("turn the light on")
+    assert m is not None and m.phrase == "hey"
+    assert det.strip("turn the light on", m) == "turn the light on"
+
+
+def test_strip_removes_whole_word_match():
+    det = PhraseDetector(WAKE_WORDS, 65)
+    assert det.strip("Hey  turn the light on") == "turn the light on"
+    assert det.strip("okay hey vista") == "okay vista"
+
+
+def test_pool_scores_each_text_once_across_detectors():
+    wake = phrase_detect.register("test_wake", ["hey vista", "hello"], 75, pool="test")
+    voice = phrase_detect.register("test_voice_wake", WAKE_WORDS, 65, pool="test")
+    assert voice.pool is wake.pool
+    wake.detect("hey vista lights on")
+    voice.detect("hey vista lights on")
+    assert wake.pool.scores.cache_info().misses == 1
+    # each detector keeps its own phrases and threshold
+    assert wake.detect("they are here") is None
+    assert voice.detect("they are here") == PhraseMatch("hey", 100.0, 1, 4)
+
+
+def test_article_is_not_stripped_as_wake_word():
+    det = PhraseDetector(WAKE_WORDS, 65)
+    assert det.strip("the light") == "the light"
+    assert det.strip("the fan") == "the fan"
+
+
+def test_resolve_keeps_intent_for_the_light_and_the_fan():
+    import voice_handler
+    from intent_index import IntentMatcher
+
+    vh = voice_handler.VoiceHandler.__new__(voice_handler.VoiceHandler)
+    vh.wake_detector = PhraseDetector(voice_handler.WAKE_WORDS, voice_handler.WAKEFUZZ)
+    vh.intents = IntentMatcher(voice_handler.INTENT_MAP, voice_handler.MISHEAR_MAP)
+    for text in ("the light", "the fan"):
+        intent, tail = vh._resolve(text)
+        assert intent != "WAKE" and tail == text
+
+
+def test_detect_is_consistent_while_reconfigured():
+    import threading
+
+    det = PhraseDetector(["hey vista"], 65)
+    errors, stop = [], threading.Event()
+
+    def reconfigure():
+        i = 0
+        while not stop.is_set():
+            i += 1
+            det.configure(["hey vista"] if i % 2 else ["hey vista", "bye vista", "sleep"])
+
+    t = threading.Thread(target=reconfigure)
+    t.start()
+    try:
+        for n in range(2000):
+            m = det.detect(f"hey vista number {n}")
+            if m is None or m.phrase != "hey vista":
+                errors.append(m)
+    except Exception as e:
+        errors.append(e)
+    finally:
+        stop.set()
+        t.join()
+    assert not errors
@@ -0,0 +1,24 @@
+"""Mic meter dead band and room selection in flask_app.publish_rms."""
+
+import flask_app
+
+
+def test_meter_returns_to_zero(monkeypatch):
+    sent = []
+    monkeypatch.setattr(flask_app, "publish", lambda event, data: sent.append(data["level"]))
+    monkeypatch.setattr(flask_app, "_last_rms", None)
+    monkeypatch.setattr(flask_app, "RMS_ROOM", None)
+    for level in (300, 310, 30, 10):
+        flask_app.publish_rms(level)
+    assert sent == [300, 30, 0]
+
+
+def test_only_the_primary_room_drives_the_meter(monkeypatch):
+    sent = []
+    monkeypatch.setattr(flask_app, "publish", lambda event, data: sent.append(data))
+    monkeypatch.setattr(flask_app, "_last_rms", None)
+    monkeypatch.setattr(flask_app, "RMS_ROOM", "kitchen")
+    flask_app.publish_rms(400, room="hall")
+    flask_app.publish_rms(305, room="kitchen")
+    flask_app.publish_rms(0, room="hall")
+    assert sent == [{"room": "kitchen", "level": 305}]
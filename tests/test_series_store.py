@@ -0,0 +1,72 @@
+"""Rollup tiers, tier selection and LTTB in series_store."""
+import time
+
+import numpy as np
+
+from series_store import SeriesStore, lttb
+
+
+def two_hours(store):
+    base = (time.time() // 3600 - 2) * 3600
+    ts = base + np.arange(7200, dtype=np.float64)
+    vals = np.full((ts.size, len(store.metrics)), np.nan)
+    vals[:, 0] = np.arange(7200)                 # temp
+    store.ingest(ts, vals)
+    return base
+
+
+def test_recent_range_reads_raw_buckets():
+    store = SeriesStore()
+    base = two_hours(store)
+    r = store.query("temp", base, base + 599, points=5000)
+    assert r["tier"] == "raw" and r["buckets"] == 600
+    assert r["min"][:3] == [0.0, 1.0, 2.0]
+
+
+def test_rollups_keep_min_max_avg_per_bucket():
+    store = SeriesStore()
+    base = two_hours(store)
+    # 20 days is beyond the 1 m tier's two weeks: served from hourly buckets
+    h = store.query("temp", base - 20 * 86400, base + 3 * 3600, points=5000)
+    assert h["tier"] == "1h" and h["buckets"] == 2
+    assert (h["min"], h["max"], h["avg"]) == ([0.0, 3600.0], [3599.0, 7199.0], [1799.5, 5399.5])
+    # the 1 s tier squeezed into 20 points still keeps the extremes
+    raw = store.query("temp", base, base + 3 * 3600, points=20)
+    assert raw["tier"] == "raw" and len(raw["t"]) <= 20
+    assert min(raw["min"]) == 0.0 and max(raw["max"]) == 7199.0
+
+
+def test_single_frames_and_bulk_ingest_agree():
+    a, b = SeriesStore(), SeriesStore()
+    now = time.time()
+    frames = [{"temp": 20 + i % 7, "hum": 40} for i in range(300)]
+    for i, f in enumerate(frames):
+        a.observe(f, ts=now - 300 + i)
+    ts = now - 300 + np.arange(300, dtype=np.float64)
+    vals = np.full((300, len(b.metrics)), np.nan)
+    vals[:, 0] = [f["temp"] for f in frames]
+    vals[:, 1] = 40
+    b.ingest(ts, vals)
+    for metric in ("temp", "hum"):
+        assert a.query(metric, now - 3600, now, points=50) == b.query(metric, now - 3600, now, points=50)
+
+
+def test_unknown_metric_or_mode_raises():
+    store = SeriesStore()
+    for args in (("co2", 0, 1), ("temp", 0, 1, 10, "avg")):
+        try:
+            store.query(*args)
+        except ValueError:
+            continue
+        raise AssertionError(f"query{args} did not raise")
+
+
+def test_lttb_keeps_endpoints_and_spikes():
+    t = np.arange(1000, dtype=np.float64)
+    v = np.zeros(1000)
+    v[437] = 50.0
+    keep = lttb(t, v, 20)
+    assert keep.size == 20 and keep[0] == 0 and keep[-1] == 999
+    assert np.all(np.diff(keep) > 0)
+    assert 437 in keep
+    assert lttb(t[:10], v[:10], 20).tolist() == list(range(10))
@@ -0,0 +1,77 @@
+import numpy as np
+
+NOISE_MULT = 3.0          # speech threshold = noise floor * NOISE_MULT
+MIN_THRESHOLD = 150.0
+FLOOR_ALPHA_DOWN = 0.05   # floor follows quieter rooms quickly ...
+FLOOR_ALPHA_UP = 0.005    # ... and louder ones (fan spinning up) slowly
+
+# pre-gate: a speech-like frame has a moderate zero-crossing rate and most of
+# its energy in the voice band; fan/motor hum is low-frequency and tonal
+GATE_ZCR_MIN = 0.02
+GATE_ZCR_MAX = 0.45
+GATE_BAND_HZ = (300.0, 3400.0)
+GATE_BAND_RATIO = 0.45
+
+
+class NoiseFloorTracker:
+    """
+    Continuous ambient-level estimate from non-speech frames (asymmetric
+    exponential tracker, O(1) per frame). The speech threshold follows it.
+    """
+    def __init__(self, initial_floor=None, mult=NOISE_MULT, min_threshold=MIN_THRESHOLD,
+                 alpha_down=FLOOR_ALPHA_DOWN, alpha_up=FLOOR_ALPHA_UP):
+        self.mult = mult
+        self.min_threshold = min_threshold
+        self.alpha_down = alpha_down
+        self.alpha_up = alpha_up
+        self.floor = initial_floor
+
+    def reset(self, floor):
+        self.floor = float(floor)
+
+    def update(self, level):
+        """Feed the RMS of a frame known not to be speech."""
+        if self.floor is None:
+            self.floor = float(level)
+            return
+        a = self.alpha_down if level < self.floor else self.alpha_up
+        self.floor += a * (level - self.floor)
+
+    @property
+    def threshold(self):
+        if self.floor is None:
+            return None
+        return max(self.min_threshold, self.floor * self.mult)
+
+
+class SpeechGate:
+    """Cheap zero-crossing + voice-band energy check run before a frame may start an utterance."""
+    def __init__(self, samplerate, frame_samples, band_hz=GATE_BAND_HZ,
+                 zcr_min=GATE_ZCR_MIN, zcr_max=GATE_ZCR_MAX, band_ratio=GATE_BAND_RATIO):
+        self.zcr_min = zcr_min
+        self.zcr_max = zcr_max
+        self.band_ratio = band_ratio
+        freqs = np.fft.rfftfreq(frame_samples, 1.0 / samplerate)
+        self._band = (freqs >= band_hz[0]) & (freqs <= band_hz[1])
+        self._window = np.hanning(frame_samples).astype(np.float32)
+        self.frames = 0
+        self.rejected = 0
+
+    def is_speech(self, frame):
+        a = frame if isinstance(frame, np.ndarray) else np.frombuffer(frame, dtype=np.int16)
+        self.frames += 1
+        n = a.shape[0]
+        if n < 2:
+            return False
+        zcr = np.count_nonzero(np.signbit(a[1:]) != np.signbit(a[:-1])) / (n - 1)
+        if zcr < self.zcr_min or zcr > self.zcr_max:
+            self.rejected += 1
+            return False
+        w = self._window if n == self._window.shape[0] else np.hanning(n)
+        spec = np.abs(np.fft.rfft(a * w)) ** 2
+        total = float(spec.sum())
+        band = self._band if spec.shape[0] == self._band.shape[0] else np.ones_like(spec, dtype=bool)
+        if total <= 0 or float(spec[band].sum()) / total < self.band_ratio:
+            self.rejected += 1
+            return False
+        return True
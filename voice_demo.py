@@ -1,3 +1,4 @@
+import sys
 from voice_handler import VoiceHandler
 
 def on_intent(intent, text, source='voice'):
@@ -8,6 +9,16 @@ vh = VoiceHandler(
     on_intent_callback=on_intent
 )
 
+if len(sys.argv) > 1:
+    # offline: python voice_demo.py recording.wav [...]
+    from voice_offline import run_file
+    for path in sys.argv[1:]:
+        res = run_file(vh, path)
+        for intent, text in res["events"]:
+            on_intent(intent, text)
+        print(f"{path}: {res['audio_s']:.1f}s audio, {res['cpu_s']:.2f}s CPU, TTS: {res['spoken']}")
+    sys.exit(0)
+
 vh.start()
 
 print("Running — say 'hey vesta, turn light on' or 'turn fan off'")
@@ -1,14 +1,30 @@
-import sounddevice as sd
 import numpy as np
 import json
+import os
 import time
+import wave
+import hashlib
 import threading
-import queue
-import pyttsx3
-import re
+from collections import deque
+try:
+    import pyttsx3
+    TTS_AVAILABLE = True
+except Exception:
+    TTS_AVAILABLE = False
+try:
+    import sounddevice as sd
+    SD_AVAILABLE = True
+except Exception:
+    SD_AVAILABLE = False
 import difflib
 from vosk import Model, KaldiRecognizer
-from rapidfuzz import fuzz
+
+from audio_capture import MicCapture
+from intent_index import IntentMatcher, NUMBER_WORDS
+from vad import NoiseFloorTracker, SpeechGate, MIN_THRESHOLD, NOISE_MULT
+import phrase_detect
+import latency_trace
+from latency_trace import TRACES
 
 DEBUG_RMS = False
 DEBUG_PARTIAL = True
@@ -21,6 +37,7 @@ FRAME_SAMPLES = int(SAMPLE_RATE * FRAME_MS / 1000)
 SILENCE_DURATION = 0.35
 SILENCE_FRAMES = int(SILENCE_DURATION / (FRAME_MS/1000))
 CALIBRATE_SECONDS = 1.5
+ADAPTIVE_THRESHOLD = True   # keep tracking the noise floor after calibration
 
 # Wake words and thresholds (include single-word wakes)
 WAKE_WORDS = ["hello", "hey", "hey vesta", "vesta", "hey vista", "hi vista", "hey there"]
@@ -55,6 +72,12 @@ INTENT_FUZZ = 70
 KEYWORD_FUZZ = 58     
 ON_OFF_FUZZ = 70
 INTENT_COOLDOWN = 0.6
+# Speculative dispatch from partial results: fire once the partial hypothesis
+# has stayed the same for EARLY_STABLE_FRAMES frames and matches a phrase with
+# fuzz.ratio >= EARLY_FUZZ. The final result then only corrects or is dropped.
+EARLY_INTENT = True
+EARLY_STABLE_FRAMES = 4
+EARLY_FUZZ = 90
 # Casual speech filter 
 MISHEAR_MAP = {
     "right": "light",
@@ -70,13 +93,64 @@ MISHEAR_MAP = {
     
 }
 
+FAN_LEVEL_PHRASES = ["set fan to", "fan to", "fan speed", "percent"]
+
+# Grammar-constrained decoding. "wake" listens only for wake words, "command"
+# for the closed command set, "free" is the open-vocabulary model. Anything
+# outside a grammar decodes as [unk].
+GRAMMAR_MODE = True
+VOICE_MODES = ("wake", "command", "free")
+
+
+def build_grammar(mode):
+    """Vosk phrase-list grammar (JSON) for a mode, or None for open vocabulary."""
+    if mode == "free":
+        return None
+    # the controller's wake/sleep fallbacks only see what the grammar lets through
+    phrases = list(WAKE_WORDS) + list(phrase_detect.WAKE_PHRASES)
+    if mode == "command":
+        phrases += (list(INTENT_MAP.keys()) + list(phrase_detect.SLEEP_PHRASES)
+                    + FAN_LEVEL_PHRASES + list(NUMBER_WORDS.keys()))
+    return json.dumps(sorted(set(phrases)) + ["[unk]"])
+
 
 # ---------------- Non-blocking TTS ----------------
+# Spoken confirmations per intent ("Okay, <reply>")
+INTENT_REPLIES = {
+    "LED_ON": "light on",
+    "LED_OFF": "light off",
+    "FAN_ON": "fan on",
+    "FAN_OFF": "fan off",
+    "LED_AUTO": "LED auto",
+    "FAN_AUTO": "fan auto",
+    "VOICE_SLEEP": "going to auto"
+}
+TTS_FIXED_PHRASES = ["Yes?"] + [f"Okay, {r}" for r in INTENT_REPLIES.values()]
+TTS_CACHE_DIR = "tts_cache"
+
+
 class NonBlockingTTS:
-    def __init__(self, rate=150):
-        self.q = queue.Queue()
+    """
+    Single-worker TTS. The fixed confirmation phrases are rendered to WAV once
+    with pyttsx3's save_to_file (while the worker is idle, or after the first
+    time one is spoken live), kept in memory and played with sounddevice.
+    Anything else is synthesised live. A new utterance supersedes utterances
+    still waiting in the queue, so replies never pile up behind stale ones.
+    """
+    def __init__(self, rate=150, cache_dir=TTS_CACHE_DIR, fixed_phrases=TTS_FIXED_PHRASES, prerender=True):
+        self.rate = rate
+        self.cache_dir = cache_dir
+        self._fixed = set(fixed_phrases)
+        self._clips = {}          # text -> (int16 samples, samplerate)
+        self._uncacheable = set()
+        self._to_render = list(fixed_phrases) if (prerender and SD_AVAILABLE) else []
+        self._pending = deque()
+        self._cv = threading.Condition()
+        self.dropped = 0
         self.engine = None
         try:
+            if not TTS_AVAILABLE:
+                raise RuntimeError("pyttsx3 is not installed")
             self.engine = pyttsx3.init()
             self.engine.setProperty('rate', rate)
             self.t = threading.Thread(target=self._worker, daemon=True)
@@ -85,40 +159,114 @@ class NonBlockingTTS:
             print("[TTS] init error:", e)
             self.engine = None
 
+    def _cache_path(self, text):
+        key = hashlib.sha1(f"{self.rate}|{text}".encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.cache_dir, key + ".wav")
+
+    def _load_clip(self, text, path):
+        try:
+            with wave.open(path, 'rb') as w:
+                if w.getsampwidth() != 2:
+                    raise ValueError("unsupported sample width %d" % w.getsampwidth())
+                data = np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16)
+                ch = w.getnchannels()
+                self._clips[text] = (data.reshape(-1, ch) if ch > 1 else data, w.getframerate())
+            return True
+        except Exception as e:
+            print(f"[TTS] cannot use cached clip for '{text}': {e}")
+            self._uncacheable.add(text)
+            return False
+
+    def _render(self, text):
+        if text in self._clips or text in self._uncacheable:
+            return
+        path = self._cache_path(text)
+        if not os.path.exists(path):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self.engine.save_to_file(text, path)
+            self.engine.runAndWait()
+        self._load_clip(text, path)
+
+    def _play_cached(self, text):
+        if not SD_AVAILABLE or text not in self._fixed or text in self._uncacheable:
+            return False
+        if text not in self._clips:
+            path = self._cache_path(text)
+            if not (os.path.exists(path) and self._load_clip(text, path)):
+                return False
+        samples, sr = self._clips[text]
+        sd.play(samples, sr)
+        sd.wait()
+        return True
+
     def _worker(self):
         while True:
-            txt = self.q.get()
+            with self._cv:
+                while not self._pending and not self._to_render:
+                    self._cv.wait()
+                txt, trace = self._pending.popleft() if self._pending else (None, None)
             try:
-                if self.engine:
+                if trace is not None:
+                    trace.mark("tts_started")
+                if txt is None:
+                    # idle: pre-render the next fixed phrase
+                    self._render(self._to_render.pop(0))
+                elif not self._play_cached(txt):
                     self.engine.say(txt)
                     self.engine.runAndWait()
+                    if (SD_AVAILABLE and txt in self._fixed and txt not in self._clips
+                            and txt not in self._uncacheable and txt not in self._to_render):
+                        self._to_render.append(txt)
             except Exception as e:
                 print("[TTS] speak error:", e)
 
-    def speak(self, text):
-        if self.engine:
-            self.q.put(text)
+    def speak(self, text, supersede=True):
+        if not self.engine:
+            return
+        with self._cv:
+            if supersede and self._pending:
+                self.dropped += len(self._pending)
+                self._pending.clear()
+            # the voice pipeline's current trace gets its tts_started mark from the worker
+            self._pending.append((text, latency_trace.current()))
+            self._cv.notify()
 
 # ---------------- Voice Handler ----------------
 class VoiceHandler:
-    def __init__(self, model_path, on_intent_callback, tts_enabled=True, on_rms_callback=None):
+    def __init__(self, model_path, on_intent_callback, tts_enabled=True, on_rms_callback=None,
+                 use_grammar=GRAMMAR_MODE, tts=None, model=None, room=None):
         """
         model_path: path to extracted VOSK model directory
         on_intent_callback: function(intent_label:str, text:str, source='voice')
             - special intent 'WAKE' used for wake-only events
             - special intent 'VOICE_SLEEP' used to go back to auto
         on_rms_callback: function(level:int) - for dashboard UI
+        use_grammar: decode with phrase-list grammars (see set_mode) instead of open vocabulary
+        tts: object with speak(text) to use instead of NonBlockingTTS (e.g. a test stand-in)
+        model: an already loaded vosk Model to share (model_path is then ignored)
+        room: name of the room this microphone covers (tags traces and log lines)
         """
         self.on_intent = on_intent_callback
+        self.room = room
+        self._tag = f":{room}" if room else ""
         try:
-            self.model = Model(model_path)
+            self.model = model if model is not None else Model(model_path)
         except Exception as e:
             print("[VoiceHandler] Failed to load VOSK model:", e)
             print("[VoiceHandler] Make sure your VOSK_MODEL path in main.py is correct!")
             raise
-        self.rec = KaldiRecognizer(self.model, SAMPLE_RATE)
+        # runtime-configurable (phrase_detect.configure("voice_wake", ...)); scans through
+        # the "voice" pool shared with the controller's wake/sleep detectors
+        self.wake_detector = phrase_detect.register("voice_wake", WAKE_WORDS, WAKEFUZZ, pool="voice")
+        self.intents = IntentMatcher(INTENT_MAP, MISHEAR_MAP, intent_fuzz=INTENT_FUZZ, on_off_fuzz=ON_OFF_FUZZ)
+        self._recognizers = {}
+        self.mode = "command" if use_grammar else "free"
+        self._pending_mode = None
+        self.rec = self._recognizer_for(self.mode)
         self._stop = threading.Event()
-        self.tts = NonBlockingTTS() if tts_enabled else None
+        self.tts = tts if tts is not None else (NonBlockingTTS() if tts_enabled else None)
+        # time source for cooldowns/throttles; offline runs swap in stream time
+        self.clock = time.time
         self._listen_thread = None
         self._last_intent_time = 0.0
         self.threshold = None  
@@ -126,87 +274,120 @@ class VoiceHandler:
         self.on_rms = on_rms_callback
         self._last_rms_time = 0.0
 
+        self._started = False
+        self._silence_counter = 0
+        self._segments = []
+        self._last_partial = ""
+        self._partial_stable = 0
+        self._early = None
+        self._trace = None
+
+        self.capture = None
+        self._last_overruns = 0
+        self.noise = NoiseFloorTracker()
+        self.gate = SpeechGate(SAMPLE_RATE, FRAME_SAMPLES)
+        self._reset_stats()
+        self._rms_scratch = np.zeros(FRAME_SAMPLES, dtype=np.float32)
+
     def _rms(self, frame):
-        a = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
-        return np.sqrt(np.mean(a*a)) if a.size else 0.0
+        """RMS of an int16 frame (bytes or ndarray), reusing a float32 scratch buffer."""
+        a = frame if isinstance(frame, np.ndarray) else np.frombuffer(frame, dtype=np.int16)
+        n = a.shape[0]
+        if not n:
+            return 0.0
+        if n > self._rms_scratch.shape[0]:
+            self._rms_scratch = np.zeros(n, dtype=np.float32)
+        scratch = self._rms_scratch[:n]
+        np.copyto(scratch, a)
+        return float(np.sqrt(np.dot(scratch, scratch) / n))
+
+    def _recognizer_for(self, mode):
+        """One recognizer per mode, built once and reused across utterances."""
+        rec = self._recognizers.get(mode)
+        if rec is None:
+            grammar = build_grammar(mode)
+            if grammar is None:
+                rec = KaldiRecognizer(self.model, SAMPLE_RATE)
+            else:
+                rec = KaldiRecognizer(self.model, SAMPLE_RATE, grammar)
+            self._recognizers[mode] = rec
+        return rec
+
+    def set_mode(self, mode):
+        """
+        Switch decoding grammar: 'wake', 'command' or 'free'. Safe to call from any
+        thread; the switch happens between utterances in the processing thread.
+        """
+        if mode not in VOICE_MODES:
+            raise ValueError(f"unknown voice mode: {mode}")
+        self._pending_mode = mode
+
+    def _apply_pending_mode(self):
+        mode, self._pending_mode = self._pending_mode, None
+        if mode and mode != self.mode:
+            self.rec = self._recognizer_for(mode)
+            self.mode = mode
+            if DEBUG_EVENTS:
+                print("[VoiceHandler] decoding mode:", mode)
+
+    def _reset_stats(self):
+        self._stats_start = self.clock()
+        self._rec_cpu = 0.0
+        self.utterances = 0
+        self.false_triggers = 0
+        self.early_fired = 0
+        self.early_corrected = 0
+        self.gate.frames = self.gate.rejected = 0
+
+    def voice_stats(self):
+        """Recognizer CPU and false-trigger rates (per hour of listening) plus VAD state."""
+        hours = max((self.clock() - self._stats_start) / 3600.0, 1e-9)
+        out = {
+            "hours": round(hours, 4),
+            "recognizer_cpu_s": round(self._rec_cpu, 3),
+            "recognizer_cpu_s_per_hour": round(self._rec_cpu / hours, 2),
+            "utterances": self.utterances,
+            "false_triggers": self.false_triggers,
+            "false_triggers_per_hour": round(self.false_triggers / hours, 2),
+            "gate_rejected": self.gate.rejected,
+            "early_intents": self.early_fired,
+            "early_corrected": self.early_corrected,
+            "noise_floor": None if self.noise.floor is None else round(self.noise.floor, 1),
+            "threshold": None if self.threshold is None else round(self.threshold, 1),
+            "mode": self.mode,
+        }
+        out.update(self.capture_stats())
+        return out
+
+    def capture_stats(self):
+        """Ring-buffer overrun counters from the capture stage (empty if not running)."""
+        return self.capture.stats() if self.capture else {}
 
     def _map_intent(self, text):
-        t = text.lower().strip()
-        if not t:
-            return None
-
-        # 1. exact or fuzzy phrase match
-        if t in INTENT_MAP:
-            return INTENT_MAP[t]
-        best = (None, 0)
-        for k, v in INTENT_MAP.items():
-            s = fuzz.ratio(k, t)
-            if s > best[1]:
-                best = (v, s)
-        if best[1] >= INTENT_FUZZ:
-            return best[0]
-
-        # 2. Keyword matching
-        words = re.findall(r"[a-zA-Z]+", t)
-        if not words:
-            return None
-
-        device = None
-        action = None
-        
-        # *** FIX: Simplified device detection ***
-        # First, check the word itself
-        if "light" in words: device = "light"
-        elif "fan" in words: device = "fan"
-        else:
-            # If not found, check the mishear map
-            for w in words:
-                if w in MISHEAR_MAP:
-                    device = MISHEAR_MAP[w] # device becomes "light" or "fan"
-                    break
+        return self.intents(text)
 
-     
-        # detect on/off
-        for w in words:
-            if fuzz.partial_ratio("on", w) >= ON_OFF_FUZZ:
-                action = "on"; break
-            if fuzz.partial_ratio("off", w) >= ON_OFF_FUZZ:
-                action = "off"; break
-        if action is None:
-            if re.search(r'\bon\b', t): action = "on"
-            if re.search(r'\boff\b', t): action = "off"
-        
-
-        if device and action:
-            if device == "fan":
-                return "FAN_ON" if action == "on" else "FAN_OFF"
-            else: 
-                return "LED_ON" if action == "on" else "LED_OFF"
-
-        # loose fallback for very short inputs
-        if len(t.split()) <= 2:
-            for k, v in INTENT_MAP.items():
-                s = fuzz.partial_ratio(k, t)
-                if s >= (INTENT_FUZZ - 8):
-                    return v
+    @staticmethod
+    def _threshold_from_levels(levels):
+        """Speech threshold from ambient RMS samples."""
+        if not levels:
+            return 700
+        mean_silence = float(np.mean(levels))
+        return max(MIN_THRESHOLD, mean_silence * NOISE_MULT)
 
-        return None
-
-    def _calibrate_threshold(self, stream, seconds=CALIBRATE_SECONDS):
+    def _calibrate_threshold(self, capture, seconds=CALIBRATE_SECONDS):
         if DEBUG_EVENTS:
             print("[VoiceHandler] Calibrating ambient noise for", seconds, "seconds...")
         samples = []
         frames = int((seconds * 1000) / FRAME_MS)
         for _ in range(frames):
-            data, _ = stream.read(FRAME_SAMPLES)
-            if len(data) == 0:
+            frame = capture.read(timeout=0.5)
+            if frame is None:
                 continue
-            samples.append(self._rms(data))
-        if not samples:
-            self.threshold = 700
-        else:
-            mean_silence = float(np.mean(samples))
-            self.threshold = max(150.0, mean_silence * 3.0)
+            samples.append(self._rms(frame))
+            capture.release()
+        self.threshold = self._threshold_from_levels(samples)
+        if samples:
+            self.noise.reset(float(np.mean(samples)))
         if DEBUG_EVENTS:
             print("[VoiceHandler] Calibrated threshold:", int(self.threshold))
 
@@ -221,171 +402,288 @@ class VoiceHandler:
         if self._listen_thread:
             self._listen_thread.join(timeout=1)
 
-    def _audio_loop(self):
+    # ---------------- Utterance pipeline ----------------
+    # Every frame of an utterance is fed to the recognizer exactly once. Final
+    # segments that Vosk's own endpointer emits mid-utterance are collected, and
+    # FinalResult() flushes the rest when our silence counter expires. The same
+    # recognizer is then reset and reused for the next utterance.
+
+    def _reset_utterance(self):
+        self._started = False
+        self._silence_counter = 0
+        self._segments = []
+        self._last_partial = ""
+        self._partial_stable = 0
+        self._early = None
+        self._trace = None
+        try:
+            self.rec.Reset()
+        except AttributeError:
+            # older vosk builds: FinalResult() already left the decoder finalized,
+            # and the next AcceptWaveform() starts a fresh utterance on its own
+            pass
+
+    def _accept(self, data):
+        if isinstance(data, np.ndarray):
+            data = data.tobytes()
+        t0 = time.thread_time()
         try:
-            stream = sd.RawInputStream(samplerate=SAMPLE_RATE, blocksize=FRAME_SAMPLES,
-                                       dtype='int16', channels=1)
-            stream.start()
+            if self.rec.AcceptWaveform(data):
+                seg = json.loads(self.rec.Result()).get('text', '')
+                if seg:
+                    self._segments.append(seg)
         except Exception as e:
-            print("[VoiceHandler] Failed to open audio stream:", e)
-            print("[VoiceHandler] This may be a microphone permissions or selection issue.")
+            if DEBUG_EVENTS:
+                print("[VoiceHandler] VOSK accept error:", e)
+        self._rec_cpu += time.thread_time() - t0
+
+    def _finish_utterance(self):
+        trace = self._trace
+        if trace is not None:
+            trace.mark("speech_end")
+        t0 = time.thread_time()
+        try:
+            seg = json.loads(self.rec.FinalResult()).get('text', '')
+        except Exception as e:
+            if DEBUG_EVENTS:
+                print("[VoiceHandler] VOSK recognition error:", e)
+            seg = ''
+        self._rec_cpu += time.thread_time() - t0
+        if trace is not None:
+            trace.mark("recognized")
+        text = " ".join(self._segments + [seg])
+        # out-of-grammar speech decodes as [unk]; it carries nothing to match on
+        text = " ".join(w for w in text.split() if w != "[unk]")
+        early = self._early
+        self._reset_utterance()
+        self.utterances += 1
+        if not text and early is None:
+            # woke the recognizer for nothing (noise that passed the gate)
+            self.false_triggers += 1
+            if trace is not None:
+                TRACES.discard(trace)
+        if text:
+            with latency_trace.active(trace):
+                if early is None:
+                    self._handle_text(text)
+                else:
+                    self._reconcile_early(text, early)
+
+    def _check_partial(self):
+        """Dispatch the intent early if the partial hypothesis is stable and confidently a command."""
+        if not (EARLY_INTENT or DEBUG_PARTIAL):
+            return
+        try:
+            p = json.loads(self.rec.PartialResult()).get('partial', '')
+        except Exception:
+            return
+        p = " ".join(w for w in p.split() if w != "[unk]")
+        if DEBUG_PARTIAL and p and p != self._last_partial:
+            print("[VoiceHandler] PARTIAL:", p)
+        if not EARLY_INTENT or self._early is not None or not p:
+            return
+        if p != self._last_partial:
+            self._last_partial = p
+            self._partial_stable = 0
+            return
+        self._partial_stable += 1
+        if self._partial_stable < EARLY_STABLE_FRAMES:
+            return
+
+        intent, text_for_intent = self._resolve(p)
+        if intent in (None, "WAKE") or not self.intents.confident(text_for_intent, EARLY_FUZZ):
+            return
+        if self.clock() - self._last_intent_time < INTENT_COOLDOWN:
             return
+        if DEBUG_EVENTS:
+            print("[VoiceHandler] EARLY intent from partial:", intent, "|", p)
+        self._early = intent
+        self.early_fired += 1
+        with latency_trace.active(self._trace):
+            latency_trace.mark("intent_mapped")
+            self._dispatch(intent, text_for_intent)
+
+    def _reconcile_early(self, text, early):
+        """Final result of an utterance whose intent was already dispatched from a partial."""
+        if DEBUG_EVENTS:
+            print("[VoiceHandler] HEARD:", text)
+        intent, text_for_intent = self._resolve(text)
+        if intent == early or intent in (None, "WAKE"):
+            # confirmed (or the final lost the command): don't dispatch twice
+            return
+        if DEBUG_EVENTS:
+            print("[VoiceHandler] final result corrects early intent:", early, "->", intent)
+        self.early_corrected += 1
+        self._dispatch(intent, text_for_intent)
+
+    def _process_frame(self, data):
+        """VAD + recognition for one FRAME_SAMPLES int16 frame (bytes or ndarray)."""
+        if self._pending_mode and not self._started:
+            self._apply_pending_mode()
+
+        level = self._rms(data)
+
+        # Send RMS level to dashboard (throttled)
+        now = self.clock()
+        if self.on_rms and (now - self._last_rms_time > 0.2):
+            try:
+                self.on_rms(int(level))
+                self._last_rms_time = now
+            except Exception:
+                pass
+
+        if DEBUG_RMS:
+            print("[VoiceHandler] RMS", int(level))
+
+        if level > self.threshold and (self._started or self.gate.is_speech(data)):
+            if not self._started:
+                self._trace = TRACES.start("voice" + self._tag, first_stage="speech_onset")
+            self._started = True
+            self._silence_counter = 0
+            self._accept(data)
+            self._check_partial()
+        elif self._started:
+            # trailing silence is part of the utterance; decode it once as well
+            self._accept(data)
+            self._silence_counter += 1
+            self._check_partial()
+
+            if self._silence_counter > SILENCE_FRAMES:
+                self._finish_utterance()
+        elif ADAPTIVE_THRESHOLD:
+            # not speech: follow the ambient level (fan on/off, window open ...)
+            self.noise.update(level)
+            self.threshold = self.noise.threshold
+
+    def _resolve(self, text):
+        """
+        (intent, text_for_intent) for recognized text. intent is 'WAKE' for a
+        wake-only utterance and None when nothing matched.
+        """
+        wake = self.wake_detector.detect(text)
+        if wake:
+            tail = self.wake_detector.strip(text, wake)
+            if tail == '' or len(tail.split()) < 2:
+                return "WAKE", text
+            return self._map_intent(tail), tail
+        return self._map_intent(text), text
+
+    def _dispatch(self, intent, text_for_intent):
+        trace = latency_trace.current()
+        if trace is not None:
+            trace.intent, trace.text = intent, text_for_intent
+        try:
+            self.on_intent(intent, text_for_intent, source='voice')
+        except Exception as e:
+            print("[VoiceHandler] on_intent callback error:", e)
+        latency_trace.mark("callback_returned")
+        if self.tts:
+            speak_txt = INTENT_REPLIES.get(intent, text_for_intent)
+            self.tts.speak(f"Okay, {speak_txt}")
+        self._last_intent_time = self.clock()
+
+    def _handle_text(self, text):
+        """Wake detection, intent mapping and callbacks for one recognized utterance."""
+        if DEBUG_EVENTS:
+            print("[VoiceHandler] HEARD:", text)
+
+        intent, text_for_intent = self._resolve(text)
+        trace = latency_trace.mark("intent_mapped")
+        if trace is not None:
+            trace.intent, trace.text = intent or "LOG_SPEECH", text_for_intent
+
+        if intent == "WAKE":
+            if DEBUG_EVENTS:
+                print("[VoiceHandler] WAKE detected (wake-only):", text)
+            try:
+                self.on_intent("WAKE", text, source='voice')
+            except Exception as e:
+                print("[VoiceHandler] on_intent callback error (WAKE):", e)
+            if self.tts:
+                self.tts.speak("Yes?")
+            # apply cooldown so WAKE isn't repeated
+            self._last_intent_time = self.clock()
+            return
+
+        now = self.clock()
+        if now - self._last_intent_time < INTENT_COOLDOWN:
+            if DEBUG_EVENTS:
+                print("[VoiceHandler] In cooldown, ignoring:", text_for_intent)
+            return
+
+        if intent:
+            self._dispatch(intent, text_for_intent)
+        else:
+            if DEBUG_EVENTS:
+                print("[VoiceHandler] No intent matched for:", text_for_intent)
+
+            try:
+                self.on_intent("LOG_SPEECH", text_for_intent, source='voice')
+            except Exception as e:
+                print("[VoiceHandler] on_intent callback error (LOG_SPEECH):", e)
 
+    def _audio_loop(self):
+        capture = MicCapture(SAMPLE_RATE, FRAME_SAMPLES)
         try:
-            self._calibrate_threshold(stream)
+            capture.start()
         except Exception as e:
-            print("[VoiceHandler] Calibration failed, using default threshold. Err:", e)
-            self.threshold = 700
+            print("[VoiceHandler] Failed to open audio stream:", e)
+            print("[VoiceHandler] This may be a microphone permissions or selection issue.")
+            return
+        self.run_capture(capture)
 
-        buf = bytearray()
-        started = False
-        silence_counter = 0
+    def begin_capture(self, capture, calibrate=True):
+        """Attach `capture`, reset stats and (optionally) calibrate the threshold on it."""
+        self.capture = capture
+        self._reset_stats()
+        if calibrate or self.threshold is None:
+            try:
+                self._calibrate_threshold(capture)
+            except Exception as e:
+                print("[VoiceHandler] Calibration failed, using default threshold. Err:", e)
+                self.threshold = 700
+        self._reset_utterance()
+        self._last_overruns = 0
 
+    def pump(self, capture, max_frames, timeout=0.0):
+        """
+        Process up to `max_frames` frames from `capture`, waiting at most
+        `timeout` for the first one. Returns the number processed. Used by
+        run_capture and by VoiceService workers, which pump many handlers.
+        """
+        n = 0
+        while n < max_frames:
+            frame = capture.read(timeout=timeout if n == 0 else 0)
+            if frame is None:
+                if getattr(capture, "exhausted", False) and self._started:
+                    self._finish_utterance()
+                break
+            try:
+                self._process_frame(frame)
+            finally:
+                capture.release()
+            n += 1
+
+        overruns = capture.stats().get("overruns", 0)
+        if overruns != self._last_overruns:
+            if DEBUG_EVENTS:
+                print(f"[VoiceHandler{self._tag}] capture ring overrun, total:", overruns)
+            self._last_overruns = overruns
+        return n
+
+    def run_capture(self, capture, calibrate=True):
+        """
+        Processing stage. Pulls frames from `capture` (anything with
+        read(timeout)/release()/stop(): the mic ring, or a file source) and
+        does RMS, recognition, matching and callbacks. With the mic, capture
+        runs in the PortAudio callback, so slow recognition builds a backlog
+        in the ring instead of losing samples. A source that sets `exhausted`
+        ends the loop, and any utterance still open is flushed.
+        """
+        self.begin_capture(capture, calibrate)
         try:
             while not self._stop.is_set():
-                try:
-                    data, _ = stream.read(FRAME_SAMPLES)
-                except Exception as e:
-                    if DEBUG_EVENTS:
-                        print("[VoiceHandler] Audio read error:", e)
-                    time.sleep(0.05)
-                    continue
-
-                if len(data) == 0:
-                    time.sleep(0.001)
-                    continue
-
-                level = self._rms(data)
-
-                # Send RMS level to dashboard (throttled)
-                now = time.time()
-                if self.on_rms and (now - self._last_rms_time > 0.2): 
-                    try:
-                        self.on_rms(int(level))
-                        self._last_rms_time = now
-                    except Exception:
-                        pass 
-                
-                if DEBUG_RMS:
-                    print("[VoiceHandler] RMS", int(level))
-
-                if level > self.threshold:
-                    buf.extend(data)
-                    started = True
-                    silence_counter = 0
-                    try:
-                        self.rec.AcceptWaveform(data)
-                    except Exception:
-                        pass
-                else:
-                    if started:
-                        buf.extend(data)
-                        silence_counter += 1
-                        if DEBUG_PARTIAL:
-                            try:
-                                pr = json.loads(self.rec.PartialResult())
-                                if 'partial' in pr and pr['partial']:
-                                    print("[VoiceHandler] PARTIAL:", pr['partial'])
-                            except Exception:
-                                pass
-
-                        if silence_counter > SILENCE_FRAMES:
-                            try:
-                                if self.rec.AcceptWaveform(bytes(buf)):
-                                    res = json.loads(self.rec.Result())
-                                else:
-                                    res = json.loads(self.rec.FinalResult())
-                            except Exception as e:
-                                if DEBUG_EVENTS:
-                                    print("[VoiceHandler] VOSK recognition error:", e)
-                                res = {}
-
-                            text = res.get('text', '').strip()
-                            if text:
-                                if DEBUG_EVENTS:
-                                    print("[VoiceHandler] HEARD:", text)
-
-                                original_text = text  
-
-                                lw_ok = False
-                                matched_wake = None
-                                for w in WAKE_WORDS:
-                                    if fuzz.partial_ratio(w, original_text) >= WAKEFUZZ:
-                                        lw_ok = True
-                                        matched_wake = w
-                                        break
-
-                                
-                                if lw_ok:
-                                    
-                                    pattern = re.compile(re.escape(matched_wake), re.IGNORECASE)
-                                    tail = pattern.sub('', original_text, count=1).strip()
-                                    if tail == '' or len(tail.split()) < 2:
-                                        if DEBUG_EVENTS:
-                                            print("[VoiceHandler] WAKE detected (wake-only):", original_text)
-                                        try:
-                                            self.on_intent("WAKE", original_text, source='voice')
-                                        except Exception as e:
-                                            print("[VoiceHandler] on_intent callback error (WAKE):", e)
-                                        if self.tts:
-                                            self.tts.speak("Yes?")
-                                        # reset buffers and recognizer
-                                        buf = bytearray()
-                                        started = False
-                                        silence_counter = 0
-                                        self.rec = KaldiRecognizer(self.model, SAMPLE_RATE)
-                                        # apply cooldown so WAKE isn't repeated
-                                        self._last_intent_time = time.time()
-                                        continue
-                                    else:
-                                        text_for_intent = tail
-                                else:
-                                    text_for_intent = original_text
-
-                                now = time.time()
-                                if now - self._last_intent_time < INTENT_COOLDOWN:
-                                    if DEBUG_EVENTS:
-                                        print("[VoiceHandler] In cooldown, ignoring:", text_for_intent)
-                                else:
-                                    intent = self._map_intent(text_for_intent)
-                                    if intent:
-                                        try:
-                                            self.on_intent(intent, text_for_intent, source='voice')
-                                        except Exception as e:
-                                            print("[VoiceHandler] on_intent callback error:", e)
-                                        if self.tts:
-                                            friendly = {
-                                                "LED_ON": "light on",
-                                                "LED_OFF": "light off",
-                                                "FAN_ON": "fan on",
-                                                "FAN_OFF": "fan off",
-                                                "LED_AUTO": "LED auto", 
-                                                "FAN_AUTO": "fan auto",
-                                                "VOICE_SLEEP": "going to auto"
-                                            }
-                                            speak_txt = friendly.get(intent, text_for_intent)
-                                            self.tts.speak(f"Okay, {speak_txt}")
-                                        self._last_intent_time = now
-                                    else:
-                                        if DEBUG_EVENTS:
-                                            print("[VoiceHandler] No intent matched for:", text_for_intent)
-
-                                        try:
-                                            self.on_intent("LOG_SPEECH", text_for_intent, source='voice')
-                                        except Exception as e:
-                                            print("[VoiceHandler] on_intent callback error (LOG_SPEECH):", e)
-
-                            buf = bytearray()
-                            started = False
-                            silence_counter = 0
-                            self.rec = KaldiRecognizer(self.model, SAMPLE_RATE)
-                    else:
-                        pass
-
-                time.sleep(0.001)
+                if not self.pump(capture, 1, timeout=0.2) and getattr(capture, "exhausted", False):
+                    break
         finally:
-            try:
-                stream.stop()
-                stream.close()
-            except Exception:
-                pass
+            capture.stop()
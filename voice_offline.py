@@ -0,0 +1,201 @@
+"""
+Offline / batch mode for the voice pipeline.
+
+Pushes WAV files or raw PCM (16 kHz, mono, int16) through the same
+VAD -> recognition -> _map_intent -> callback path as the live microphone,
+without sounddevice or pyttsx3, and as fast as the CPU allows. Files can be
+fanned out across a process pool where every worker loads its own Vosk Model.
+
+    python voice_offline.py --model models/vosk-model-small-en-us-0.15 recordings/*.wav
+    python voice_offline.py --manifest labelled.csv --workers 4      # regression check
+
+A manifest is a CSV with `path,intent` columns (same format as bench_grammar.py).
+The intent column holds the first command intent expected from the file;
+leave it empty when no command is expected.
+"""
+import argparse
+import csv
+import os
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+MODEL_PATH = "models/vosk-model-small-en-us-0.15"
+NON_COMMAND_INTENTS = ("WAKE", "LOG_SPEECH")
+
+
+# ---------------- Hardware stand-ins ----------------
+class FileCapture:
+    """
+    Microphone stand-in: serves a WAV/raw PCM file as FRAME_SAMPLES int16 frames
+    through the same read()/release()/stop()/stats() interface as MicCapture.
+    `clock()` returns stream time, so cooldowns behave the same at any speed.
+    """
+    def __init__(self, path=None, samplerate=16000, frame_samples=480, pcm=None, realtime=False):
+        self.samplerate = samplerate
+        self.frame_samples = frame_samples
+        self.realtime = realtime
+        if pcm is None:
+            pcm = self._load(path, samplerate)
+        self._samples = np.frombuffer(pcm, dtype=np.int16)
+        self._n_frames = len(self._samples) // frame_samples
+        self._pos = 0
+        self.exhausted = False
+
+    @staticmethod
+    def _load(path, samplerate):
+        if path.lower().endswith(".wav"):
+            with wave.open(path, 'rb') as w:
+                if w.getnchannels() != 1 or w.getsampwidth() != 2 or w.getframerate() != samplerate:
+                    raise ValueError(f"{path}: need {samplerate} Hz mono 16-bit PCM")
+                return w.readframes(w.getnframes())
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def read(self, timeout=None):
+        if self._pos >= self._n_frames:
+            self.exhausted = True
+            return None
+        if self.realtime:
+            time.sleep(self.frame_samples / self.samplerate)
+        i = self._pos * self.frame_samples
+        return self._samples[i:i + self.frame_samples]
+
+    def release(self):
+        self._pos += 1
+
+    def clock(self):
+        return self._pos * self.frame_samples / self.samplerate
+
+    def duration(self):
+        return self._n_frames * self.frame_samples / self.samplerate
+
+    def stats(self):
+        return {"overruns": 0, "dropped_samples": 0, "input_overflows": 0,
+                "backlog_frames": self._n_frames - self._pos}
+
+
+class RecordingTTS:
+    """TTS stand-in: remembers what would have been spoken."""
+    def __init__(self):
+        self.spoken = []
+
+    def speak(self, text):
+        self.spoken.append(text)
+
+
+# ---------------- Single-process runner ----------------
+def run_file(vh, path=None, pcm=None, threshold=None):
+    """
+    Run one recording through `vh` (a VoiceHandler). Returns a dict with the
+    intents emitted, the TTS replies, and audio/CPU timings.
+    """
+    from voice_handler import SAMPLE_RATE, FRAME_SAMPLES
+
+    events = []
+    tts = RecordingTTS()
+    vh.on_intent = lambda intent, text, source='voice': events.append((intent, text))
+    vh.tts = tts
+    vh._last_intent_time = -1e9
+    vh._last_rms_time = -1e9
+
+    capture = FileCapture(path, SAMPLE_RATE, FRAME_SAMPLES, pcm=pcm)
+    vh.clock = capture.clock
+    if threshold is not None:
+        vh.threshold = threshold
+    t0 = time.process_time()
+    vh.run_capture(capture, calibrate=threshold is None)
+    cpu = time.process_time() - t0
+    return {"path": path, "events": events, "spoken": tts.spoken,
+            "audio_s": capture.duration(), "cpu_s": cpu}
+
+
+# ---------------- Process pool ----------------
+_worker_vh = None
+
+
+def _init_worker(model_path, quiet):
+    global _worker_vh
+    import voice_handler as vhmod
+    if quiet:
+        vhmod.DEBUG_EVENTS = False
+        vhmod.DEBUG_PARTIAL = False
+    _worker_vh = vhmod.VoiceHandler(model_path, lambda *a, **k: None, tts=RecordingTTS())
+
+
+def _run_in_worker(args):
+    path, threshold = args
+    try:
+        return run_file(_worker_vh, path, threshold=threshold)
+    except Exception as e:
+        return {"path": path, "error": str(e), "events": [], "spoken": [], "audio_s": 0.0, "cpu_s": 0.0}
+
+
+def run_batch(paths, model_path=MODEL_PATH, workers=None, threshold=None, quiet=True):
+    """Process many recordings in parallel; yields per-file results in input order."""
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(model_path, quiet)) as ex:
+        for res in ex.map(_run_in_worker, [(p, threshold) for p in paths]):
+            yield res
+
+
+def first_command(events):
+    for intent, _ in events:
+        if intent not in NON_COMMAND_INTENTS:
+            return intent
+    return None
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("files", nargs="*")
+    ap.add_argument("--manifest", help="CSV with path,intent columns")
+    ap.add_argument("--model", default=MODEL_PATH)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--threshold", type=float, default=None,
+                    help="fixed RMS threshold (default: calibrate on the first 1.5 s of each file)")
+    args = ap.parse_args()
+
+    expected = {}
+    paths = list(args.files)
+    if args.manifest:
+        with open(args.manifest, newline='') as f:
+            for r in csv.DictReader(f):
+                paths.append(r['path'])
+                expected[r['path']] = (r.get('intent') or '').strip() or None
+    if not paths:
+        ap.error("no input files")
+
+    t0 = time.time()
+    audio = cpu = 0.0
+    failures = 0
+    for res in run_batch(paths, args.model, args.workers, args.threshold):
+        audio += res["audio_s"]; cpu += res["cpu_s"]
+        status = ""
+        if "error" in res:
+            status = f"ERROR {res['error']}"
+            failures += 1
+        elif res["path"] in expected:
+            got = first_command(res["events"])
+            ok = got == expected[res["path"]]
+            failures += not ok
+            status = "ok" if ok else f"FAIL expected {expected[res['path']]} got {got}"
+        print(f"{res['path']}: {res['events']} {status}")
+    wall = time.time() - t0
+
+    print(f"{len(paths)} files, {audio:.1f}s audio in {wall:.1f}s wall ({audio / max(wall, 1e-9):.1f}x real time), "
+          f"{cpu:.1f}s decode CPU, {failures} failures")
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
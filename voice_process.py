@@ -0,0 +1,298 @@
+"""
+Out-of-process voice engine.
+
+Runs VoiceHandler (or VoiceService for several rooms) in a child Python
+process, so Vosk decoding, RMS and fuzzy matching no longer compete for the
+GIL with the Flask SSE threads, the controller loops and the ML trainer.
+
+The child is a plain `python voice_process.py <config>` subprocess rather
+than a multiprocessing.Process. main.py has no __main__ guard, so a
+spawn-started child would run all of it again. The two processes talk over a
+multiprocessing.connection socket on localhost with a per-launch auth key,
+using small tuples:
+
+    child -> parent   ("I", intent, text, source, room, trace)   intent
+                      ("R", level, room)                         mic RMS (already throttled to 5/s)
+                      ("S", stats)                               voice_stats() every STATS_EVERY s
+                      ("T", trace)                               updated trace, every TRACE_EVERY s
+    parent -> child   ("mode", mode) / ("stop",)
+
+VoiceProcess looks like a VoiceHandler to main.py (start/stop/set_mode/mode/
+on_rms/voice_stats) and calls on_intent(intent, text, source=...) from its
+reader thread. A supervisor restarts the child with backoff if it dies and
+re-applies the current grammar mode.
+
+Latency traces start in the child, so each intent carries its trace
+(Trace.export()). The parent adopts it into its own latency_trace.TRACES and
+keeps it active while on_intent runs, so the controller and serial stages
+land on the same trace. Stages the child marks later (tts_started) follow in
+"T" messages, and /api/traces shows the whole utterance.
+"""
+import json
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Listener, Client
+
+import latency_trace
+
+RESTART_BACKOFF = (1, 2, 5, 10, 30)   # seconds between restarts of a crashing engine
+STABLE_AFTER = 60.0                   # an engine that lived this long resets the backoff
+CONNECT_TIMEOUT = 30.0
+STATS_EVERY = 5.0
+TRACE_EVERY = 1.0
+AUTHKEY_ENV = "VESTA_VOICE_AUTHKEY"
+
+
+class VoiceProcess:
+    def __init__(self, model_path, on_intent_callback, tts_enabled=True, on_rms_callback=None,
+                 rooms=None, use_grammar=True):
+        """
+        Same arguments as VoiceHandler; `rooms` ({room: device}) runs a
+        VoiceService in the child and adds room=... to on_intent calls.
+        use_grammar is passed on to the engine in the child (the parent does
+        not import it), so it decides grammar vs. free decoding there too.
+        """
+        self.on_intent = on_intent_callback
+        self.on_rms = on_rms_callback
+        self.model_path = model_path
+        self.tts_enabled = tts_enabled
+        self.rooms = rooms
+        self.use_grammar = use_grammar
+        self.mode = "command" if use_grammar else "free"
+        self.restarts = 0
+        self.traces_forwarded = 0
+        self._stats = {}
+        self._proc = None
+        self._conn = None
+        self._send_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---------------- VoiceHandler-compatible surface ----------------
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._supervise, daemon=True)
+        self._thread.start()
+        print("VoiceProcess started (engine runs in a child process).")
+
+    def stop(self):
+        self._stop.set()
+        self._send(("stop",))
+        self._kill(grace=2.0)
+        if self._thread:
+            self._thread.join(timeout=1)
+
+    def set_mode(self, mode):
+        self.mode = mode
+        self._send(("mode", mode))
+
+    def voice_stats(self):
+        out = dict(self._stats)
+        out.update({
+            "engine_pid": self._proc.pid if self._proc else None,
+            "engine_alive": bool(self._proc and self._proc.poll() is None),
+            "engine_restarts": self.restarts,
+            "traces_forwarded": self.traces_forwarded,
+        })
+        return out
+
+    # ---------------- Supervisor ----------------
+    def _send(self, msg):
+        with self._send_lock:
+            conn = self._conn
+            if conn is None:
+                return False
+            try:
+                conn.send(msg)
+                return True
+            except (OSError, EOFError, ValueError):
+                return False
+
+    def _spawn(self):
+        authkey = secrets.token_bytes(16)
+        listener = Listener(("127.0.0.1", 0), authkey=authkey)
+        try:
+            cfg = {"port": listener.address[1], "model_path": self.model_path, "rooms": self.rooms,
+                   "tts_enabled": self.tts_enabled, "use_grammar": self.use_grammar, "mode": self.mode}
+            env = dict(os.environ, **{AUTHKEY_ENV: authkey.hex()})
+            here = os.path.dirname(os.path.abspath(__file__))
+            self._proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), json.dumps(cfg)],
+                                          cwd=here, env=env)
+
+            # accept() has no timeout: run it aside and close the listener if the child never calls in
+            accepted = {}
+            t = threading.Thread(target=lambda: accepted.setdefault("conn", listener.accept()), daemon=True)
+            t.start()
+            t.join(CONNECT_TIMEOUT)
+            if "conn" not in accepted:
+                raise RuntimeError("voice engine did not connect")
+            with self._send_lock:
+                self._conn = accepted["conn"]
+            print(f"[VoiceProcess] engine running, pid {self._proc.pid}")
+        finally:
+            listener.close()
+
+    def _kill(self, grace=0.0):
+        with self._send_lock:
+            conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        proc = self._proc
+        if proc is None:
+            return
+        try:
+            proc.wait(timeout=grace)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            try:
+                proc.wait(timeout=2)
+            except Exception:
+                pass
+
+    def _pump(self):
+        """Deliver child messages until the connection drops."""
+        while not self._stop.is_set():
+            try:
+                msg = self._conn.recv()
+            except (EOFError, OSError, AttributeError):
+                return
+            kind = msg[0]
+            try:
+                if kind == "I":
+                    _, intent, text, source, room, exported = msg
+                    trace = self._adopt(exported)
+                    if trace is not None:
+                        self.traces_forwarded += 1
+                    with latency_trace.active(trace):
+                        if room is None:
+                            self.on_intent(intent, text, source=source)
+                        else:
+                            self.on_intent(intent, text, source=source, room=room)
+                elif kind == "R":
+                    _, level, room = msg
+                    if self.on_rms and room is None:
+                        self.on_rms(level)
+                    elif self.on_rms:
+                        self.on_rms(level, room=room)
+                elif kind == "S":
+                    self._stats = msg[1]
+                elif kind == "T":
+                    self._adopt(msg[1])
+            except Exception as e:
+                print("[VoiceProcess] callback error:", e)
+
+    def _adopt(self, exported):
+        if exported is None:
+            return None
+        return latency_trace.TRACES.adopt(exported)
+
+    def _supervise(self):
+        failures = 0
+        while not self._stop.is_set():
+            started = time.time()
+            try:
+                self._spawn()
+                self._pump()
+            except Exception as e:
+                print("[VoiceProcess] engine error:", e)
+            self._kill()
+            if self._stop.is_set():
+                break
+            if time.time() - started > STABLE_AFTER:
+                failures = 0
+            delay = RESTART_BACKOFF[min(failures, len(RESTART_BACKOFF) - 1)]
+            failures += 1
+            self.restarts += 1
+            print(f"[VoiceProcess] engine exited (code {self._proc.returncode if self._proc else None}), "
+                  f"restarting in {delay}s")
+            self._stop.wait(delay)
+
+
+# ---------------- Child side ----------------
+def _child_main(cfg):
+    conn = Client(("127.0.0.1", cfg["port"]), authkey=bytes.fromhex(os.environ[AUTHKEY_ENV]))
+    send_lock = threading.Lock()
+
+    def send(msg):
+        with send_lock:
+            try:
+                conn.send(msg)
+            except (OSError, EOFError):
+                # parent is gone; nothing left to serve
+                os._exit(0)
+
+    def on_intent(intent, text, source='voice', room=None):
+        trace = latency_trace.current()
+        send(("I", intent, text, source, room, trace.export() if trace is not None else None))
+
+    def on_rms(level, room=None):
+        send(("R", int(level), room))
+
+    if cfg.get("rooms"):
+        from voice_service import VoiceService
+        engine = VoiceService(cfg["model_path"], cfg["rooms"], on_intent,
+                              tts_enabled=cfg["tts_enabled"], on_rms_callback=on_rms,
+                              use_grammar=cfg["use_grammar"])
+    else:
+        from voice_handler import VoiceHandler
+        engine = VoiceHandler(cfg["model_path"], on_intent, tts_enabled=cfg["tts_enabled"],
+                              on_rms_callback=on_rms, use_grammar=cfg["use_grammar"])
+    mode = cfg.get("mode")
+    if mode and engine.mode != "free" and mode != "free":
+        engine.set_mode(mode)
+    engine.start()
+
+    def report():
+        while True:
+            time.sleep(STATS_EVERY)
+            try:
+                send(("S", engine.voice_stats()))
+            except Exception as e:
+                print("[VoiceProcess] stats error:", e)
+    threading.Thread(target=report, daemon=True).start()
+
+    def forward_traces():
+        sent = {}   # trace id -> marks already forwarded
+        while True:
+            time.sleep(TRACE_EVERY)
+            try:
+                seen = {}
+                for data in latency_trace.TRACES.exports():
+                    # an utterance without an intent may still be discarded as noise
+                    if data["intent"] is None:
+                        continue
+                    n = seen[data["id"]] = len(data["marks"])
+                    if sent.get(data["id"]) != n:
+                        send(("T", data))
+                sent = seen
+            except Exception as e:
+                print("[VoiceProcess] trace forward error:", e)
+    threading.Thread(target=forward_traces, daemon=True).start()
+
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            break
+        if msg[0] == "stop":
+            break
+        if msg[0] == "mode":
+            try:
+                engine.set_mode(msg[1])
+            except Exception as e:
+                print("[VoiceProcess] set_mode failed:", e)
+    try:
+        engine.stop()
+    finally:
+        os._exit(0)
+
+
+if __name__ == "__main__":
+    _child_main(json.loads(sys.argv[1]))
@@ -0,0 +1,169 @@
+"""
+Multi-microphone voice service.
+
+One vosk.Model is loaded once and shared by every input device. Each
+microphone gets its own VoiceHandler: KaldiRecognizer(s), VAD/noise-floor
+state and a MicCapture ring. An extra room therefore costs recognizer state
+and a few seconds of ring buffer, not another copy of the model.
+
+Decoding is scheduled on a small worker pool instead of one thread per
+microphone. A worker sweeps the streams and takes any stream that no other
+worker holds, decodes up to DRAIN_FRAMES of its buffered frames and moves on.
+Vosk releases the GIL inside AcceptWaveform, so streams decode in parallel
+across cores, while any single stream is always processed in order.
+
+Intents reach the callback tagged with their room:
+    on_intent(intent, text, source='voice', room=<name>)
+
+    service = VoiceService(VOSK_MODEL, {"living": None, "kitchen": 2}, on_intent)
+    service.start()
+"""
+import os
+import threading
+
+from vosk import Model
+
+from audio_capture import MicCapture
+import voice_handler as vhmod
+from voice_handler import VoiceHandler, NonBlockingTTS, SAMPLE_RATE, FRAME_SAMPLES, FRAME_MS
+
+DRAIN_FRAMES = 8      # frames a worker decodes from one stream before moving on
+IDLE_WAIT = FRAME_MS / 2000.0
+
+
+class _Stream:
+    def __init__(self, room, device, handler):
+        self.room = room
+        self.device = device
+        self.handler = handler
+        self.capture = None
+        self.lock = threading.Lock()
+        self.ready = False      # calibrated and pumping
+        self.failed = False
+
+
+class VoiceService:
+    def __init__(self, model_path, rooms, on_intent_callback, workers=None, tts_enabled=True,
+                 on_rms_callback=None, use_grammar=vhmod.GRAMMAR_MODE):
+        """
+        rooms: {room_name: sounddevice device (index, name or None for the default)}
+        on_intent_callback: function(intent, text, source='voice', room=None)
+        workers: decode threads (default: one per room, at most one per core)
+        """
+        self.on_intent = on_intent_callback
+        try:
+            self.model = Model(model_path)
+        except Exception as e:
+            print("[VoiceService] Failed to load VOSK model:", e)
+            raise
+        # one speaker for the house; a reply from any room supersedes the queued ones
+        self.tts = NonBlockingTTS() if tts_enabled else None
+        self.workers = workers or max(1, min(len(rooms), os.cpu_count() or 1))
+        self._stop = threading.Event()
+        self._threads = []
+
+        self._on_rms = on_rms_callback
+        self._streams = []
+        shared_intents = None
+        for room, device in rooms.items():
+            vh = VoiceHandler(model_path, self._tagged(room), tts_enabled=False,
+                              on_rms_callback=self._tagged_rms(room, on_rms_callback), use_grammar=use_grammar,
+                              tts=self.tts, model=self.model, room=room)
+            # phrase table and its memo are read-only after build: share them
+            if shared_intents is None:
+                shared_intents = vh.intents
+            vh.intents = shared_intents
+            self._streams.append(_Stream(room, device, vh))
+        print(f"[VoiceService] {len(self._streams)} microphones, {self.workers} decode workers, one model")
+
+    def _tagged(self, room):
+        def on_intent(intent, text, source='voice'):
+            return self.on_intent(intent, text, source=source, room=room)
+        return on_intent
+
+    @staticmethod
+    def _tagged_rms(room, fn):
+        # each room's meter keeps its own dead-band state: fn(level, room=...)
+        if fn is None:
+            return None
+        def on_rms(level):
+            return fn(level, room=room)
+        return on_rms
+
+    # ---- compatibility with a single VoiceHandler (main.py wiring) ----
+    @property
+    def handlers(self):
+        return {st.room: st.handler for st in self._streams}
+
+    @property
+    def mode(self):
+        return self._streams[0].handler.mode if self._streams else "free"
+
+    def set_mode(self, mode):
+        for st in self._streams:
+            st.handler.set_mode(mode)
+
+    @property
+    def on_rms(self):
+        return self._on_rms
+
+    @on_rms.setter
+    def on_rms(self, fn):
+        self._on_rms = fn
+        for st in self._streams:
+            st.handler.on_rms = self._tagged_rms(st.room, fn)
+
+    def voice_stats(self):
+        return {"workers": self.workers,
+                "rooms": {st.room: dict(st.handler.voice_stats(), ready=st.ready, failed=st.failed)
+                          for st in self._streams}}
+
+    # ---- lifecycle ----
+    def start(self):
+        self._stop.clear()
+        for st in self._streams:
+            st.capture = MicCapture(SAMPLE_RATE, FRAME_SAMPLES, device=st.device)
+            try:
+                st.capture.start()
+            except Exception as e:
+                print(f"[VoiceService] Failed to open microphone for {st.room} ({st.device}):", e)
+                st.failed = True
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"voice-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        print("VoiceService started (auto-calibrate per room).")
+
+    def stop(self):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout=1)
+        self._threads = []
+        for st in self._streams:
+            if st.capture:
+                st.capture.stop()
+
+    def _service(self, st):
+        """Called with st.lock held. Returns frames processed."""
+        vh = st.handler
+        if not st.ready:
+            # blocks this worker for CALIBRATE_SECONDS; other workers keep decoding
+            vh.begin_capture(st.capture)
+            st.ready = True
+            return 1
+        return vh.pump(st.capture, DRAIN_FRAMES)
+
+    def _worker(self):
+        while not self._stop.is_set():
+            done = 0
+            for st in self._streams:
+                if st.failed or not st.lock.acquire(blocking=False):
+                    continue
+                try:
+                    done += self._service(st)
+                except Exception as e:
+                    print(f"[VoiceService] {st.room} processing error:", e)
+                finally:
+                    st.lock.release()
+            if not done:
+                self._stop.wait(IDLE_WAIT)